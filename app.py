@@ -2,67 +2,100 @@ import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 import streamlit as st
-from src.metrics import load, funnel_counts, funnel_cr, weekly_kpis, top_geo, cohort_retention, payment_breakdown, category_revenue, sla_distribution
+from src import profiling
+from src.metrics import load_cube, funnel_cr, query, cache_stats
+from src.profiling import span
+
+# OLIST_PROFILE=1 streamlit run app.py: every rerun rewrites profile/app.json / profile/app.txt
+profiling.setup(name="app")
+profiling.reset()
 
 st.set_page_config(page_title="E-commerce Funnel (Olist)", layout="wide")
 
 st.title("E-commerce Sales Funnel — Olist")
 
-df = load()
+cube, cube_sla = load_cube()
 
 # --- Filters ---
-min_date = pd.to_datetime(df['order_purchase_week'].min())
-max_date = pd.to_datetime(df['order_purchase_week'].max())
-state_opts = sorted(df['customer_state'].dropna().unique().tolist())
-cat_df = category_revenue(1000)  # for options only
-pay_df = payment_breakdown()
+min_date = pd.to_datetime(cube['order_purchase_week'].min())
+max_date = pd.to_datetime(cube['order_purchase_week'].max())
+state_opts = sorted(cube['customer_state'].dropna().unique().tolist())
+cat_opts = sorted(cube['product_category_name'].dropna().unique().tolist())
+pay_opts = sorted(cube['payment_type'].dropna().unique().tolist())
 
 with st.sidebar:
     st.header("Filters")
     date_range = st.date_input("Order week range", [min_date.date(), max_date.date()])
     sel_states = st.multiselect("States", state_opts)
-    sel_cats = st.multiselect("Categories", sorted(cat_df['product_category_name'].unique().tolist()) if not cat_df.empty else [])
-    sel_pays = st.multiselect("Payment types", sorted(pay_df['payment_type'].unique().tolist()) if not pay_df.empty else [])
+    sel_cats = st.multiselect("Categories", cat_opts)
+    sel_pays = st.multiselect("Payment types", pay_opts)
+    st.caption("Category and payment type keep the orders with at least one such item / payment, in every chart.")
+    approx = st.checkbox("Approximate distinct counts (HyperLogLog)", value=False,
+                         help="Distinct orders and cohort customers from mergeable sketches (~1-2% error) "
+                              "instead of exact counts; retention then skips the order table.")
+
+# Apply filters: every chart below sums pre-aggregated cube cells, memoized per filter combination;
+# with a category or payment type filter the orders come from the item/payment facts instead
+filters = dict(
+    date_range=date_range if date_range and len(date_range)==2 else None,
+    states=sel_states,
+    categories=sel_cats,
+    payment_types=sel_pays,
+)
+
+with span("app.queries"):
+    fdict = query('funnel_counts', filters)
+    cr_step, overall = funnel_cr(fdict)
+    distinct = 'hll' if approx else 'exact'
+    weekly = query('weekly_kpis', filters, distinct=distinct)
+    geo = query('top_geo', filters, distinct=distinct, n=15)
+    pb = query('payment_breakdown', filters)
+    cat = query('category_revenue', filters, top_n=20)
+    sla = query('sla_histogram', filters)
+    # SLA quantiles and late deliveries merge per week x state digests
+    sla_q = query('sla_quantiles', filters)
+    sla_q_weekly = query('sla_quantiles', filters, by=('order_purchase_week',))
+    late = query('late_stats', filters)
+    # Retention counts distinct customers, which the cube cannot sum: exact counts read the order table,
+    # approximate ones union the per-cell customer sketches
+    ret = query('cohort_retention', filters, distinct=distinct)
 
-# Apply filters
-df_f = df.copy()
-if date_range and len(date_range)==2:
-    d0, d1 = pd.to_datetime(date_range[0]), pd.to_datetime(date_range[1])
-    df_f = df_f[(df_f['order_purchase_week']>=d0) & (df_f['order_purchase_week']<=d1)]
-if sel_states:
-    df_f = df_f[df_f['customer_state'].isin(sel_states)]
-if sel_pays:
-    # Need per-order payment info: df_f already has total_paid but not types per row; keep as is (global pie uses value-weighted agg)
-    pass
+with span("app.render"):
+    st.subheader(f"Overall conversion created → delivered: {overall:.2%}")
+    cols = st.columns(4)
+    for i, (k, v) in enumerate(cr_step.items()):
+        cols[i].metric(k, f"{v:.2%}")
 
-fdict = funnel_counts(df_f)
-cr_step, overall = funnel_cr(fdict)
-weekly = weekly_kpis(df_f)
-geo = top_geo(df_f, n=15)
-pb = payment_breakdown()  # global distribution (value-weighted)
-cat = category_revenue(20)
-sla = sla_distribution(df_f)
-ret = cohort_retention(df_f)
+    st.plotly_chart(px.line(weekly, x='order_purchase_week', y=['orders','delivered','revenue'], markers=True), use_container_width=True)
+    st.plotly_chart(px.line(weekly, x='order_purchase_week', y='aov', markers=True), use_container_width=True)
 
-st.subheader(f"Overall conversion created → delivered: {overall:.2%}")
-cols = st.columns(4)
-for i, (k, v) in enumerate(cr_step.items()):
-    cols[i].metric(k, f"{v:.2%}")
+    st.subheader("Delivery SLA (approved → delivered)")
+    cols = st.columns(5)
+    for i, q in enumerate(['p50', 'p90', 'p99']):
+        cols[i].metric(f"{q} days", f"{sla_q[q].iloc[0]:.1f}")
+    cols[3].metric("Late vs estimate", f"{late['late_share'].iloc[0]:.1%}")
+    cols[4].metric("Avg days late", f"{late['avg_days_late'].iloc[0]:.1f}")
+    st.plotly_chart(px.line(sla_q_weekly.reset_index(), x='order_purchase_week', y=['p50', 'p90', 'p99'],
+                            labels={'value': 'SLA days'}), use_container_width=True)
 
-st.plotly_chart(px.line(weekly, x='order_purchase_week', y=['orders','delivered','revenue'], markers=True), use_container_width=True)
-st.plotly_chart(px.line(weekly, x='order_purchase_week', y='aov', markers=True), use_container_width=True)
+    c1, c2 = st.columns(2)
+    with c1:
+        if not pb.empty:
+            st.plotly_chart(px.pie(pb, names='payment_type', values='total', hole=0.4), use_container_width=True)
+        if sla.any():
+            st.plotly_chart(px.bar(x=sla.index, y=sla.values, labels={'x': 'SLA days', 'y': 'orders'}), use_container_width=True)
+    with c2:
+        if not cat.empty:
+            st.plotly_chart(px.bar(cat, x='revenue', y='product_category_name', orientation='h'), use_container_width=True)
+        st.plotly_chart(px.bar(geo, x='revenue', y='customer_city', color='customer_state', orientation='h'), use_container_width=True)
 
-c1, c2 = st.columns(2)
-with c1:
-    if not pb.empty:
-        st.plotly_chart(px.pie(pb, names='payment_type', values='total', hole=0.4), use_container_width=True)
-    st.plotly_chart(px.histogram(sla, nbins=40), use_container_width=True)
-with c2:
-    if not cat.empty:
-        st.plotly_chart(px.bar(cat, x='revenue', y='product_category_name', orientation='h'), use_container_width=True)
-    st.plotly_chart(px.bar(geo, x='revenue', y='customer_city', color='customer_state', orientation='h'), use_container_width=True)
+    st.subheader("Cohort retention")
+    st.plotly_chart(px.imshow(ret, aspect='auto', color_continuous_scale='Blues', origin='lower'), use_container_width=True)
 
-st.subheader("Cohort retention")
-st.plotly_chart(px.imshow(ret, aspect='auto', color_continuous_scale='Blues', origin='lower'), use_container_width=True)
+stats = cache_stats()
+st.caption("Dataset: Brazilian E-Commerce Public Dataset by Olist (Kaggle).  "
+           f"Cache: {stats['hits']} hits / {stats['misses']} misses, "
+           f"{stats['mb']:.0f} of {stats['budget_mb']:.0f} MB.")
 
-st.caption("Dataset: Brazilian E-Commerce Public Dataset by Olist (Kaggle).")
\ No newline at end of file
+if profiling.enabled():
+    profiling.write()
@@ -0,0 +1,111 @@
+# benchmarks/bench_backends.py
+"""Wall time and peak memory of the frame metrics on the pandas and DuckDB backends across data scales.
+
+    python3 benchmarks/bench_backends.py --scales 0.1 1 10 --data-dir /tmp/olist-bench
+
+Each scale gets its own synthetic data (see synthetic.py) and ETL run, on which check_backends.py must
+pass first (exit status 1 otherwise); each backend then runs in a fresh subprocess, so its peak resident
+set is its own. Every metric is timed cold (first run on the selection) and warm (best of --repeat), for
+all orders and for a filtered selection.
+"""
+import argparse
+import json
+import os
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+
+# --- make project root importable ---
+import sys
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from benchmarks.common import peak_rss_mb, prepare_scale, run_child
+
+ENV = {**os.environ, 'PYTHONPATH': str(ROOT)}  # children import src/ from the repo, not their work dir
+METRICS = ['funnel_counts', 'weekly_kpis', 'geo_delivered', 'cohort_retention', 'sla_histogram']
+SELECTIONS = {
+    'all': {},
+    'quarter, SP': dict(date_range=('2017-10-01', '2017-12-31'), states=['SP']),
+}
+
+
+def child(backend, repeat):
+    """Time every metric on `backend` over data/processed (cwd) and print the rows as JSON."""
+    from src.metrics import evaluate
+    rows = []
+    for selection, flt in SELECTIONS.items():
+        for metric in METRICS + ['all metrics']:
+            names = METRICS if metric == 'all metrics' else [metric]
+            times = []
+            for _ in range(1 + repeat):
+                t0 = time.perf_counter()
+                evaluate(names, flt, backend=backend)
+                times.append(time.perf_counter() - t0)
+            rows.append({'backend': backend, 'selection': selection, 'metric': metric,
+                         'cold_s': round(times[0], 4), 'warm_s': round(min(times[1:] or times), 4)})
+    print(json.dumps({'peak_rss_mb': round(peak_rss_mb(), 1), 'rows': rows}))
+
+
+def prepare(scale, seed, data_dir):
+    """Synthetic raw CSVs and processed tables for `scale` (reused if already built)."""
+    work, orders = prepare_scale(scale, seed, data_dir)
+    if not (work / 'data' / 'processed' / 'orders_master.parquet').exists():
+        print(f'running the ETL on {orders:,} orders', flush=True)
+        subprocess.run([sys.executable, '-m', 'src.etl'], check=True, capture_output=True, cwd=work, env=ENV)
+    return work, orders
+
+
+def check(work):
+    """Run check_backends.py on `work`; exit 1 with its report if the backends disagree."""
+    proc = subprocess.run([sys.executable, str(ROOT / 'benchmarks' / 'check_backends.py')],
+                          capture_output=True, text=True, cwd=work, env=ENV)
+    if proc.returncode:
+        print(proc.stdout + proc.stderr)
+        sys.exit(1)
+    print(proc.stdout.strip().splitlines()[-1], flush=True)
+
+
+def run_backend(work, backend, repeat):
+    return run_child([sys.executable, str(Path(__file__).resolve()), '--child', backend, '--repeat', str(repeat)],
+                     work)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument('--scales', type=float, nargs='+', default=[0.1, 1.0])
+    ap.add_argument('--seed', type=int, default=0)
+    ap.add_argument('--backends', nargs='+', default=['pandas', 'duckdb'])
+    ap.add_argument('--repeat', type=int, default=3, help='warm runs per metric')
+    ap.add_argument('--data-dir', help='keep generated data here and reuse it on later runs')
+    ap.add_argument('--out', type=Path, help='also write the results as JSON')
+    ap.add_argument('--child', help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    if args.child:
+        return child(args.child, args.repeat)
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for scale in args.scales:
+            work, orders = prepare(scale, args.seed, args.data_dir or tmp)
+            check(work)
+            runs = {b: run_backend(work, b, args.repeat) for b in args.backends}
+            print(f'\nscale {scale:g} ({orders:,} orders)')
+            print(f"  {'selection':12s} {'metric':18s}" + ''.join(f' {b + " cold":>12s} {b + " warm":>12s}'
+                                                              for b in args.backends))
+            for i, row in enumerate(runs[args.backends[0]]['rows']):
+                print(f"  {row['selection']:12s} {row['metric']:18s}" +
+                      ''.join(f" {runs[b]['rows'][i]['cold_s']:11.3f}s {runs[b]['rows'][i]['warm_s']:11.3f}s"
+                              for b in args.backends))
+            print('  peak RSS: ' + ', '.join(f"{b} {runs[b]['peak_rss_mb']:.0f} MB" for b in args.backends))
+            results += [{'scale': scale, 'orders': orders, 'peak_rss_mb': runs[b]['peak_rss_mb'], **row}
+                        for b in args.backends for row in runs[b]['rows']]
+    if args.out:
+        args.out.write_text(json.dumps(results, indent=1))
+        print('Wrote', args.out.resolve())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+# benchmarks/bench_explore.py
+"""Size of the explore page's aggregate bundle and its in-browser filter latency.
+
+    python3 benchmarks/bench_explore.py          # on data/processed (run src/etl.py first)
+
+Runs the page's own decode + aggregate JavaScript (generate_dashboard.EXPLORE_JS) under Node, checks
+its funnel, weekly KPIs and SLA histogram against the cube queries of src/metrics.py for every filter
+set, then times it. Needs `node` (18+, for DecompressionStream) on PATH.
+"""
+import argparse
+import gzip
+import json
+import shutil
+import subprocess
+import tempfile
+import time
+import numpy as np
+from pathlib import Path
+
+# --- make project root importable ---
+import sys
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from src import bundle
+from src import metrics as M
+from dashboards.generate_dashboard import EXPLORE_JS, bundle_tables
+
+# reads the bundle, then per filter set: the result of one aggregate() and its best time over `repeat` runs
+HARNESS = r"""
+const fs = require("fs");
+const [path, filtersJson, repeat] = process.argv.slice(2);
+(async () => {
+  const raw = fs.readFileSync(path);
+  let t0 = performance.now();
+  const b = await decodeBundle(new Blob([raw]).stream());
+  const decode_ms = performance.now() - t0;
+  const out = [];
+  for (const f of JSON.parse(filtersJson)) {
+    let best = Infinity, r;
+    for (let i = 0; i < +repeat; i++) {
+      t0 = performance.now();
+      r = aggregate(b, f.w0, f.w1, f.states);
+      best = Math.min(best, performance.now() - t0);
+    }
+    out.push({ms: best, funnel: Array.from(r.funnel), hist: Array.from(r.hist),
+              weeks: r.weeks, orders: r.orders, delivered: r.delivered, revenue: r.revenue, aov: r.aov});
+  }
+  console.log(JSON.stringify({decode_ms, results: out}));
+})();
+"""
+
+
+def filter_sets(meta):
+    n = len(meta['weeks'])
+    return {
+        'all': (0, n - 1, None),
+        'one state': (0, n - 1, [0]),
+        'quarter': (n // 2, n // 2 + 12, None),
+        'quarter, 3 states': (n // 2, n // 2 + 12, [0, 1, 2]),
+        'one week, one state': (n - 10, n - 10, [len(meta['states']) - 1]),
+    }
+
+
+def expected(cube, sla, meta, w0, w1, states):
+    flt = dict(date_range=(meta['weeks'][w0], meta['weeks'][w1]),
+               states=[meta['states'][s] for s in states] if states else None)
+    c, s = M.apply_filters(cube, **flt), M.apply_filters(sla, **flt)
+    return M.cube_funnel_counts(c), M.cube_weekly_kpis(c), M.cube_sla_histogram(s)
+
+
+def check(name, got, exp, meta):
+    funnel, weekly, hist = exp
+    assert np.allclose(got['funnel'], [funnel[s] for s in meta['stages']]), name
+    weekly = weekly[weekly['orders'] > 0]
+    assert [meta['weeks'][w] for w in got['weeks']] == weekly['order_purchase_week'].dt.strftime('%Y-%m-%d').tolist(), name
+    for col in ('orders', 'delivered', 'revenue', 'aov'):
+        assert np.allclose(got[col], weekly[col].to_numpy()), (name, col)
+    assert np.allclose(np.asarray(got['hist'])[hist.index.to_numpy()], hist.to_numpy()), name
+    assert sum(got['hist']) == hist.sum(), name
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument('--repeat', type=int, default=50)
+    args = ap.parse_args()
+    node = shutil.which('node')
+    if node is None:
+        sys.exit('node not found: the filter latency runs the page JavaScript under Node')
+
+    cube, sla = M.load_cube()
+    t0 = time.perf_counter()
+    tables, meta = bundle_tables(cube, sla)
+    data = bundle.encode(tables, meta)
+    build = time.perf_counter() - t0
+    raw = len(gzip.decompress(data))
+    print(f"cube: {len(cube):,} cells, SLA cube: {len(sla):,} cells, orders: {int(cube['orders'].sum()):,}")
+    print(f"bundle: {len(tables['cells']):,} week x state cells, {len(tables['sla']):,} SLA cells, "
+          f"{raw / 1024:,.1f} KB raw, {len(data) / 1024:,.1f} KB gzip (built in {build:.2f}s)")
+    print('columns: ' + ', '.join(f'{c}:{bundle.smallest(t[c]).dtype.name}' for t in tables.values() for c in t.columns))
+
+    sets = filter_sets(meta)
+    filters = [{'w0': w0, 'w1': w1, 'states': states} for w0, w1, states in sets.values()]
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / 'explore.bin'
+        path.write_bytes(data)
+        script = Path(tmp) / 'bench.js'
+        script.write_text(EXPLORE_JS + HARNESS, encoding='utf-8')
+        out = json.loads(subprocess.run([node, str(script), str(path), json.dumps(filters), str(args.repeat)],
+                                        check=True, capture_output=True, text=True).stdout)
+    print(f"decode in node: {out['decode_ms']:.1f} ms")
+    print(f"{'filters':24s} {'orders':>10s} {'aggregate':>10s}")
+    for (name, flt), got in zip(sets.items(), out['results']):
+        check(name, got, expected(cube, sla, meta, *flt), meta)
+        print(f"{name:24s} {int(got['funnel'][0]):10,d} {got['ms']:8.2f}ms")
+    print('all filter sets match the cube queries')
+
+
+if __name__ == '__main__':
+    main()
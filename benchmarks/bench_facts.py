@@ -0,0 +1,102 @@
+# benchmarks/bench_facts.py
+"""Category / payment type filters per order: the fact index vs re-merging the fact tables.
+
+    python3 benchmarks/bench_facts.py          # on data/processed (run src/etl.py first)
+
+"index" answers a filter set with order_mask() (bitset ORs + master pushdown) and one CSR gather
+per fact table; "merge" finds the same orders by scanning and joining the item and payment facts,
+as a query without the index would. Both results are compared before anything is timed.
+"""
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+# --- make project root importable ---
+import sys
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from benchmarks.common import timed
+from src import metrics as M
+
+METRICS = ['funnel_counts', 'weekly_kpis']
+
+
+def filter_sets(items, payments, master):
+    cats = items.groupby('product_category_name', observed=True)['items'].sum().sort_values(ascending=False).index
+    pays = payments['payment_type'].value_counts().index
+    weeks = master['order_purchase_week'].sort_values().unique()
+    states = master['customer_state'].value_counts().index
+    return {
+        'none': {},
+        'top category': dict(categories=[cats[0]]),
+        'rare category': dict(categories=[cats[-1]]),
+        '3 categories + payment': dict(categories=list(cats[:3]), payment_types=[pays[0]]),
+        'quarter + state + category': dict(date_range=(weeks[len(weeks) // 2], weeks[len(weeks) // 2 + 12]),
+                                            states=[states[0]], categories=[cats[1]]),
+    }
+
+
+def merge_orders(items, payments, master, filters):
+    """Order codes matching `filters` without the index: scan the facts, join them with the master."""
+    orders = master
+    if filters.get('date_range'):
+        d0, d1 = (pd.Timestamp(d) for d in filters['date_range'])
+        orders = orders[orders['order_purchase_week'].between(d0, d1)]
+    if filters.get('states'):
+        orders = orders[orders['customer_state'].isin(filters['states'])]
+    orders = orders[['order_id']]
+    for facts, col, sel in ((items, 'product_category_name', filters.get('categories')),
+                            (payments, 'payment_type', filters.get('payment_types'))):
+        if sel:
+            orders = orders.merge(facts.loc[facts[col].isin(sel), ['order_id']].drop_duplicates(), on='order_id')
+    return orders['order_id']
+
+
+def by_index(filters):
+    mask = M.order_mask(**filters)
+    return (mask, M.fact_category_revenue(mask, filters.get('categories')),
+            M.fact_payment_breakdown(mask, filters.get('payment_types')))
+
+
+def by_merge(items, payments, master, filters):
+    orders = merge_orders(items, payments, master, filters)
+    cat = items.merge(orders, on='order_id')
+    if filters.get('categories'):
+        cat = cat[cat['product_category_name'].isin(filters['categories'])]
+    cat = (cat.groupby('product_category_name', as_index=False, observed=True)[['revenue','items']].sum()
+              .sort_values('revenue', ascending=False).head(15))
+    pay = payments.merge(orders, on='order_id')
+    if filters.get('payment_types'):
+        pay = pay[pay['payment_type'].isin(filters['payment_types'])]
+    pay = pay.groupby('payment_type', as_index=False, observed=True)[['total','n']].sum()
+    return orders, cat, pay
+
+
+def same(a, b):
+    a, b = (f.sort_values(list(f.columns[:1])).reset_index(drop=True) for f in (a, b))
+    pd.testing.assert_frame_equal(a.astype({a.columns[0]: str}), b.astype({b.columns[0]: str}),
+                                  check_exact=False, check_dtype=False)
+
+
+def main():
+    f = M.load_facts()
+    items, payments = f['items'], f['payments']
+    master = M.load(['order_id', 'order_purchase_week', 'customer_state'])
+    print(f"orders: {f['n_orders']:,}  item facts: {len(items):,}  payment facts: {len(payments):,}")
+    print(f"{'filters':28s} {'orders':>9s} {'index':>9s} {'merge':>9s} {'speedup':>8s} {'compute':>9s}")
+    for name, flt in filter_sets(items, payments, master).items():
+        mask, cat, pay = by_index(flt)
+        orders, cat_m, pay_m = by_merge(items, payments, master, flt)
+        assert np.array_equal(np.flatnonzero(mask), np.sort(orders.to_numpy(np.int64))), name
+        same(cat, cat_m)
+        same(pay, pay_m)
+        a, _ = timed(lambda: by_index(flt), repeat=5)
+        b, _ = timed(lambda: by_merge(items, payments, master, flt), repeat=5)
+        c, _ = timed(lambda: M.fact_compute(METRICS, flt))
+        print(f'{name:28s} {int(mask.sum()):9,d} {a * 1e3:7.1f}ms {b * 1e3:7.1f}ms {b / a:7.1f}x {c * 1e3:7.1f}ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+# benchmarks/bench_hll.py
+"""Exact vs HyperLogLog distinct counts: error and wall time of weekly orders, delivered orders per
+city and cohort customer retention.
+
+    python3 benchmarks/bench_hll.py                       # on data/processed (run src/etl.py first)
+    python3 benchmarks/bench_hll.py --precision 10 12 14
+
+"frame" rows compare compute(distinct='exact') with compute(distinct='hll') on the loaded order
+table; "sketch" rows answer filtered selections from the stored sketches instead, against the exact
+counts over the same filtered orders.
+"""
+import argparse
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+# --- make project root importable ---
+import sys
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from benchmarks.common import timed
+from src import metrics as M
+
+METRICS = ['weekly_kpis', 'geo_delivered', 'cohort_retention']
+SELECTIONS = {
+    'all': {},
+    'SP+RJ': dict(states=['SP', 'RJ']),
+    'one quarter': dict(date_range=('2017-10-01', '2017-12-31')),
+    'quarter, SP, credit_card': dict(date_range=('2017-10-01', '2017-12-31'), states=['SP'],
+                                    payment_types=['credit_card']),
+}
+
+
+def errors(exact, approx):
+    """(mean, max) relative error of counts, or absolute error of retention shares."""
+    if isinstance(exact, pd.DataFrame) and 'order_purchase_week' in exact:
+        exact, approx = (t.set_index('order_purchase_week')['orders'] for t in (exact, approx))
+    elif isinstance(exact, pd.DataFrame) and 'customer_city' in exact:
+        exact, approx = (t.set_index(['customer_state', 'customer_city'])['orders'] for t in (exact, approx))
+    else:
+        diff = (approx.reindex_like(exact) - exact).abs().to_numpy()
+        return float(np.nanmean(diff)), float(np.nanmax(diff))
+    rel = (approx.reindex(exact.index).astype('float64') / exact.where(exact > 0) - 1).abs()
+    return float(rel.mean()), float(rel.max())
+
+
+def report(rows):
+    print(f"{'path':7s} {'selection':26s} {'metric':18s} {'p':>3s} {'exact':>9s} {'hll':>9s} "
+          f"{'mean err':>9s} {'max err':>9s}")
+    for r in rows:
+        print(f"{r['path']:7s} {r['selection']:26s} {r['metric']:18s} {r['p']:3d} {r['exact_s']:8.3f}s "
+              f"{r['hll_s']:8.3f}s {r['mean_err']:9.4f} {r['max_err']:9.4f}")
+    print('(errors: relative for order counts, absolute share difference for retention)')
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument('--precision', type=int, nargs='+', default=[12])
+    args = ap.parse_args()
+
+    df = M.load(M.columns_for(*METRICS))
+    print(f'orders: {len(df):,}')
+    rows = []
+    for p in args.precision:
+        for metric in METRICS:
+            t_exact, exact = timed(lambda: M.compute(df, [metric])[metric])
+            t_hll, approx = timed(lambda: M.compute(df, [metric], distinct='hll', precision=p)[metric])
+            rows.append(dict(path='frame', selection='all', metric=metric, p=p,
+                             exact_s=t_exact, hll_s=t_hll, **dict(zip(('mean_err', 'max_err'),
+                                                                       errors(exact, approx)))))
+
+    # stored sketches (built at the ETL's precision) vs exact counts over the filtered orders
+    weekly_sk, cohort_sk, p = M.load_sketches()
+    sketch_queries = {
+        'weekly_kpis': lambda f: M.sketch_orders(
+            M.apply_filters(weekly_sk, **f), ['order_purchase_week'], 'orders', p).rename('orders').reset_index(),
+        'geo_delivered': lambda f: M.sketch_orders(
+            M.apply_filters(weekly_sk, **f), ['customer_state', 'customer_city'], 'delivered', p)
+            .rename('orders').reset_index(),
+        'cohort_retention': lambda f: M.sketch_cohort_retention(M.apply_filters(cohort_sk, **f), p),
+    }
+    columns = M.columns_for(*METRICS) + ['payment_type', 'product_category_name']
+    for name, flt in SELECTIONS.items():
+        for metric, fn in sketch_queries.items():
+            t_exact, exact = timed(lambda: M.compute(
+                M.apply_filters(M.load(columns), **flt), [metric])[metric])
+            t_hll, approx = timed(lambda: fn(flt))
+            rows.append(dict(path='sketch', selection=name, metric=metric, p=p,
+                             exact_s=t_exact, hll_s=t_hll, **dict(zip(('mean_err', 'max_err'),
+                                                                       errors(exact, approx)))))
+    report(rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+# benchmarks/bench_ingest.py
+"""Peak RSS and wall time: bare pd.read_csv ingestion vs typed, batched etl.iter_batches.
+
+    python3 benchmarks/bench_ingest.py --orders 1000000
+
+Each mode runs in a fresh subprocess and reports its own VmHWM (peak resident set).
+"""
+import argparse
+import json
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+
+# --- make project root importable ---
+import sys
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from benchmarks.common import peak_rss_mb
+
+
+def run_legacy():
+    """Load + aggregate payments and items the way etl.main() did before typed ingestion."""
+    import pandas as pd
+    from src import etl
+    payments = pd.read_csv(etl.find_csv('olist_order_payments_dataset'))
+    items = pd.read_csv(etl.find_csv('olist_order_items_dataset'))
+    products = pd.read_csv(etl.find_csv('olist_products_dataset'))
+    payments.groupby('order_id').agg(total_paid=('payment_value', 'sum'))
+    payments.groupby('payment_type').agg(total=('payment_value', 'sum'), n=('payment_value', 'count'))
+    items['revenue'] = items['price'] + items['freight_value']
+    items.groupby('order_id').agg(items=('order_item_id', 'count'), revenue=('revenue', 'sum'))
+    (items.merge(products[['product_id', 'product_category_name']], on='product_id', how='left')
+          .groupby('product_category_name').agg(revenue=('revenue', 'sum')))
+
+
+def run_streaming():
+    from src import etl
+    products = etl.read_csv('olist_products_dataset')
+    etl.summarize_payments(etl.iter_batches('olist_order_payments_dataset'))
+    etl.summarize_items(etl.iter_batches('olist_order_items_dataset'), products)
+
+
+MODES = {'legacy': run_legacy, 'streaming': run_streaming}
+
+
+def child(mode, raw):
+    from src import etl
+    etl.RAW = Path(raw)
+    t0 = time.perf_counter()
+    MODES[mode]()
+    wall = time.perf_counter() - t0
+    print(json.dumps({'mode': mode, 'wall_s': wall, 'peak_rss_mb': peak_rss_mb()}))
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--orders', type=int, default=1_000_000)
+    ap.add_argument('--raw', help='existing raw dir (skips generation)')
+    ap.add_argument('--child', choices=list(MODES))
+    args = ap.parse_args()
+    if args.child:
+        return child(args.child, args.raw)
+
+    from benchmarks.synthetic import write_raw_csvs
+    with tempfile.TemporaryDirectory() as tmp:
+        raw = Path(args.raw or tmp)
+        if not args.raw:
+            write_raw_csvs(raw, args.orders)
+        size_mb = sum(p.stat().st_size for p in raw.glob('*.csv')) / 2**20
+        print(f'raw CSVs: {size_mb:,.0f} MB')
+        results = {}
+        for mode in MODES:
+            out = subprocess.run([sys.executable, __file__, '--child', mode, '--raw', str(raw)],
+                                 check=True, capture_output=True, text=True, cwd=ROOT).stdout
+            results[mode] = json.loads(out.strip().splitlines()[-1])
+            print(f"{mode:10s} wall {results[mode]['wall_s']:7.2f}s   peak RSS {results[mode]['peak_rss_mb']:8.0f} MB")
+        old, new = results['legacy'], results['streaming']
+        print(f"peak RSS {new['peak_rss_mb'] / old['peak_rss_mb']:.0%} of legacy, "
+              f"wall time {new['wall_s'] / old['wall_s']:.0%} of legacy")
+
+
+if __name__ == '__main__':
+    main()
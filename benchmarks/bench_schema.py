@@ -0,0 +1,61 @@
+# benchmarks/bench_schema.py
+"""Loaded-frame memory and metric time: the compact master schema vs the same rows with string ids.
+
+    python3 benchmarks/bench_schema.py          # on data/processed (run src/etl.py first)
+
+"compact" is load() as the ETL writes the master (int32 surrogate ids, categorical labels, native
+dates); "strings" decodes the same frame back to what the master used to hold (object id and
+label columns, Python dates), so both run the identical metric code on identical rows.
+"""
+import pandas as pd
+from pathlib import Path
+
+# --- make project root importable ---
+import sys
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from benchmarks.common import timed
+from src import metrics as M
+
+METRICS = ['funnel_counts', 'weekly_kpis', 'geo_delivered', 'cohort_retention', 'sla_histogram']
+LABELS = ['status_stage', 'payment_type', 'product_category_name']
+
+
+def as_strings(df):
+    """`df` with the previous master schema."""
+    df = M.decode_keys(df)
+    df = df.astype({c: object for c in LABELS if c in df.columns})
+    if 'order_purchase_date' in df.columns:
+        df['order_purchase_date'] = df['order_purchase_date'].dt.date
+    return df
+
+
+def mb(df):
+    return df.memory_usage(deep=True).sum() / 2**20
+
+
+def main():
+    full = M.load()
+    frames = {'compact': full, 'strings': as_strings(full)}
+    print(f'orders: {len(full):,}')
+    print(f"{'':28s} {'compact':>10s} {'strings':>10s} {'ratio':>7s}")
+    a, b = (mb(f) for f in frames.values())
+    print(f"{'master, all columns':28s} {a:9.1f}M {b:9.1f}M {b / a:6.1f}x")
+    per_col = pd.DataFrame({name: f.memory_usage(deep=True, index=False) / 2**20 for name, f in frames.items()})
+    for col, row in per_col.assign(gain=per_col['strings'] - per_col['compact']).nlargest(8, 'gain').iterrows():
+        print(f"  {col:26s} {row['compact']:9.1f}M {row['strings']:9.1f}M {row['strings'] / row['compact']:6.1f}x")
+
+    cols = M.columns_for(*METRICS)
+    frames = {name: f[cols] for name, f in frames.items()}
+    a, b = (mb(f) for f in frames.values())
+    print(f"{'metric columns':28s} {a:9.1f}M {b:9.1f}M {b / a:6.1f}x")
+    for metric in METRICS + ['all']:
+        names = METRICS if metric == 'all' else [metric]
+        a, b = (timed(lambda: M.compute(f, names))[0] for f in frames.values())
+        print(f"{metric:28s} {a:9.3f}s {b:9.3f}s {b / a:6.1f}x")
+
+
+if __name__ == '__main__':
+    main()
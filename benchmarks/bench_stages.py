@@ -0,0 +1,66 @@
+# benchmarks/bench_stages.py
+"""Row-wise `furthest_stage` apply vs the columnar stage engine.
+
+    python3 benchmarks/bench_stages.py --scale 10
+    python3 benchmarks/bench_stages.py --raw data/raw     # an existing olist_orders_dataset.csv
+
+Orders come from the synthetic generator (synthetic.py), read the way etl.py reads them.
+"""
+import argparse
+import tempfile
+import pandas as pd
+from pathlib import Path
+
+# --- make project root importable ---
+import sys
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from benchmarks.common import timed
+from benchmarks.synthetic import KAGGLE_ORDERS, write_raw_csvs
+from src import etl
+from src.funnel import STAGES, stage_frame
+
+
+def furthest_stage_apply(row):
+    """The pre-engine implementation from etl.main(), kept for comparison."""
+    stages = [
+        ('created', pd.notna(row.get('order_purchase_timestamp'))),
+        ('approved', pd.notna(row.get('order_approved_at'))),
+        ('delivered_carrier', pd.notna(row.get('order_delivered_carrier_date'))),
+        ('delivered_customer', pd.notna(row.get('order_delivered_customer_date'))),
+    ]
+    last = 'created'
+    for name, ok in stages:
+        if ok:
+            last = name
+    return last
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    size = ap.add_mutually_exclusive_group()
+    size.add_argument('--scale', type=float, default=10.0, help='multiple of the Kaggle dump size')
+    size.add_argument('--orders', type=int)
+    ap.add_argument('--raw', help='existing raw dir (skips generation)')
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        etl.RAW = Path(args.raw or tmp)
+        if not args.raw:
+            write_raw_csvs(etl.RAW, args.orders or int(round(args.scale * KAGGLE_ORDERS)))
+        orders = etl.read_csv('olist_orders_dataset')
+    print(f'orders: {len(orders):,}')
+
+    t_apply, old = timed(lambda: orders.apply(furthest_stage_apply, axis=1), repeat=1)
+    t_engine, new = timed(lambda: stage_frame(orders, STAGES), repeat=3)
+
+    assert (old.to_numpy() == new['status_stage'].to_numpy()).all(), 'stage mismatch'
+    print(f'apply (furthest_stage):     {t_apply:8.3f}s')
+    print(f'stage_frame (+flags, durs): {t_engine:8.3f}s')
+    print(f'speedup:                    {t_apply / t_engine:8.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,222 @@
+# benchmarks/bench_suite.py
+"""Wall time and peak memory of every ETL stage, metric and dashboard figure across data scales.
+
+    python3 benchmarks/bench_suite.py --scales 0.1 1 10 --out bench.json --baseline benchmarks/baseline.json
+    python3 benchmarks/bench_suite.py --scales 1 --save-baseline benchmarks/baseline.json
+
+Each scale (a multiple of the Kaggle dump, see synthetic.py) runs in a fresh subprocess on its own
+synthetic data. Per step it records wall time, the peak resident set while the step ran and how far
+that peak rose above the RSS before it. Results go to a JSON file; with --baseline, steps slower or
+hungrier than the baseline by more than --tolerance (and the noise floors) are reported as
+regressions and the exit status is 1.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+# --- make project root importable ---
+import sys
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from benchmarks.common import peak_rss_mb, prepare_scale, reset_peak, rss_mb, run_child
+
+
+class Recorder:
+    """Times steps and keeps one result row per step."""
+
+    def __init__(self, scale, orders):
+        self.scale, self.orders = scale, orders
+        self.rows = []
+
+    def step(self, group, name, fn, *args, **kwargs):
+        per_step = reset_peak()
+        before = rss_mb()
+        t0 = time.perf_counter()
+        out = fn(*args, **kwargs)
+        wall = time.perf_counter() - t0
+        peak = peak_rss_mb()
+        self.rows.append({
+            'scale': self.scale, 'orders': self.orders, 'group': group, 'name': name,
+            'wall_s': round(wall, 4),
+            # without a resettable high-water mark the peak is process-wide, not per step
+            'peak_rss_mb': round(peak, 1) if per_step else None,
+            'peak_delta_mb': round(peak - before, 1) if per_step and before is not None else None,
+        })
+        return out
+
+
+def bench_etl(rec):
+    from src import etl
+    raw = rec.step('etl', 'read_csv', lambda: {name: etl.read_csv(name) for name in
+                   ('olist_orders_dataset', 'olist_customers_dataset', 'olist_products_dataset')})
+    orders = rec.step('etl', 'prepare_orders', etl.prepare_orders, raw['olist_orders_dataset'])
+    pay, pay_type_value, by_type = rec.step('etl', 'summarize_payments', etl.summarize_payments,
+                                            etl.iter_batches('olist_order_payments_dataset'))
+    it, cat, by_cat = rec.step('etl', 'summarize_items', etl.summarize_items,
+                               etl.iter_batches('olist_order_items_dataset'), raw['olist_products_dataset'])
+    m = rec.step('etl', 'build_master', etl.build_master, orders, raw['olist_customers_dataset'], pay, it)
+    m = rec.step('etl', 'assign_cohorts', etl.assign_cohorts, m)
+    etl.OUT.mkdir(parents=True, exist_ok=True)
+    compact = rec.step('etl', 'compact_master', etl.compact_master, m)
+    rec.step('etl', 'write_master', etl.write_row_grouped, compact, etl.MASTER)
+    del compact
+    rec.step('etl', 'write_facts', etl.write_facts, by_cat, by_type)
+    rec.step('etl', 'write_summaries', lambda: (
+        pay_type_value.to_parquet(etl.OUT / 'payment_type_summary.parquet', index=False),
+        cat.to_parquet(etl.OUT / 'category_revenue.parquet', index=False)))
+    rec.step('etl', 'write_cube', etl.write_cube, m)
+    rec.step('etl', 'write_sketches', etl.write_sketches, m)
+    rec.step('etl', 'write_sla_digests', etl.write_sla_digests, m)
+    rec.step('etl', 'write_retention', etl.write_retention, m)
+
+
+def bench_metrics(rec):
+    from src import metrics
+    from src.cache import get_cache
+    names = [m for m in metrics.ENGINE if not m.startswith('_')]
+    get_cache().clear()
+    df = rec.step('metrics', 'load', metrics.load, metrics.columns_for(*names))
+    for name in names:
+        rec.step('metrics', name, metrics.compute, df, [name])
+    rec.step('metrics', 'compute_all', metrics.compute, df, names)
+
+    get_cache().clear()
+    cube, sla = rec.step('metrics', 'load_cube', metrics.load_cube)
+    for name, fn in metrics.CUBE_QUERIES.items():
+        rec.step('metrics', f'cube_{name}', fn, cube)
+    rec.step('metrics', 'cube_sla_histogram', metrics.cube_sla_histogram, sla)
+    rec.step('metrics', 'load_retention', metrics.load_retention)
+    digests, late = rec.step('metrics', 'load_sla_digests', metrics.load_sla_digests)
+    rec.step('metrics', 'digest_quantiles', metrics.digest_quantiles, digests)
+    rec.step('metrics', 'digest_quantiles_weekly', metrics.digest_quantiles, digests, by=['order_purchase_week'])
+    rec.step('metrics', 'digest_sla_histogram', metrics.digest_sla_histogram, digests)
+    rec.step('metrics', 'late_stats', metrics.late_stats, late)
+    rec.step('metrics', 'load_facts', metrics.load_facts)
+    mask = rec.step('metrics', 'order_mask', metrics.order_mask)
+    rec.step('metrics', 'fact_category_revenue', metrics.fact_category_revenue, mask)
+    rec.step('metrics', 'fact_payment_breakdown', metrics.fact_payment_breakdown, mask)
+
+
+def bench_dashboard(rec):
+    from dashboards import generate_dashboard as gd
+    from src import bundle, metrics
+    data = gd.dashboard_data()
+    for name, build, key in gd.FIGURES:
+        rec.step('dashboard', f'{name}_fig',
+                 lambda: gd.compact(build(data[key])).to_html(full_html=False, include_plotlyjs=False))
+    rec.step('dashboard', 'explore_bundle', lambda: bundle.encode(*gd.bundle_tables(*metrics.load_cube())))
+
+
+def child(scale, orders, work):
+    """Run every step on `work`/data/raw (cwd is `work`) and print the rows as JSON."""
+    rec = Recorder(scale, orders)
+    bench_etl(rec)
+    bench_metrics(rec)
+    bench_dashboard(rec)
+    print(json.dumps(rec.rows))
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment():
+    import numpy, pandas, pyarrow
+    return {
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'commit': _git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'numpy': numpy.__version__, 'pandas': pandas.__version__, 'pyarrow': pyarrow.__version__,
+    }
+
+
+def run_scale(scale, seed, data_dir):
+    work, orders = prepare_scale(scale, seed, data_dir)
+    return run_child([sys.executable, str(Path(__file__).resolve()), '--child', str(scale), '--orders', str(orders)],
+                     work)
+
+
+def _key(row):
+    return (row['scale'], row['group'], row['name'])
+
+
+def compare(rows, baseline, tolerance, min_seconds, min_mb):
+    """Rows that got slower / used more memory than the baseline beyond tolerance and noise floors."""
+    base = {_key(r): r for r in baseline['results']}
+    regressions = []
+    for row in rows:
+        old = base.get(_key(row))
+        if old is None:
+            continue
+        for metric, floor in (('wall_s', min_seconds), ('peak_delta_mb', min_mb)):
+            a, b = old.get(metric), row.get(metric)
+            if a is None or b is None:
+                continue
+            if b > a * (1 + tolerance) and b - a > floor:
+                regressions.append({**dict(zip(('scale', 'group', 'name'), _key(row))),
+                                    'metric': metric, 'baseline': a, 'current': b,
+                                    'change': round(b / a - 1, 3) if a else None})
+    return regressions
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument('--scales', type=float, nargs='+', default=[0.1, 1.0])
+    ap.add_argument('--seed', type=int, default=0)
+    ap.add_argument('--data-dir', help='keep generated data here and reuse it on later runs')
+    ap.add_argument('--out', type=Path, default=Path('bench_results.json'))
+    ap.add_argument('--baseline', type=Path, help='results file to compare against')
+    ap.add_argument('--save-baseline', type=Path, help='also write the results here')
+    ap.add_argument('--tolerance', type=float, default=0.25, help='allowed relative slowdown/growth')
+    ap.add_argument('--min-seconds', type=float, default=0.05, help='ignore wall-time changes smaller than this')
+    ap.add_argument('--min-mb', type=float, default=32, help='ignore memory changes smaller than this')
+    ap.add_argument('--child', type=float, help=argparse.SUPPRESS)
+    ap.add_argument('--orders', type=int, help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    if args.child is not None:
+        return child(args.child, args.orders, Path.cwd())
+
+    with tempfile.TemporaryDirectory() as tmp:
+        rows = []
+        for scale in args.scales:
+            scale_rows = run_scale(scale, args.seed, args.data_dir or tmp)
+            rows += scale_rows
+            print(f'\nscale {scale:g} ({scale_rows[0]["orders"]:,} orders)')
+            for r in scale_rows:
+                mem = f"{r['peak_delta_mb']:8.0f} MB" if r['peak_delta_mb'] is not None else '       n/a'
+                print(f"  {r['group']:10s} {r['name']:28s} {r['wall_s']:9.3f}s {mem}")
+
+    results = {'environment': environment(), 'seed': args.seed, 'results': rows}
+    for path in filter(None, (args.out, args.save_baseline)):
+        path.write_text(json.dumps(results, indent=1))
+        print('Wrote', path.resolve())
+
+    if args.baseline:
+        regressions = compare(rows, json.loads(args.baseline.read_text()),
+                              args.tolerance, args.min_seconds, args.min_mb)
+        results['regressions'] = regressions
+        args.out.write_text(json.dumps(results, indent=1))
+        for r in regressions:
+            print(f"REGRESSION {r['group']}/{r['name']} @ scale {r['scale']:g}: "
+                  f"{r['metric']} {r['baseline']} -> {r['current']}")
+        if regressions:
+            sys.exit(1)
+        print('No regressions against', args.baseline)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+# benchmarks/check_backends.py
+"""Parity check: every frame metric on the pandas and DuckDB backends, for several filter sets.
+
+    python3 benchmarks/check_backends.py            # on data/processed; exit status 1 on a mismatch
+
+Results must match exactly except for float sums (relative 1e-9, summation order differs) and the
+index dtype of empty pivots. geo_delivered is compared city by city; top_geo must pick the same cities
+in the same order (both backends rank by revenue in cents, ties by state and city). Category and
+payment type filters go through the order facts on both (orders with at least one such item / payment).
+"""
+import pandas as pd
+from pathlib import Path
+
+# --- make project root importable ---
+import sys
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from src.metrics import evaluate
+
+METRICS = ['funnel_counts', 'weekly_kpis', 'geo_delivered', 'top_geo', 'cohort_retention',
+           'sla_distribution', 'sla_histogram']
+FILTERS = {
+    'all': {},
+    'SP+RJ': dict(states=['SP', 'RJ']),
+    'one quarter': dict(date_range=('2017-10-01', '2017-12-31')),
+    'quarter, SP, credit_card': dict(date_range=('2017-10-01', '2017-12-31'), states=['SP'],
+                                    payment_types=['credit_card']),
+    'delivered, cama_mesa_banho': dict(stages=['delivered_customer'], categories=['cama_mesa_banho']),
+    'nothing': dict(states=['no such state']),
+}
+PARAMS = [{}, dict(measure='orders'), dict(n=5)]
+
+
+def _normalize(metric, value):
+    if metric in ('geo_delivered', 'top_geo'):
+        value = value.astype({'customer_state': object, 'customer_city': object})
+        if metric == 'geo_delivered':
+            value = value.sort_values(['customer_state', 'customer_city'])
+        return value.reset_index(drop=True)
+    if metric == 'sla_distribution':
+        return value.sort_values().reset_index(drop=True)
+    return value
+
+
+def compare(metric, a, b):
+    a, b = _normalize(metric, a), _normalize(metric, b)
+    if isinstance(a, dict):
+        assert a == b, f'{a} != {b}'
+    elif isinstance(a, pd.Series):
+        pd.testing.assert_series_equal(a, b, check_exact=False, rtol=1e-9)
+    else:
+        # an empty pivot has an object index in pandas but keeps the typed one from DuckDB
+        pd.testing.assert_frame_equal(a, b, check_exact=False, rtol=1e-9, check_index_type=not a.empty,
+                                      check_column_type=not a.empty)
+
+
+def check():
+    """[(filter set, params, metric, error)] for every mismatch."""
+    failures = []
+    for name, flt in FILTERS.items():
+        for params in PARAMS:
+            pandas = evaluate(METRICS, flt, backend='pandas', **params)
+            duck = evaluate(METRICS, flt, backend='duckdb', **params)
+            for metric in METRICS:
+                try:
+                    compare(metric, pandas[metric], duck[metric])
+                except AssertionError as e:
+                    failures.append((name, params, metric, str(e).strip().splitlines()[0]))
+    return failures
+
+
+def main():
+    failures = check()
+    for name, params, metric, error in failures:
+        print(f'MISMATCH {metric} [{name}] {params}: {error}')
+    checked = len(FILTERS) * len(PARAMS) * len(METRICS)
+    print(f'{checked - len(failures)}/{checked} backend comparisons identical')
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+# benchmarks/common.py
+"""Timing, memory and data helpers shared by the benchmark scripts."""
+import json
+import resource
+import subprocess
+import time
+from pathlib import Path
+
+STATUS = Path('/proc/self/status')
+
+
+def timed(fn, repeat=3):
+    """(best wall time in seconds over `repeat` calls, result of the last call)."""
+    best, out = float('inf'), None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, out
+
+
+def _status_mb(field):
+    if STATUS.exists():
+        for line in STATUS.read_text().splitlines():
+            if line.startswith(f'{field}:'):
+                return int(line.split()[1]) / 1024
+    return None
+
+
+def rss_mb():
+    """Current resident set in MB (None where /proc isn't available)."""
+    return _status_mb('VmRSS')
+
+
+def peak_rss_mb():
+    # ru_maxrss survives fork+exec on Linux, so prefer the per-process high-water mark.
+    peak = _status_mb('VmHWM')
+    return peak if peak is not None else resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def reset_peak():
+    """Reset VmHWM to the current RSS (Linux >= 4.0); False where that isn't possible."""
+    try:
+        Path('/proc/self/clear_refs').write_text('5')
+        return True
+    except OSError:
+        return False
+
+
+def prepare_scale(scale, seed, data_dir):
+    """(work dir, orders) with synthetic raw CSVs for `scale` x the Kaggle dump (reused if already written)."""
+    from benchmarks.synthetic import KAGGLE_ORDERS, write_raw_csvs
+    orders = int(round(scale * KAGGLE_ORDERS))
+    work = Path(data_dir) / f'scale-{scale:g}-seed-{seed}'
+    raw = work / 'data' / 'raw'
+    done = raw / '.complete'
+    if not done.exists():
+        print(f'generating {orders:,} orders in {raw}', flush=True)
+        write_raw_csvs(raw, orders, seed)
+        done.touch()
+    return work, orders
+
+
+def run_child(cmd, cwd):
+    """Run a benchmark child process in `cwd`; its last line of output is its JSON result."""
+    out = subprocess.run(cmd, check=True, capture_output=True, text=True, cwd=cwd).stdout
+    return json.loads(out.strip().splitlines()[-1])
@@ -0,0 +1,288 @@
+# benchmarks/synthetic.py
+"""Synthetic Olist data for benchmarks.
+
+    python3 benchmarks/synthetic.py --scale 10 --out /tmp/olist_x10/data/raw
+
+writes the five olist_*_dataset.csv files etl.py reads, at `--scale` times the size of the Kaggle
+dump (or exactly `--orders` orders), generated and written in chunks so memory stays flat.
+"""
+import argparse
+from contextlib import ExitStack
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pcsv
+
+KAGGLE_ORDERS = 99_441  # orders in the public dump; --scale is a multiple of it
+
+# Customer share per state, roughly as in the Kaggle data (heavily skewed towards the southeast).
+STATE_SHARE = {
+    'SP': .420, 'RJ': .129, 'MG': .117, 'RS': .055, 'PR': .051, 'SC': .037, 'BA': .034, 'DF': .021,
+    'ES': .020, 'GO': .020, 'PE': .017, 'CE': .013, 'PA': .010, 'MT': .009, 'MA': .008, 'MS': .007,
+    'PB': .005, 'PI': .005, 'RN': .005, 'AL': .004, 'SE': .003, 'TO': .003, 'RO': .003, 'AM': .0015,
+    'AC': .001, 'AP': .0007, 'RR': .0005,
+}
+STATES = list(STATE_SHARE)
+CAPITALS = {
+    'SP': 'sao paulo', 'RJ': 'rio de janeiro', 'MG': 'belo horizonte', 'RS': 'porto alegre',
+    'PR': 'curitiba', 'SC': 'florianopolis', 'BA': 'salvador', 'DF': 'brasilia', 'ES': 'vitoria',
+    'GO': 'goiania', 'PE': 'recife', 'CE': 'fortaleza', 'PA': 'belem', 'MT': 'cuiaba',
+    'MA': 'sao luis', 'MS': 'campo grande', 'PB': 'joao pessoa', 'PI': 'teresina', 'RN': 'natal',
+    'AL': 'maceio', 'SE': 'aracaju', 'TO': 'palmas', 'RO': 'porto velho', 'AM': 'manaus',
+    'AC': 'rio branco', 'AP': 'macapa', 'RR': 'boa vista',
+}
+CAPITAL_SHARE = 0.35       # of a state's customers; the rest spread Zipf-like over interior cities
+SOUTHEAST_SOUTH = {'SP', 'RJ', 'MG', 'ES', 'RS', 'PR', 'SC'}
+
+# Categories in popularity order (Zipf-weighted); a few products have no category at all.
+CATEGORIES = [
+    'cama_mesa_banho', 'beleza_saude', 'esporte_lazer', 'moveis_decoracao', 'informatica_acessorios',
+    'utilidades_domesticas', 'relogios_presentes', 'telefonia', 'ferramentas_jardim', 'automotivo',
+    'brinquedos', 'cool_stuff', 'perfumaria', 'bebes', 'eletronicos', 'papelaria', 'fashion_bolsas_e_acessorios',
+    'pet_shop', 'moveis_escritorio', 'consoles_games', 'malas_acessorios', 'construcao_ferramentas_construcao',
+    'eletrodomesticos', 'instrumentos_musicais', 'eletroportateis', 'casa_construcao', 'livros_interesse_geral',
+    'alimentos', 'moveis_sala', 'casa_conforto',
+]
+NO_CATEGORY_RATE = 0.015
+
+PAYMENT_TYPES = ['credit_card', 'boleto', 'voucher', 'debit_card']
+PAYMENT_MIX = [.74, .19, .055, .015]
+PAYMENT_MIX_NORTH = [.66, .27, .055, .015]  # boleto is more common outside the south/southeast
+SPLIT_VOUCHER_RATE = 0.03                   # orders paying part of the value with a voucher
+
+# order_status mix; each status implies which stage timestamps exist (see _stage_timestamps).
+STATUS_SHARE = {
+    'delivered': .970, 'shipped': .011, 'canceled': .0063, 'unavailable': .0061,
+    'invoiced': .0032, 'processing': .003, 'created': .0003, 'approved': .0001,
+}
+APPROVED_GAP_RATE = 0.002   # delivered orders with no approval timestamp (as in the real data)
+REPEAT_RATE = 0.03          # customers with more than one order
+
+START = np.datetime64('2016-09-04')
+DAYS = 730
+BLACK_FRIDAY = np.datetime64('2017-11-24')
+
+
+def _hex_ids(rng, n):
+    """n random 32-char hex ids as a numpy bytes array (cheap to index, no Python strings)."""
+    digits = np.frombuffer(b'0123456789abcdef', dtype=np.uint8)[rng.integers(0, 16, (n, 32), dtype=np.uint8)]
+    return digits.view('S32').ravel()
+
+
+def _zipf_cdf(k, a=1.1):
+    w = 1.0 / np.arange(1, k + 1) ** a
+    return np.cumsum(w / w.sum())
+
+
+def _draw(rng, cdf, n):
+    return np.minimum(np.searchsorted(cdf, rng.random(n)), len(cdf) - 1)
+
+
+def _cities():
+    """Per state: (city names, cdf) with the capital first."""
+    out = {}
+    for state, share in STATE_SHARE.items():
+        k = max(5, int(share * 4000))
+        names = np.asarray([CAPITALS[state]] + [f'{state.lower()} interior {i:04d}' for i in range(1, k)],
+                           dtype=object)
+        w = np.r_[CAPITAL_SHARE, (1 - CAPITAL_SHARE) * np.diff(np.r_[0, _zipf_cdf(k - 1)])]
+        out[state] = (names, np.cumsum(w))
+    return out
+
+
+def _day_cdf():
+    # Volume ramps up over the first ~14 months, then plateaus; Black Friday week spikes.
+    day = np.arange(DAYS)
+    w = np.minimum(1.0, 0.05 + day / 420)
+    bf = (START + day.astype('timedelta64[D]') - BLACK_FRIDAY).astype(int)
+    w = w * np.where(bf == 0, 5.0, np.where((bf > -3) & (bf < 4), 1.8, 1.0))
+    return np.cumsum(w / w.sum())
+
+
+def _table(columns):
+    return pa.table({k: pa.array(v) if not isinstance(v, pa.Array) else v for k, v in columns.items()})
+
+
+def _ids_array(ids):
+    return pa.array(ids).cast(pa.string())
+
+
+def _ts(values):
+    return pa.array(values.astype('datetime64[s]'), type=pa.timestamp('s'))
+
+
+def products_table(rng, n_products):
+    cat_cdf = _zipf_cdf(len(CATEGORIES), 0.9)
+    category = np.asarray(CATEGORIES, dtype=object)[_draw(rng, cat_cdf, n_products)]
+    category[rng.random(n_products) < NO_CATEGORY_RATE] = None
+    weight = np.maximum(50, rng.lognormal(6.5, 1.2, n_products)).astype('int64')
+    side = np.maximum(8, (weight ** (1 / 3) * rng.uniform(1.2, 2.5, (3, n_products)))).astype('int64')
+    ids = _hex_ids(rng, n_products)
+    table = _table({
+        'product_id': _ids_array(ids),
+        'product_category_name': category,
+        'product_name_lenght': rng.integers(5, 76, n_products),
+        'product_description_lenght': rng.integers(4, 3993, n_products),
+        'product_photos_qty': np.minimum(20, rng.geometric(0.5, n_products)),
+        'product_weight_g': weight,
+        'product_length_cm': side[0],
+        'product_height_cm': side[1],
+        'product_width_cm': side[2],
+    })
+    # Category-level price levels so revenue per category is skewed too
+    base_price = rng.lognormal(4.3, 0.5, len(CATEGORIES) + 1)
+    cat_idx = pd.Series(category).map({c: i for i, c in enumerate(CATEGORIES)}).fillna(len(CATEGORIES))
+    price = base_price[cat_idx.to_numpy(dtype='int64')] * rng.lognormal(0, 0.6, n_products)
+    return table, ids, price.round(2)
+
+
+def _stage_timestamps(rng, purchase, status, state):
+    n = len(purchase)
+    approved = purchase + rng.exponential(10 * 3600, n).astype('timedelta64[s]')
+    carrier = approved + (rng.lognormal(11.9, 0.8, n)).astype('timedelta64[s]')       # ~2-3 days
+    far = ~np.isin(state, list(SOUTHEAST_SOUTH))
+    transit_days = rng.lognormal(np.where(state == 'SP', 1.7, np.where(far, 2.6, 2.2)), 0.5)
+    customer = carrier + (transit_days * 86400).astype('timedelta64[s]')
+    est_days = np.where(far, 30, np.where(state == 'SP', 18, 24)) + rng.integers(-5, 8, n)
+    estimated = purchase.astype('datetime64[D]') + est_days.astype('timedelta64[D]')
+
+    nat = np.datetime64('NaT')
+    approved = np.where((status == 'created') | ((status == 'delivered') & (rng.random(n) < APPROVED_GAP_RATE)),
+                        nat, approved)
+    # canceled orders sometimes got as far as the carrier before being canceled
+    shipped_cancel = (status == 'canceled') & (rng.random(n) < 0.1)
+    has_carrier = np.isin(status, ['delivered', 'shipped']) | shipped_cancel
+    carrier = np.where(has_carrier, carrier, nat)
+    customer = np.where(status == 'delivered', customer, nat)
+    return approved, carrier, customer, estimated
+
+
+def _chunk(rng, n, cities, day_cdf, product_ids, product_price, seller_ids, seller_cdf, product_cdf):
+    """Tables for `n` orders: orders, customers, items and payments."""
+    # Unique customers, a few of them ordering more than once
+    counts = 1 + np.where(rng.random(n) < REPEAT_RATE, rng.geometric(0.55, n), 0)
+    owner = rng.permutation(np.repeat(np.arange(n), counts)[:n])
+    n_unique = owner.max() + 1
+    cust_state = np.asarray(STATES)[rng.choice(len(STATES), n_unique, p=np.asarray(list(STATE_SHARE.values())) / sum(STATE_SHARE.values()))]
+    cust_city = np.empty(n_unique, dtype=object)
+    for state, (names, cdf) in cities.items():
+        idx = np.flatnonzero(cust_state == state)
+        cust_city[idx] = names[_draw(rng, cdf, len(idx))]
+    cust_zip = rng.integers(1000, 99999, n_unique)
+    unique_ids = _hex_ids(rng, n_unique)
+    state, city = cust_state[owner], cust_city[owner]
+
+    order_ids, customer_ids = _hex_ids(rng, n), _hex_ids(rng, n)
+    day = _draw(rng, day_cdf, n)
+    seconds = rng.integers(0, 86400, n)
+    purchase = START + day.astype('timedelta64[D]') + seconds.astype('timedelta64[s]')
+    status = np.asarray(list(STATUS_SHARE))[
+        rng.choice(len(STATUS_SHARE), n, p=np.asarray(list(STATUS_SHARE.values())) / sum(STATUS_SHARE.values()))]
+    approved, carrier, customer, estimated = _stage_timestamps(rng, purchase, status, state)
+
+    orders = _table({
+        'order_id': _ids_array(order_ids),
+        'customer_id': _ids_array(customer_ids),
+        'order_status': status,
+        'order_purchase_timestamp': _ts(purchase),
+        'order_approved_at': _ts(approved),
+        'order_delivered_carrier_date': _ts(carrier),
+        'order_delivered_customer_date': _ts(customer),
+        'order_estimated_delivery_date': _ts(estimated),
+    })
+    customers = _table({
+        'customer_id': _ids_array(customer_ids),
+        'customer_unique_id': _ids_array(unique_ids[owner]),
+        'customer_zip_code_prefix': cust_zip[owner],
+        'customer_city': city,
+        'customer_state': state,
+    })
+
+    # Items: mostly one per order; unavailable orders have none
+    k = np.searchsorted(np.cumsum([.9, .075, .015, .006, .004]), rng.random(n)) + 1
+    k[status == 'unavailable'] = 0
+    row_order = np.repeat(np.arange(n), k)
+    m = len(row_order)
+    item_no = np.arange(m) - np.repeat(np.cumsum(k) - k, k) + 1
+    product = _draw(rng, product_cdf, m)
+    price = (product_price[product] * rng.uniform(0.95, 1.05, m)).round(2)
+    freight = (0.9 * price ** 0.6 * rng.lognormal(0, 0.4, m)).round(2)
+    items = _table({
+        'order_id': _ids_array(order_ids[row_order]),
+        'order_item_id': item_no,
+        'product_id': _ids_array(product_ids[product]),
+        'seller_id': _ids_array(seller_ids[_draw(rng, seller_cdf, m)]),
+        'shipping_limit_date': _ts(purchase[row_order] + np.timedelta64(6, 'D')),
+        'price': price,
+        'freight_value': freight,
+    })
+
+    # Payments: the order value, by a state-dependent mix; some orders split off a voucher
+    value = np.bincount(row_order, weights=price + freight, minlength=n)
+    value = np.where(k > 0, value, rng.gamma(2, 80, n)).round(2)
+    north = ~np.isin(state, list(SOUTHEAST_SOUTH))
+    kind = np.where(north, _draw(rng, np.cumsum(PAYMENT_MIX_NORTH), n), _draw(rng, np.cumsum(PAYMENT_MIX), n))
+    installments = np.where(kind == 0, np.minimum(24, rng.geometric(0.4, n)), 1)
+    split = (rng.random(n) < SPLIT_VOUCHER_RATE) & (kind != 2)
+    voucher = (value * rng.uniform(0.1, 0.6, n)).round(2)
+    first = np.where(split, value - voucher, value).round(2)
+    pay_order = np.r_[np.arange(n), np.flatnonzero(split)]
+    payments = _table({
+        'order_id': _ids_array(order_ids[pay_order]),
+        'payment_sequential': np.r_[np.ones(n, dtype='int64'), np.full(split.sum(), 2)],
+        'payment_type': np.asarray(PAYMENT_TYPES)[np.r_[kind, np.full(split.sum(), 2)]],
+        'payment_installments': np.r_[installments, np.ones(split.sum(), dtype='int64')],
+        'payment_value': np.r_[first, voucher[split]],
+    })
+    return {'olist_orders_dataset': orders, 'olist_customers_dataset': customers,
+            'olist_order_items_dataset': items, 'olist_order_payments_dataset': payments}
+
+
+def write_raw_csvs(raw_dir, n_orders=100_000, seed=0, chunk_size=250_000):
+    """Write the five olist_*_dataset.csv files used by etl.py into `raw_dir`.
+
+    Skewed like the real data: states, cities, categories, products and sellers follow long-tailed
+    distributions, the payment mix depends on the state, order_status decides which stage
+    timestamps are missing, volume grows over time with a Black Friday spike, and ~3% of customers
+    order more than once (within a chunk). Orders are generated `chunk_size` at a time.
+    """
+    rng = np.random.default_rng(seed)
+    raw_dir = Path(raw_dir)
+    raw_dir.mkdir(parents=True, exist_ok=True)
+
+    n_products = max(10, n_orders // 3)
+    products, product_ids, product_price = products_table(rng, n_products)
+    pcsv.write_csv(products, raw_dir / 'olist_products_dataset.csv')
+    seller_ids = _hex_ids(rng, max(10, n_orders // 30))
+    static = dict(cities=_cities(), day_cdf=_day_cdf(), product_ids=product_ids, product_price=product_price,
+                  seller_ids=seller_ids, seller_cdf=_zipf_cdf(len(seller_ids), 1.0),
+                  product_cdf=_zipf_cdf(n_products, 0.8))
+
+    with ExitStack() as stack:
+        writers = {}
+        for start in range(0, n_orders, chunk_size):
+            tables = _chunk(rng, min(chunk_size, n_orders - start), **static)
+            for name, table in tables.items():
+                if name not in writers:
+                    writers[name] = stack.enter_context(pcsv.CSVWriter(raw_dir / f'{name}.csv', table.schema))
+                writers[name].write_table(table)
+
+
+def main():
+    ap = argparse.ArgumentParser(description='Write synthetic olist_*_dataset.csv files.')
+    ap.add_argument('--out', type=Path, default=Path('data/raw'))
+    size = ap.add_mutually_exclusive_group()
+    size.add_argument('--scale', type=float, default=1.0, help='multiple of the Kaggle dump size')
+    size.add_argument('--orders', type=int)
+    ap.add_argument('--seed', type=int, default=0)
+    args = ap.parse_args()
+    n = args.orders or int(round(args.scale * KAGGLE_ORDERS))
+    write_raw_csvs(args.out, n, args.seed)
+    size_mb = sum(p.stat().st_size for p in args.out.glob('olist_*_dataset.csv')) / 2**20
+    print(f'Wrote {n:,} orders ({size_mb:,.0f} MB) to {args.out.resolve()}')
+
+
+if __name__ == '__main__':
+    main()
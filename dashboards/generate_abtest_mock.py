@@ -1,5 +1,6 @@
 # dashboards/generate_abtest_mock.py
-import hashlib
+import argparse
+import time
 import pandas as pd
 from pathlib import Path
 
@@ -9,47 +10,71 @@ ROOT = Path(__file__).resolve().parents[1]
 if str(ROOT) not in sys.path:
     sys.path.insert(0, str(ROOT))
 
-from statsmodels.stats.proportion import proportions_ztest, proportion_effectsize
+from src.metrics import decode_keys, load
+from src.abtest import experiment_frame, segment_results, ztest_proportions
+from src import profiling
+from src.profiling import profiled, span
+from statsmodels.stats.proportion import proportion_effectsize
 from statsmodels.stats.power import NormalIndPower
 
 OUT = Path('docs/abtest.html')
+SEGMENTS = ['customer_state', 'product_category_name', 'payment_type', 'order_purchase_week']
+N_BOOT = 1000
+ALPHA = 0.05
 
-def assign_variant(order_id: str) -> str:
-    """Deterministic 50/50 split by hashing order_id."""
-    h = hashlib.md5(str(order_id).encode()).hexdigest()
-    return 'B' if int(h[:2], 16) % 2 else 'A'
+def _fmt(metric, x):
+    if pd.isna(x):
+        return '–'
+    return f'{x:.2%}' if metric == 'delivered' else f'{x:,.2f}'
 
-def main():
-    df = pd.read_parquet('data/processed/orders_master.parquet')
+def _rows(table):
+    return "\n".join(
+        f"<tr><td>{r.segment}</td><td>{r.value}</td><td>{r.metric}</td><td>{r.n_a:,} / {r.n_b:,}</td>"
+        f"<td>{_fmt(r.metric, r.mean_a)}</td><td>{_fmt(r.metric, r.mean_b)}</td><td>{_fmt(r.metric, r.diff)}</td>"
+        f"<td>[{_fmt(r.metric, r.ci_low)}, {_fmt(r.metric, r.ci_high)}]</td>"
+        f"<td>{r.p:.4f}</td><td>{r.p_adj:.4f}</td></tr>"
+        for r in table.itertuples())
 
-    # Binary conversion = delivered to customer
-    df['converted'] = (df['status_stage'] == 'delivered_customer').astype(int)
-    df['variant'] = df['order_id'].apply(assign_variant)
+@profiled('abtest.main')
+def main():
+    t0 = time.perf_counter()
+    # variants hash the order_id strings, so assignment doesn't depend on the surrogate codes
+    df = decode_keys(load(columns=['order_id', 'status_stage', 'revenue', 'sla_days', *SEGMENTS]), ['order_id'])
 
-    # Aggregate
-    agg = (df.groupby('variant')['converted']
-             .agg(conversions='sum', n='count')
-             .reindex(['A','B']).fillna(0).astype(int))
+    # Variant (md5 of order_id, computed in bulk), hash bucket and metric values per order
+    with span('abtest.experiment_frame') as sp:
+        exp = sp.count(experiment_frame(df))
+    with span('abtest.segment_results', n_boot=N_BOOT) as sp:
+        res = sp.count(segment_results(exp, {'overall': None, **{s: df[s] for s in SEGMENTS}}, n_boot=N_BOOT))
+    overall = res[res['segment'] == 'overall']
 
-    convA, nA = int(agg.loc['A','conversions']), int(agg.loc['A','n'])
-    convB, nB = int(agg.loc['B','conversions']), int(agg.loc['B','n'])
-    pA = (convA / nA) if nA else 0.0
-    pB = (convB / nB) if nB else 0.0
+    # Primary metric: conversion = delivered to customer, one-sided z-test (B > A)
+    conv = overall.set_index('metric').loc['delivered']
+    nA, nB = int(conv['n_a']), int(conv['n_b'])
+    convA, convB = round(conv['mean_a'] * nA), round(conv['mean_b'] * nB)
+    pA, pB = conv['mean_a'], conv['mean_b']
     uplift = pB - pA
-
-    # One-sided z-test: H1: pB > pA
-    stat, pval = proportions_ztest([convB, convA], [nB, nA], alternative='larger')
+    _, pval = ztest_proportions(convB, nB, convA, nA, alternative='larger')
 
     # Power analysis: n per group for MDE = +2pp over baseline
     baseline = pA if pA > 0 else 0.10
     mde = 0.02
     analysis = NormalIndPower()
-    eff = proportion_effectsize(baseline, baseline + mde)
-    n_required = analysis.solve_power(effect_size=eff, alpha=0.05, power=0.8, ratio=1.0, alternative='larger')
+    eff = proportion_effectsize(min(baseline + mde, 1.0), baseline)  # positive for an increase
+    with span('abtest.solve_power'):
+        n_required = analysis.solve_power(effect_size=eff, alpha=0.05, power=0.8, ratio=1.0, alternative='larger')
+
+    segments = res[res['segment'] != 'overall']
+    significant = segments[segments['p_adj'] < ALPHA]
+    top = segments.sort_values(['p_adj', 'p']).head(15)
+    elapsed = time.perf_counter() - t0
 
+    header = ("<tr><th>Segment</th><th>Value</th><th>Metric</th><th>n A / B</th><th>A</th><th>B</th>"
+              "<th>B − A</th><th>95% bootstrap CI</th><th>p</th><th>p (BH)</th></tr>")
     html = f"""<!doctype html>
 <html><head><meta charset="utf-8"><title>Mock A/B Test Report</title>
-<style>body{{font-family:system-ui;max-width:860px;margin:24px auto;line-height:1.5}}</style></head>
+<style>body{{font-family:system-ui;max-width:960px;margin:24px auto;line-height:1.5}}
+table{{border-collapse:collapse;font-size:13px}}td,th{{padding:2px 8px;border-bottom:1px solid #e5e7eb;text-align:right}}</style></head>
 <body>
 <h1>Mock A/B Test — Promo Banner</h1>
 <p>Assignment: 50/50 by hashing <code>order_id</code>. Conversion = delivered to customer.</p>
@@ -58,15 +83,32 @@ def main():
   <li>A: {convA}/{nA} = {pA:.2%}</li>
   <li>B: {convB}/{nB} = {pB:.2%}</li>
   <li>Uplift: <b>{uplift:.2%}</b></li>
-  <li>One-sided z-test p-value (B &gt; A): <b>{pval:.4f}</b></li>
+  <li>One-sided z-test p-value (B &gt; A): <b>{float(pval):.4f}</b></li>
 </ul>
+<h2>All metrics</h2>
+<p>Revenue per order (B &gt; A) and delivery SLA in days for delivered orders (B &lt; A) next to conversion.
+Confidence intervals come from {N_BOOT} bootstrap replicates over {len(exp):,} orders in hash buckets.</p>
+<table>{header}
+{_rows(overall)}
+</table>
+<h2>Segments</h2>
+<p>{len(segments):,} segment tests (state, category, payment type, purchase week × 3 metrics);
+p-values adjusted with Benjamini–Hochberg across all of them.
+<b>{len(significant)}</b> significant at FDR {ALPHA:.0%}. Smallest adjusted p-values:</p>
+<table>{header}
+{_rows(top)}
+</table>
 <h2>Power analysis</h2>
 <p>Baseline = {baseline:.2%}, MDE = +2pp, α = 0.05, power = 0.8 → required n per group ≈ <b>{int(n_required)}</b></p>
 <p><i>Note:</i> Mock analysis for portfolio; in production randomize by session/visitor and pre-register the design.</p>
+<p style="color:#6b7280">Generated in {elapsed:.1f}s.</p>
 </body></html>"""
 
     OUT.write_text(html, encoding='utf-8')
     print("Wrote", OUT.resolve())
 
 if __name__ == '__main__':
+    ap = argparse.ArgumentParser(description='Build the mock A/B test report.')
+    profiling.add_argument(ap, 'abtest')
+    profiling.setup(ap.parse_args().profile, 'abtest')
     main()
@@ -1,9 +1,13 @@
 # dashboards/generate_dashboard.py
 
+import argparse
+import time
+import numpy as np
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 from pathlib import Path
+from plotly.offline import get_plotlyjs, get_plotlyjs_version
 
 # --- make project root importable ---
 import sys
@@ -13,26 +17,33 @@ if str(ROOT) not in sys.path:
 
 from src.metrics import (
     load,
-    funnel_counts,
+    columns_for,
+    compute,
     funnel_cr,
-    weekly_kpis,
-    top_geo,
-    cohort_retention,
     payment_breakdown,
     category_revenue,
-    sla_distribution,
+    SLA_DIGESTS,
+    load_sla_digests,
+    digest_quantiles,
+    late_stats,
+    load_cube,
 )
+from src.funnel import SLA_MAX_DAYS, reached_col, stage_names
+from src import bundle, profiling
+from src.profiling import profiled, span
 
 OUT_HTML = Path("docs/index.html")
+OUT_EXPLORE = Path("docs/explore.html")
+OUT_BUNDLE = Path("docs/explore.bin")
 REPO_URL = "https://github.com/kachowska/olist-funnel-dashboard"
 
 
 # -------------------------- figures --------------------------
 
 def funnel_fig(fdict: dict) -> go.Figure:
-    stages = ["created", "approved", "delivered_carrier", "delivered_customer"]
-    values = [fdict.get(s, 0) for s in stages]
-    fig = go.Figure(go.Funnel(y=stages, x=values, textinfo="value+percent previous"))
+    names = stage_names()
+    values = [fdict.get(s, 0) for s in names]
+    fig = go.Figure(go.Funnel(y=names, x=values, textinfo="value+percent previous"))
     fig.update_layout(title="Order Funnel")
     return fig
 
@@ -71,11 +82,13 @@ def category_fig(cat: pd.DataFrame) -> go.Figure:
     return fig
 
 
-def sla_fig(dist: pd.Series) -> go.Figure:
-    if dist.empty:
+def sla_fig(hist: pd.Series) -> go.Figure:
+    """Pre-binned SLA histogram (orders per 1-day bin, see metrics sla_histogram)."""
+    if hist.empty or not hist.sum():
         return go.Figure()
-    fig = px.histogram(dist, nbins=40)
-    fig.update_layout(title="Delivery SLA (days) — Histogram")
+    fig = go.Figure(go.Bar(x=hist.index.to_numpy(), y=hist.to_numpy(), width=1.0, name="orders"))
+    fig.update_layout(title="Delivery SLA (days) — Histogram", bargap=0,
+                      xaxis_title="days (last bin: slower)", yaxis_title="orders")
     return fig
 
 
@@ -89,34 +102,301 @@ def cohort_fig(retention: pd.DataFrame) -> go.Figure:
     return fig
 
 
+def compact(fig: go.Figure) -> go.Figure:
+    """Numeric trace arrays as float32/int32 NumPy arrays, which plotly writes as base64 typed arrays."""
+    for trace in fig.data:
+        for attr in ("x", "y", "z", "values"):
+            value = getattr(trace, attr, None)
+            if value is None or isinstance(value, str):
+                continue
+            arr = np.asarray(value)
+            if arr.dtype.kind == "f":
+                trace[attr] = arr.astype("float32")
+            elif arr.dtype.kind in "iub":
+                trace[attr] = arr.astype("int32")
+    return fig
+
+
+# -------------------------- data --------------------------
+
+# (figure name, builder, key in dashboard_data()) in page order; src/export_pngs.py renders the same list
+FIGURES = [
+    ("funnel", funnel_fig, "funnel_counts"),
+    ("weekly", weekly_fig, "weekly_kpis"),
+    ("aov", aov_fig, "weekly_kpis"),
+    ("payment", payment_fig, "payment_breakdown"),
+    ("category", category_fig, "category_revenue"),
+    ("sla", sla_fig, "sla_histogram"),
+    ("geo", geo_fig, "top_geo"),
+    ("cohort", cohort_fig, "cohort_retention"),
+]
+
+
+@profiled("dashboard.data")
+def dashboard_data() -> dict:
+    """Every input the figures need, from one compute() pass plus the ETL summaries."""
+    metrics = ["funnel_counts", "weekly_kpis", "top_geo", "cohort_retention", "sla_histogram"]
+    data = compute(load(columns_for(*metrics)), metrics, n=12)
+    data["payment_breakdown"] = payment_breakdown()
+    data["category_revenue"] = category_revenue(15)
+    if SLA_DIGESTS.exists():
+        digests, late = load_sla_digests()
+        data["sla_quantiles"] = digest_quantiles(digests).iloc[0]
+        data["late_stats"] = late_stats(late).iloc[0]
+    return data
+
+
+# -------------------------- explore bundle --------------------------
+# The explore page filters in the browser: it sums week x state cells of the rollup cube (stage
+# counts, orders, revenue) and week x state x SLA-day cells of the SLA cube, shipped as one columnar
+# bundle (src/bundle.py). Dimensions are stored as codes into the week/state lists in its metadata.
+
+BUNDLE_MEASURES = [*(reached_col(s) for s in stage_names()), "orders", "delivered", "revenue", "revenue_n"]
+
+
+def bundle_tables(cube: pd.DataFrame, sla: pd.DataFrame) -> tuple[dict, dict]:
+    """({"cells": week x state sums, "sla": week x state x sla_bin counts}, metadata) as codes."""
+    weeks = pd.DatetimeIndex(np.union1d(cube["order_purchase_week"].unique(), sla["order_purchase_week"].unique()))
+    states = pd.Index(sorted(set(cube["customer_state"].dropna()) | set(sla["customer_state"].dropna())))
+
+    def coded(frame, dims, measures):
+        out = (frame.dropna(subset=["customer_state"])
+                    .groupby(["order_purchase_week", "customer_state", *dims], observed=True)[measures].sum()
+                    .reset_index())
+        out = out[(out[measures] != 0).any(axis=1)]
+        return pd.DataFrame({"week": weeks.get_indexer(out["order_purchase_week"]),
+                             "state": states.get_indexer(out["customer_state"]),
+                             **{c: out[c].to_numpy() for c in [*dims, *measures]}})
+
+    tables = {"cells": coded(cube, [], BUNDLE_MEASURES), "sla": coded(sla, ["sla_bin"], ["n"])}
+    meta = {"weeks": [w.strftime("%Y-%m-%d") for w in weeks], "states": states.tolist(),
+            "stages": stage_names(), "sla_max": SLA_MAX_DAYS}
+    return tables, meta
+
+
+@profiled("dashboard.bundle")
+def write_bundle(path: Path = OUT_BUNDLE) -> dict:
+    tables, meta = bundle_tables(*load_cube())
+    data = bundle.encode(tables, meta)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+    return {"cells": len(tables["cells"]), "sla": len(tables["sla"]), "bytes": len(data)}
+
+
+# Everything the explore page runs; decode + aggregate touch no DOM, so benchmarks/bench_explore.py
+# runs the same code under Node.
+EXPLORE_JS = r"""
+const TYPES = {uint8: Uint8Array, uint16: Uint16Array, uint32: Uint32Array,
+               float32: Float32Array, float64: Float64Array};
+
+// gzip'ed bundle stream -> {meta, tables: {name: {rows, column: typed array}}}
+async function decodeBundle(stream) {
+  const buf = await new Response(stream.pipeThrough(new DecompressionStream("gzip"))).arrayBuffer();
+  if (new TextDecoder().decode(new Uint8Array(buf, 0, 4)) !== "OLAG") throw new Error("not an aggregate bundle");
+  const n = new DataView(buf).getUint32(4, true);
+  const header = JSON.parse(new TextDecoder().decode(new Uint8Array(buf, 8, n)));
+  const body = 8 + n + ((8 - (8 + n) % 8) % 8);
+  const tables = {};
+  for (const [name, t] of Object.entries(header.tables)) {
+    tables[name] = {rows: t.rows};
+    for (const c of t.columns) tables[name][c.name] = new TYPES[c.dtype](buf, body + c.offset, c.length);
+  }
+  return {meta: header.meta, tables};
+}
+
+// Sums of the cells with week code in [w0, w1] and state code in `states` (null: all states)
+function aggregate(b, w0, w1, states) {
+  const {meta, tables: {cells, sla}} = b;
+  const nw = meta.weeks.length, stages = meta.stages;
+  let keep = null;
+  if (states && states.length) {
+    keep = new Uint8Array(meta.states.length);
+    for (const s of states) keep[s] = 1;
+  }
+  const sum = {orders: new Float64Array(nw), delivered: new Float64Array(nw),
+               revenue: new Float64Array(nw), revenue_n: new Float64Array(nw)};
+  const seen = new Uint8Array(nw), funnel = new Float64Array(stages.length);
+  const reached = stages.map(s => cells["reached_" + s]);
+  for (let i = 0; i < cells.rows; i++) {
+    const w = cells.week[i];
+    if (w < w0 || w > w1 || (keep && !keep[cells.state[i]])) continue;
+    seen[w] = 1;
+    for (const k in sum) sum[k][w] += cells[k][i];
+    for (let s = 0; s < stages.length; s++) funnel[s] += reached[s][i];
+  }
+  const hist = new Float64Array(meta.sla_max + 1);
+  for (let i = 0; i < sla.rows; i++) {
+    const w = sla.week[i];
+    if (w < w0 || w > w1 || (keep && !keep[sla.state[i]])) continue;
+    hist[sla.sla_bin[i]] += sla.n[i];
+  }
+  const weeks = [];
+  for (let w = w0; w <= w1; w++) if (seen[w]) weeks.push(w);
+  return {funnel, hist, weeks,
+          orders: weeks.map(w => sum.orders[w]), delivered: weeks.map(w => sum.delivered[w]),
+          revenue: weeks.map(w => sum.revenue[w]),
+          aov: weeks.map(w => sum.revenue[w] / Math.max(sum.revenue_n[w], 1))};
+}
+
+function render(b, r, ms) {
+  const {stages, weeks: labels} = b.meta;
+  const weeks = r.weeks.map(w => labels[w]);
+  const pct = x => (100 * x).toFixed(2) + "%";
+  const steps = stages.slice(1).map((s, i) =>
+    `<li>${stages[i]}→${s}: <b>${pct(r.funnel[i] ? r.funnel[i + 1] / r.funnel[i] : 0)}</b></li>`);
+  const overall = r.funnel[0] ? r.funnel[stages.length - 1] / r.funnel[0] : 0;
+  document.getElementById("kpis").innerHTML =
+    `<p>Overall conversion (created → delivered_customer): <b>${pct(overall)}</b></p><ul>${steps.join("")}</ul>`;
+  const line = (k) => ({type: "scatter", mode: "lines+markers", name: k, x: weeks, y: r[k]});
+  Plotly.react("funnel", [{type: "funnel", y: stages, x: Array.from(r.funnel), textinfo: "value+percent previous"}],
+               {title: {text: "Order Funnel"}});
+  Plotly.react("weekly", ["orders", "delivered", "revenue"].map(line),
+               {title: {text: "Weekly Orders, Deliveries, and Revenue"}});
+  Plotly.react("aov", [line("aov")], {title: {text: "Average Order Value (Weekly)"}});
+  Plotly.react("sla", [{type: "bar", x: Array.from(r.hist.keys()), y: Array.from(r.hist), width: 1, name: "orders"}],
+               {title: {text: "Delivery SLA (days) — Histogram"}, bargap: 0,
+                xaxis: {title: {text: "days (last bin: slower)"}}, yaxis: {title: {text: "orders"}}});
+  document.getElementById("status").textContent =
+    `${(b.tables.cells.rows + b.tables.sla.rows).toLocaleString()} cells summed in ${ms.toFixed(1)} ms`;
+}
+
+async function explore(url) {
+  const resp = await fetch(url);
+  const b = await decodeBundle(resp.body);
+  const [w0, w1, st] = ["w0", "w1", "states"].map(id => document.getElementById(id));
+  b.meta.weeks.forEach((w, i) => { w0.add(new Option(w, i)); w1.add(new Option(w, i)); });
+  b.meta.states.forEach((s, i) => st.add(new Option(s, i)));
+  w1.selectedIndex = b.meta.weeks.length - 1;
+  const update = () => {
+    const states = Array.from(st.selectedOptions, o => +o.value);
+    const t0 = performance.now();
+    const r = aggregate(b, +w0.value, +w1.value, states);
+    render(b, r, performance.now() - t0);
+  };
+  for (const el of [w0, w1, st]) el.addEventListener("change", update);
+  document.getElementById("reset").addEventListener("click", () => {
+    w0.selectedIndex = 0; w1.selectedIndex = b.meta.weeks.length - 1; st.selectedIndex = -1; update();
+  });
+  update();
+}
+"""
+
+
 # -------------------------- build page --------------------------
 
-def main():
-    # data & metrics
-    df = load()
-    fdict = funnel_counts(df)
-    cr_step, overall = funnel_cr(fdict)
-    weekly = weekly_kpis(df)
-    geo = top_geo(df, n=12)
-    retention = cohort_retention(df)
-    pb = payment_breakdown()
-    cat = category_revenue(15)
-    sla = sla_distribution(df)
-
-    # figures to html fragments
-    figs = [
-        funnel_fig(fdict),
-        weekly_fig(weekly),
-        aov_fig(weekly),
-        payment_fig(pb),
-        category_fig(cat),
-        sla_fig(sla),
-        geo_fig(geo),
-        cohort_fig(retention),
-    ]
-    figs_html = "\n".join(fig.to_html(full_html=False, include_plotlyjs="cdn") for fig in figs)
+NAV = f"""<header class="nav">
+        <div class="brand">E-commerce Funnel (Olist)</div>
+        <nav>
+          <a href="index.html">Dashboard</a>
+          <a href="explore.html">Explore</a>
+          <a href="abtest.html">A/B test report</a>
+          <a href="{REPO_URL}">Repository</a>
+        </nav>
+      </header>"""
+
+STYLE = """:root { --maxw: 1200px; }
+      body {
+        font-family: system-ui, -apple-system, Segoe UI, Roboto, Helvetica, Arial, sans-serif;
+        margin: 24px;
+      }
+      .wrap { max-width: var(--maxw); margin: 0 auto; }
+      header.nav {
+        display: flex; gap: 16px; align-items: center; justify-content: space-between;
+        padding: 8px 0 16px 0; border-bottom: 1px solid #e5e7eb; margin-bottom: 16px;
+      }
+      header.nav .brand { font-weight: 700; font-size: 18px; }
+      header.nav nav a { margin-left: 16px; text-decoration: none; color: #1f2937; }
+      header.nav nav a:hover { text-decoration: underline; }
+      footer { color:#6b7280; margin: 24px 0; }"""
+
+
+def plotly_script(plotlyjs: str) -> str:
+    if plotlyjs == "inline":
+        return f"<script>{get_plotlyjs()}</script>"
+    return f'<script charset="utf-8" src="https://cdn.plot.ly/plotly-{get_plotlyjs_version()}.min.js"></script>'
+
+
+@profiled("dashboard.explore")
+def write_explore(plotlyjs: str = "cdn"):
+    """Write docs/explore.bin and docs/explore.html, which filters it by week range and state."""
+    info = write_bundle()
+    page_html = f"""<!doctype html>
+<html lang="en">
+  <head>
+    <meta charset="utf-8">
+    <title>Olist Funnel Dashboard — Explore</title>
+    <meta name="viewport" content="width=device-width, initial-scale=1" />
+    <style>
+      {STYLE}
+      .filters {{ display: flex; gap: 16px; align-items: flex-start; margin-bottom: 16px; }}
+      .filters label {{ display: flex; flex-direction: column; gap: 4px; font-size: 14px; }}
+      #status {{ color: #6b7280; font-size: 13px; }}
+    </style>
+    {plotly_script(plotlyjs)}
+  </head>
+  <body>
+    <div class="wrap">
+      {NAV}
+
+      <h1 style='margin:0 0 8px 0'>Explore</h1>
+      <div class="filters">
+        <label>From week <select id="w0"></select></label>
+        <label>To week <select id="w1"></select></label>
+        <label>States (none selected: all) <select id="states" multiple size="8"></select></label>
+        <button id="reset">Reset</button>
+      </div>
+      <p id="status"></p>
+      <section id="kpis"></section>
+      <div id="funnel"></div>
+      <div id="weekly"></div>
+      <div id="aov"></div>
+      <div id="sla"></div>
+
+      <footer>
+        Filtered in the browser from pre-aggregated week × state cells ({OUT_BUNDLE.name}).
+        Dataset: Brazilian E-Commerce Public Dataset by Olist (Kaggle).
+      </footer>
+    </div>
+    <script>{EXPLORE_JS}</script>
+    <script>explore("{OUT_BUNDLE.name}");</script>
+  </body>
+</html>"""
+    OUT_EXPLORE.write_text(page_html, encoding="utf-8")
+    print(f"bundle {info['bytes'] / 1024:,.1f} KB ({info['cells']:,} cells, {info['sla']:,} SLA cells), "
+          f"page {len(page_html.encode('utf-8')) / 1024:,.1f} KB")
+    print("Wrote", OUT_EXPLORE.resolve())
+
+
+@profiled("dashboard.main")
+def main(plotlyjs: str = "cdn"):
+    """Write docs/index.html; `plotlyjs` is "cdn" (one script tag) or "inline" (offline page)."""
+    data = dashboard_data()
+    cr_step, overall = funnel_cr(data["funnel_counts"])
+
+    # figures to html fragments; plotly.js goes into the first one only
+    include = {"cdn": "cdn", "inline": True}[plotlyjs]
+    fragments, report = [], []
+    for i, (name, build, key) in enumerate(FIGURES):
+        t0 = time.perf_counter()
+        with span(f"dashboard.{name}_fig"):
+            fig = compact(build(data[key]))
+        t1 = time.perf_counter()
+        with span(f"dashboard.{name}_to_html"):
+            html = fig.to_html(full_html=False, include_plotlyjs=include if i == 0 else False)
+        report.append((name, t1 - t0, time.perf_counter() - t1, len(html.encode("utf-8"))))
+        fragments.append(html)
+    figs_html = "\n".join(fragments)
 
     # intro block with KPIs
+    sla_html = ""
+    if "sla_quantiles" in data:
+        q, late = data["sla_quantiles"], data["late_stats"]
+        sla_html = (
+            f"<p style='margin:0 0 24px 0'>Delivery SLA (approved → delivered): "
+            f"p50 <b>{q['p50']:.1f}</b> / p90 <b>{q['p90']:.1f}</b> / p99 <b>{q['p99']:.1f}</b> days; "
+            f"delivered after the estimated date: <b>{late['late_share']:.2%}</b> "
+            f"(on average {late['avg_days_late']:.1f} days late)</p>"
+        )
     intro_html = (
         f"<section>"
         f"<h1 style='margin:0 0 8px 0'>E-commerce Sales Funnel Dashboard</h1>"
@@ -125,7 +405,8 @@ def main():
         + "<ul style='margin:0 0 24px 18px'>"
         + "".join(f"<li>{k}: <b>{v:.2%}</b></li>" for k, v in cr_step.items())
         + "</ul>"
-        f"</section>"
+        + sla_html
+        + "</section>"
     )
 
     # full static page with top nav
@@ -136,32 +417,12 @@ def main():
     <title>Olist Funnel Dashboard</title>
     <meta name="viewport" content="width=device-width, initial-scale=1" />
     <style>
-      :root {{ --maxw: 1200px; }}
-      body {{
-        font-family: system-ui, -apple-system, Segoe UI, Roboto, Helvetica, Arial, sans-serif;
-        margin: 24px;
-      }}
-      .wrap {{ max-width: var(--maxw); margin: 0 auto; }}
-      header.nav {{
-        display: flex; gap: 16px; align-items: center; justify-content: space-between;
-        padding: 8px 0 16px 0; border-bottom: 1px solid #e5e7eb; margin-bottom: 16px;
-      }}
-      header.nav .brand {{ font-weight: 700; font-size: 18px; }}
-      header.nav nav a {{ margin-left: 16px; text-decoration: none; color: #1f2937; }}
-      header.nav nav a:hover {{ text-decoration: underline; }}
-      footer {{ color:#6b7280; margin: 24px 0; }}
+      {STYLE}
     </style>
   </head>
   <body>
     <div class="wrap">
-      <header class="nav">
-        <div class="brand">E-commerce Funnel (Olist)</div>
-        <nav>
-          <a href="index.html">Dashboard</a>
-          <a href="abtest.html">A/B test report</a>
-          <a href="{REPO_URL}">Repository</a>
-        </nav>
-      </header>
+      {NAV}
 
       {intro_html}
 
@@ -176,8 +437,19 @@ def main():
 
     OUT_HTML.parent.mkdir(parents=True, exist_ok=True)
     OUT_HTML.write_text(page_html, encoding="utf-8")
+    print(f"{'figure':10s} {'build':>8s} {'to_html':>8s} {'size':>10s}")
+    for name, build_s, html_s, size in report:
+        print(f"{name:10s} {build_s:7.3f}s {html_s:7.3f}s {size / 1024:8.1f} KB")
+    print(f"page {len(page_html.encode('utf-8')) / 1024:,.1f} KB (plotly.js {plotlyjs})")
     print("Wrote", OUT_HTML.resolve())
+    write_explore(plotlyjs)
 
 
 if __name__ == "__main__":
-    main()
+    ap = argparse.ArgumentParser(description="Build the static dashboard page.")
+    ap.add_argument("--plotlyjs", choices=["cdn", "inline"], default="cdn",
+                    help="load plotly.js from the CDN, or inline it once for a fully offline page")
+    profiling.add_argument(ap, "dashboard")
+    args = ap.parse_args()
+    profiling.setup(args.profile, "dashboard")
+    main(args.plotlyjs)
@@ -0,0 +1,201 @@
+import hashlib
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from scipy.stats import norm
+from statsmodels.stats.multitest import multipletests
+
+# --- Deterministic assignment ---
+# The split is md5(order_id): variant B when the first digest byte is odd. MD5 is computed for
+# all ids at once with NumPy (one 64-byte block per id, so ids up to 55 bytes; longer ones fall
+# back to hashlib), which gives exactly the digests hashlib would.
+
+_MD5_K = np.floor(np.abs(np.sin(np.arange(1, 65))) * 2**32).astype(np.uint32)
+_MD5_S = np.array([7, 12, 17, 22] * 4 + [5, 9, 14, 20] * 4 + [4, 11, 16, 23] * 4 + [6, 10, 15, 21] * 4)
+_MD5_G = np.array([i if i < 16 else (5*i + 1) % 16 if i < 32 else (3*i + 5) % 16 if i < 48 else (7*i) % 16
+                   for i in range(64)])
+_MD5_INIT = np.array([0x67452301, 0xefcdab89, 0x98badcfe, 0x10325476], dtype=np.uint32)
+_MD5_CHUNK = 32768
+
+
+def _md5_words(block):
+    """First digest word (little-endian) for each row of an (n, 16) uint32 message block."""
+    a0, b0, c0, d0 = (np.full(len(block), v, dtype=np.uint32) for v in _MD5_INIT)
+    a, b, c, d = a0, b0, c0, d0
+    words = np.ascontiguousarray(block.T)
+    for i in range(64):
+        if i < 16:
+            f = (b & c) | (~b & d)
+        elif i < 32:
+            f = (d & b) | (~d & c)
+        elif i < 48:
+            f = b ^ c ^ d
+        else:
+            f = c ^ (b | ~d)
+        f = f + a + _MD5_K[i] + words[_MD5_G[i]]
+        s = np.uint32(_MD5_S[i])
+        a, d, c = d, c, b
+        b = b + ((f << s) | (f >> (np.uint32(32) - s)))
+    return a + a0
+
+
+def md5_prefix(ids):
+    """First 4 bytes of md5(str(id)) per id, as a little-endian uint32 array."""
+    arr = pa.array(pd.Series(ids, dtype=object).astype(str), type=pa.string())
+    offsets = np.frombuffer(arr.buffers()[1], dtype=np.int32)[arr.offset:arr.offset + len(arr) + 1]
+    data = np.frombuffer(arr.buffers()[2], dtype=np.uint8) if len(arr) else np.zeros(0, np.uint8)
+    lengths = np.diff(offsets)
+    out = np.empty(len(arr), dtype=np.uint32)
+    for length in np.unique(lengths):
+        rows = np.flatnonzero(lengths == length)
+        if length > 55:
+            for r in rows:
+                out[r] = int.from_bytes(hashlib.md5(data[offsets[r]:offsets[r+1]].tobytes()).digest()[:4], 'little')
+            continue
+        # cache-sized chunks: the 64 rounds make many temporaries per row
+        for chunk in np.array_split(rows, max(1, len(rows) // _MD5_CHUNK)):
+            block = np.zeros((len(chunk), 64), dtype=np.uint8)
+            block[:, :length] = data[offsets[chunk, None] + np.arange(length)]
+            block[:, length] = 0x80
+            block[:, 56:64] = np.frombuffer(np.uint64(length * 8).tobytes(), dtype=np.uint8)
+            out[chunk] = _md5_words(block.view('<u4'))
+    return out
+
+
+def assign_variants(ids):
+    """'A'/'B' per id; same split as hashing each id with hashlib.md5 (B if the first byte is odd)."""
+    return np.where(md5_prefix(ids) & 1, 'B', 'A')
+
+
+# --- Batched tests ---
+# Every test works on arrays, one element per (segment, metric), so hundreds of segments cost a
+# handful of NumPy operations.
+
+def _pvalue(z, alternative):
+    if alternative == 'larger':
+        return norm.sf(z)
+    if alternative == 'smaller':
+        return norm.cdf(z)
+    return 2 * norm.sf(np.abs(z))
+
+
+def ztest_proportions(x_b, n_b, x_a, n_a, alternative='larger'):
+    """Pooled two-proportion z-test of B vs A (same statistic as statsmodels' proportions_ztest)."""
+    x_b, n_b, x_a, n_a = (np.asarray(v, dtype='float64') for v in (x_b, n_b, x_a, n_a))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        pooled = (x_b + x_a) / (n_b + n_a)
+        se = np.sqrt(pooled * (1 - pooled) * (1 / n_b + 1 / n_a))
+        z = (x_b / n_b - x_a / n_a) / se
+    return z, _pvalue(z, alternative)
+
+
+def ztest_means(mean_b, var_b, n_b, mean_a, var_a, n_a, alternative='two-sided'):
+    """Unpooled (Welch-style) z-test for a difference in means, B minus A."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        z = (np.asarray(mean_b) - mean_a) / np.sqrt(np.asarray(var_b) / n_b + np.asarray(var_a) / n_a)
+    return z, _pvalue(z, alternative)
+
+
+def adjust_pvalues(pvalues, method='fdr_bh'):
+    """Multiple-testing adjusted p-values (NaN entries stay NaN)."""
+    p = np.asarray(pvalues, dtype='float64')
+    out = np.full(p.shape, np.nan)
+    ok = ~np.isnan(p)
+    if ok.any():
+        out[ok] = multipletests(p[ok], method=method)[1]
+    return out
+
+
+# --- Segmented analysis ---
+
+# name -> (value column, rows the metric is defined on or None, alternative that counts as a win)
+METRICS = {
+    'delivered': ('converted', None, 'larger'),
+    'revenue_per_order': ('revenue', None, 'larger'),
+    'sla_days': ('sla_days', 'delivered', 'smaller'),
+}
+N_BUCKETS = 128   # hash buckets per variant, resampled by the bootstrap
+
+
+def experiment_frame(df):
+    """Per-order columns the analysis needs: variant, bucket and the metric values."""
+    h = md5_prefix(df['order_id'])
+    delivered = (df['status_stage'] == 'delivered_customer').to_numpy()
+    return pd.DataFrame({
+        'variant_b': (h & 1).astype(bool),
+        'bucket': ((h >> 8) % N_BUCKETS).astype(np.int64),
+        'converted': delivered.astype('float64'),
+        'delivered': delivered,
+        'revenue': df['revenue'].fillna(0).to_numpy(dtype='float64'),
+        'sla_days': df['sla_days'].to_numpy(dtype='float64'),
+    }, index=df.index)
+
+
+def _bucket_sums(codes, n_groups, exp, value, rows):
+    """(n_groups, 2 variants, N_BUCKETS) count, sum and sum of squares of `value` over `rows`."""
+    x = exp[value].to_numpy()
+    keep = ~np.isnan(x) if rows is None else (exp[rows].to_numpy() & ~np.isnan(x))
+    keep &= codes >= 0
+    key = (codes[keep] * 2 + exp['variant_b'].to_numpy()[keep]) * N_BUCKETS + exp['bucket'].to_numpy()[keep]
+    size = n_groups * 2 * N_BUCKETS
+    shape = (n_groups, 2, N_BUCKETS)
+    x = x[keep]
+    return (np.bincount(key, minlength=size).reshape(shape).astype('float64'),
+            np.bincount(key, weights=x, minlength=size).reshape(shape),
+            np.bincount(key, weights=x * x, minlength=size).reshape(shape))
+
+
+def bootstrap_ci(n, s, n_boot=1000, level=0.95, seed=0):
+    """Percentile CI of mean(B) - mean(A) per group by resampling hash buckets.
+
+    `n` and `s` are (groups, 2, buckets) counts and sums. Each replicate draws each variant's
+    buckets with replacement (multinomial weights) and the same draws are applied to every group,
+    so all groups are resampled with one tensor product instead of a Python loop.
+    """
+    rng = np.random.default_rng(seed)
+    k = n.shape[-1]
+    w = rng.multinomial(k, np.full(k, 1 / k), size=(n_boot, 2)).astype('float64')   # (n_boot, 2, buckets)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        means = np.einsum('gvk,bvk->gvb', s, w) / np.einsum('gvk,bvk->gvb', n, w)     # (groups, 2, n_boot)
+        diff = means[:, 1] - means[:, 0]
+    alpha = (1 - level) / 2
+    lo, hi = np.nanquantile(diff, [alpha, 1 - alpha], axis=1) if diff.size else (np.zeros(0), np.zeros(0))
+    return lo, hi
+
+
+def segment_results(exp, segments, n_boot=1000, correction='fdr_bh', seed=0):
+    """One row per (segment, value, metric) with A/B means, uplift, z, p, adjusted p and a bootstrap CI.
+
+    `segments` maps a segment name to a Series aligned with `exp` (None = all orders). P-values are
+    adjusted across every test in the table at once.
+    """
+    frames = []
+    for seg, values in segments.items():
+        if values is None:
+            codes, labels = np.zeros(len(exp), dtype=np.int64), pd.Index(['all'])
+        else:
+            codes, labels = pd.factorize(values, sort=True)
+            codes = codes.astype(np.int64)
+            labels = pd.Index(labels)
+        for metric, (value, rows, alternative) in METRICS.items():
+            n, s, ss = _bucket_sums(codes, len(labels), exp, value, rows)
+            n_v, s_v, ss_v = n.sum(axis=2), s.sum(axis=2), ss.sum(axis=2)   # (groups, 2)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                mean = s_v / n_v
+                var = ss_v / n_v - mean ** 2
+            if value == 'converted':
+                z, p = ztest_proportions(s_v[:, 1], n_v[:, 1], s_v[:, 0], n_v[:, 0], alternative)
+            else:
+                z, p = ztest_means(mean[:, 1], var[:, 1], n_v[:, 1], mean[:, 0], var[:, 0], n_v[:, 0],
+                                   alternative)
+            lo, hi = bootstrap_ci(n, s, n_boot=n_boot, seed=seed)
+            frames.append(pd.DataFrame({
+                'segment': seg, 'value': labels.astype(str), 'metric': metric,
+                'n_a': n_v[:, 0].astype('int64'), 'n_b': n_v[:, 1].astype('int64'),
+                'mean_a': mean[:, 0], 'mean_b': mean[:, 1], 'diff': mean[:, 1] - mean[:, 0],
+                'ci_low': lo, 'ci_high': hi, 'z': z, 'p': p, 'alternative': alternative,
+            }))
+    out = pd.concat(frames, ignore_index=True)
+    out['p_adj'] = adjust_pvalues(out['p'], correction)
+    return out
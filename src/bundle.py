@@ -0,0 +1,73 @@
+import gzip
+import json
+import struct
+import numpy as np
+import pandas as pd
+
+# Columnar aggregate bundle for the static explore page (dashboards/generate_dashboard.py).
+#
+# Layout (little-endian), gzip-compressed as a whole, which the browser undoes with
+# DecompressionStream:
+#   b'OLAG' | uint32 header length | JSON header | padding to 8 bytes | column buffers
+# The header holds the caller's metadata plus, per table, its row count and every column's dtype,
+# byte offset and length. Each buffer starts 8-byte aligned, so the page views it as a typed array
+# without copying. Integer columns are stored in the smallest unsigned type that holds them.
+
+MAGIC = b'OLAG'
+VERSION = 1
+ALIGN = 8
+
+
+def smallest(values):
+    """`values` as the narrowest unsigned int dtype holding them (floats become float64)."""
+    values = np.asarray(values)
+    if values.dtype.kind == 'f':
+        return values.astype('float64')
+    hi = int(values.max()) if values.size else 0
+    if values.size and values.min() < 0:
+        raise ValueError('bundle integer columns must be non-negative')
+    for dtype in ('uint8', 'uint16', 'uint32'):
+        if hi <= np.iinfo(dtype).max:
+            return values.astype(dtype)
+    raise OverflowError(f'{hi:,} does not fit a uint32 bundle column')
+
+
+def _pad(n):
+    return -n % ALIGN
+
+
+def encode(tables, meta=None, level=9):
+    """gzip'ed bundle bytes for {table name: DataFrame of numeric columns} and JSON-able `meta`."""
+    buffers, layout, offset = [], {}, 0
+    for name, frame in tables.items():
+        columns = []
+        for col in frame.columns:
+            arr = smallest(frame[col].to_numpy())
+            data = arr.astype(arr.dtype.newbyteorder('<'), copy=False).tobytes()
+            columns.append({'name': col, 'dtype': arr.dtype.name, 'offset': offset, 'length': len(arr)})
+            buffers += [data, b'\0' * _pad(len(data))]
+            offset += len(data) + _pad(len(data))
+        layout[name] = {'rows': len(frame), 'columns': columns}
+    header = json.dumps({'version': VERSION, 'meta': meta or {}, 'tables': layout},
+                        separators=(',', ':')).encode('utf-8')
+    start = len(MAGIC) + 4 + len(header)
+    raw = b''.join([MAGIC, struct.pack('<I', len(header)), header, b' ' * _pad(start), *buffers])
+    return gzip.compress(raw, compresslevel=level, mtime=0)
+
+
+def decode(data):
+    """(meta, {table: DataFrame}) from encode() output."""
+    raw = gzip.decompress(data)
+    if raw[:len(MAGIC)] != MAGIC:
+        raise ValueError('not an aggregate bundle')
+    n = struct.unpack_from('<I', raw, len(MAGIC))[0]
+    start = len(MAGIC) + 4 + n
+    header = json.loads(raw[len(MAGIC) + 4:start])
+    body = start + _pad(start)
+    tables = {}
+    for name, table in header['tables'].items():
+        tables[name] = pd.DataFrame({
+            c['name']: np.frombuffer(raw, dtype=np.dtype(c['dtype']).newbyteorder('<'),
+                                     count=c['length'], offset=body + c['offset'])
+            for c in table['columns']})
+    return header['meta'], tables
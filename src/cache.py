@@ -0,0 +1,116 @@
+import os
+import sys
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# Memory budget for cached frames and metric results (MB); override with OLIST_CACHE_MB.
+DEFAULT_BUDGET_MB = int(os.environ.get('OLIST_CACHE_MB', 512))
+
+
+def nbytes(value):
+    """Approximate in-memory size of a cached value."""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(deep=True))
+    if isinstance(value, np.ndarray):
+        return int(value.nbytes)
+    if isinstance(value, (tuple, list)):
+        return sum(nbytes(v) for v in value)
+    if isinstance(value, dict):
+        return sum(nbytes(k) + nbytes(v) for k, v in value.items())
+    return sys.getsizeof(value)
+
+
+class LRUCache:
+    """Thread-safe LRU keyed by hashable tuples, evicting by total size rather than entry count."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = self.misses = self.evictions = 0
+
+    def get_or_compute(self, key, compute):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key][0]
+            self.misses += 1
+        value = compute()
+        self._put(key, value)
+        return value
+
+    def _put(self, key, value):
+        size = nbytes(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._data:
+                self.bytes -= self._data.pop(key)[1]
+            self._data[key] = (value, size)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                _, (_, old) = self._data.popitem(last=False)
+                self.bytes -= old
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                    'entries': len(self._data), 'mb': self.bytes / 2**20,
+                    'budget_mb': self.max_bytes / 2**20}
+
+
+def _new_cache(budget_mb=DEFAULT_BUDGET_MB):
+    return LRUCache(int(budget_mb * 2**20))
+
+
+_cache = None
+_budget_mb = DEFAULT_BUDGET_MB
+
+
+def get_cache():
+    """The process-wide cache.
+
+    Inside a Streamlit app it is held by st.cache_resource so it is shared by every session and
+    survives script reruns (one instance per budget); the dashboards/ scripts get a plain
+    module-level instance.
+    """
+    global _cache
+    st = sys.modules.get('streamlit')
+    if st is not None and hasattr(st, 'cache_resource'):
+        return st.cache_resource(show_spinner=False)(_new_cache)(_budget_mb)
+    if _cache is None:
+        _cache = _new_cache(_budget_mb)
+    return _cache
+
+
+def configure(budget_mb):
+    """Use a cache with a new memory budget from now on (an empty one unless Streamlit already holds it)."""
+    global _cache, _budget_mb
+    _budget_mb = budget_mb
+    _cache = None
+
+
+def file_version(path):
+    """(mtime_ns, size) of a file, or of every Parquet file under a dataset directory."""
+    path = Path(path)
+    if path.is_dir():
+        return tuple((str(p.relative_to(path)), p.stat().st_mtime_ns, p.stat().st_size)
+                     for p in sorted(path.rglob('*.parquet')))
+    if path.exists():
+        st = path.stat()
+        return (st.st_mtime_ns, st.st_size)
+    return None
@@ -0,0 +1,165 @@
+"""The frame metrics of src/metrics.py as SQL run by an embedded DuckDB over the processed Parquet.
+
+Nothing is loaded into pandas but the (small) results: DuckDB scans only the columns and row
+groups a query needs, on all cores, and spills to disk when a query does not fit in memory.
+Results have the same columns, dtypes and order as the pandas backend (see metrics.evaluate()).
+"""
+import threading
+
+import numpy as np
+import pandas as pd
+
+from src.funnel import SLA_MAX_DAYS, STAGES, stage_names
+from src.metrics import FACT_LABELS, INP, INP_DS, ORDER_INDEX, ORDER_ITEMS, ORDER_PAYMENTS
+from src.profiling import span
+from src.retention import retention_matrix
+
+_local = threading.local()
+
+
+def connection():
+    """This thread's in-process DuckDB connection (connections must not be shared across threads)."""
+    if getattr(_local, 'con', None) is None:
+        import duckdb
+        _local.con = duckdb.connect()
+    return _local.con
+
+
+def _parquet(path):
+    return "read_parquet('%s')" % path.as_posix().replace("'", "''")
+
+
+def source():
+    """read_parquet() over the month-partitioned master if present, else the single file."""
+    if INP_DS.is_dir():
+        path = (INP_DS / '**' / '*.parquet').as_posix().replace("'", "''")
+        return f"read_parquet('{path}', hive_partitioning = true)"
+    return _parquet(INP)
+
+
+def where(date_range=None, states=None, categories=None, payment_types=None, stages=None):
+    """Sidebar filters (see metrics.evaluate) as a WHERE clause and its parameters.
+
+    With the order facts, categories / payment types keep the orders having such an item / payment.
+    """
+    clauses, params = [], []
+    if date_range:
+        clauses.append('order_purchase_week BETWEEN ? AND ?')
+        params += [pd.Timestamp(date_range[0]).to_pydatetime(), pd.Timestamp(date_range[1]).to_pydatetime()]
+    by_facts = ORDER_INDEX.exists()
+    for col, sel in (('customer_state', states), ('status_stage', stages)) + (() if by_facts else (
+                     ('product_category_name', categories), ('payment_type', payment_types))):
+        if sel:
+            clauses.append(f'list_contains(?, {col})')
+            params.append([str(s) for s in sel])
+    for path, table, sel in ((ORDER_ITEMS, 'items', categories), (ORDER_PAYMENTS, 'payments', payment_types)):
+        if by_facts and sel:
+            clauses.append(f'order_id IN (SELECT order_id FROM {_parquet(path)} '
+                           f'WHERE list_contains(?, {FACT_LABELS[table]}))')
+            params.append([str(s) for s in sel])
+    return ('WHERE ' + ' AND '.join(clauses)) if clauses else '', params
+
+
+def _query(sql, filters, extra=''):
+    """Run `sql` with {src} -> the master, {where} -> the filters (plus `extra` conditions)."""
+    clause, params = where(**(filters or {}))
+    if extra:
+        clause = f'{clause} AND {extra}' if clause else f'WHERE {extra}'
+    return connection().execute(sql.format(src=source(), where=clause), params).df()
+
+
+def _ns(df, *cols):
+    # DuckDB hands timestamps back as datetime64[us]; the pandas backend uses nanoseconds
+    return df.astype({c: 'datetime64[ns]' for c in cols})
+
+
+def _distinct(col, distinct):
+    return f'approx_count_distinct({col})' if distinct == 'hll' else f'count(DISTINCT {col})'
+
+
+# --- Metrics (same results as the pandas engine in src/metrics.py) ---
+
+def _funnel_counts(filters, stages=STAGES, **_):
+    cols = [col for _, col in stages]
+    reached = [' AND '.join(f'{c} IS NOT NULL' for c in cols[:i + 1]) for i in range(len(cols))]
+    sql = 'SELECT ' + ', '.join(f'count(*) FILTER (WHERE {r})' for r in reached) + ' FROM {src} {where}'
+    counts = _query(sql, filters).iloc[0]
+    return {name: int(n) for name, n in zip(stage_names(stages), counts)}
+
+
+def _weekly_kpis(filters, distinct='exact', **_):
+    weekly = _query(f"""
+        SELECT order_purchase_week,
+               {_distinct('order_id', distinct)} AS orders,
+               count(order_delivered_customer_date) AS delivered,
+               coalesce(sum(revenue), 0) AS revenue,
+               coalesce(sum(revenue), 0) / greatest(count(revenue), 1) AS aov
+        FROM {{src}} {{where}}
+        GROUP BY ALL ORDER BY order_purchase_week
+    """, filters, 'order_purchase_week IS NOT NULL')
+    return _ns(weekly, 'order_purchase_week').astype({'orders': 'int64', 'delivered': 'int64'})
+
+
+def _geo_delivered(filters, distinct='exact', **_):
+    geo = _query(f"""
+        SELECT customer_state, customer_city,
+               round(coalesce(sum(revenue), 0), 2) AS revenue,
+               {_distinct('order_id', distinct)} AS orders
+        FROM {{src}} {{where}}
+        GROUP BY ALL ORDER BY revenue DESC, customer_state, customer_city
+    """, filters, "status_stage = 'delivered_customer' AND customer_state IS NOT NULL "
+                  "AND customer_city IS NOT NULL")
+    return geo.astype({'customer_state': 'category', 'customer_city': 'category', 'orders': 'int64'})
+
+
+def _top_geo(filters, n=10, **params):
+    return _geo_delivered(filters, **params).head(n)
+
+
+def _cohort_retention(filters, measure='customers', distinct='exact', **_):
+    cells = _query(f"""
+        SELECT cohort_month,
+               (year(order_purchase_month) * 12 + month(order_purchase_month))
+                 - (year(cohort_month) * 12 + month(cohort_month)) AS period_index,
+               {_distinct('customer_unique_id', distinct)} AS customers,
+               count(*) AS orders,
+               coalesce(sum(revenue), 0) AS revenue
+        FROM {{src}} {{where}}
+        GROUP BY ALL
+    """, filters, 'cohort_month IS NOT NULL AND order_purchase_month >= cohort_month')
+    return retention_matrix(_ns(cells, 'cohort_month').astype({'period_index': 'int64'}), measure)
+
+
+def _sla_distribution(filters, **_):
+    sla = _query('SELECT sla_days FROM {src} {where}', filters, 'sla_days IS NOT NULL')
+    return sla['sla_days']
+
+
+def _sla_histogram(filters, **_):
+    bins = _query(f"""
+        SELECT least(greatest(floor(sla_days), 0), {SLA_MAX_DAYS})::INTEGER AS sla_bin, count(*) AS n
+        FROM {{src}} {{where}} GROUP BY ALL
+    """, filters, 'sla_days IS NOT NULL')
+    counts = np.zeros(SLA_MAX_DAYS + 1, dtype='int64')
+    counts[bins['sla_bin'].to_numpy()] = bins['n'].to_numpy()
+    return pd.Series(counts, index=pd.RangeIndex(SLA_MAX_DAYS + 1, name='sla_bin'), name='n')
+
+
+METRICS = {
+    'funnel_counts': _funnel_counts,
+    'weekly_kpis': _weekly_kpis,
+    'geo_delivered': _geo_delivered,
+    'top_geo': _top_geo,
+    'cohort_retention': _cohort_retention,
+    'sla_distribution': _sla_distribution,
+    'sla_histogram': _sla_histogram,
+}
+
+
+def compute(metrics, filters=None, **params):
+    """{metric: result} like metrics.compute(), each metric one SQL query over the Parquet."""
+    results = {}
+    for m in metrics:
+        with span(f'duckdb.{m}') as sp:
+            results[m] = sp.count(METRICS[m](filters, **params))
+    return results
@@ -1,90 +1,456 @@
 import os
+import json
+import shutil
+import argparse
 import pandas as pd
 import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pcsv
+import pyarrow.dataset as ds
 from pathlib import Path
 
+# --- make project root importable ---
+import sys
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from src import facts, hll, keys, profiling, tdigest
+from src.profiling import profiled, span
+from src.funnel import DIGEST_DIMS, STAGES, reached_col, sla_bin, sla_digests, stage_frame, stage_names
+from src.retention import merge_cells, retention_cells
+from src.partitions import PARTITION_COL, read_partitions, write_partitions, write_row_grouped
+
 RAW = Path('data/raw')
 OUT = Path('data/processed')
 OUT.mkdir(parents=True, exist_ok=True)
+MASTER = OUT / 'orders_master.parquet'
+MASTER_DS = OUT / 'orders_master'           # Hive-partitioned by order_purchase_month (--incremental)
+WATERMARK = OUT / 'watermark.json'
+CUBE = OUT / 'rollup_cube.parquet'
+RETENTION_CELLS = OUT / 'retention_cells.parquet'
+RETENTION_SEEN = OUT / 'retention_customers.parquet'   # last month each customer was counted in
+CUBE_SLA = OUT / 'rollup_sla.parquet'
+HLL_WEEKLY = OUT / 'hll_weekly.parquet'     # order sketches per cube cell
+HLL_COHORTS = OUT / 'hll_cohorts.parquet'   # customer sketches per cohort x month cell
+SLA_DIGESTS = OUT / 'sla_digests.parquet'   # SLA / delay quantile digests per week x state
+SLA_LATE = OUT / 'sla_late.parquet'         # late-vs-estimate counts per week x state
+# The master stores ids as int32 surrogate codes (side dictionaries dict_<id>.parquet, src/keys.py)
+# and these labels as categoricals; the other tables are built from the plain frame before that.
+MASTER_CATEGORIES = ['status_stage', 'payment_type', 'product_category_name']
+ORDER_ITEMS = OUT / 'order_items.parquet'         # items/revenue per order x category, by order code
+ORDER_PAYMENTS = OUT / 'order_payments.parquet'   # paid value/count per order x payment type, by order code
+ORDER_INDEX = OUT / 'order_index.parquet'         # CSR offsets into both (+ order_index_bitsets.parquet)
 
-def read_csv(name):
+# --- Raw schemas ---
+# Ids stay plain strings (high cardinality); low-cardinality labels are dictionary-encoded
+# (pandas categoricals), money is float32 and timestamps are parsed by the CSV reader.
+STR = pa.string()
+DICT = pa.dictionary(pa.int32(), pa.string())
+TS = pa.timestamp('s')
+MONEY = pa.float32()
+
+SCHEMAS = {
+    'olist_orders_dataset': {
+        'order_id': STR, 'customer_id': STR, 'order_status': DICT,
+        'order_purchase_timestamp': TS, 'order_approved_at': TS,
+        'order_delivered_carrier_date': TS, 'order_delivered_customer_date': TS,
+        'order_estimated_delivery_date': TS,
+    },
+    'olist_customers_dataset': {
+        'customer_id': STR, 'customer_unique_id': STR, 'customer_zip_code_prefix': STR,
+        'customer_city': DICT, 'customer_state': DICT,
+    },
+    'olist_order_payments_dataset': {
+        'order_id': STR, 'payment_sequential': pa.int16(), 'payment_type': DICT,
+        'payment_installments': pa.int16(), 'payment_value': MONEY,
+    },
+    'olist_order_items_dataset': {
+        'order_id': STR, 'order_item_id': pa.int16(), 'product_id': STR, 'seller_id': STR,
+        'shipping_limit_date': TS, 'price': MONEY, 'freight_value': MONEY,
+    },
+    'olist_products_dataset': {
+        'product_id': STR, 'product_category_name': DICT,
+    },
+}
+
+BLOCK_SIZE = 8 << 20  # bytes of CSV per record batch
+
+def find_csv(name):
     candidates = list(RAW.glob(f"{name}*.csv"))
     if not candidates:
         raise FileNotFoundError(f"Could not find CSV for: {name} in {RAW.resolve()}")
-    return pd.read_csv(candidates[0])
+    return candidates[0]
 
-def main():
-    # --- Load ---
-    orders = read_csv('olist_orders_dataset')
-    customers = read_csv('olist_customers_dataset')
-    payments = read_csv('olist_order_payments_dataset')
-    items = read_csv('olist_order_items_dataset')
-    products = read_csv('olist_products_dataset')
+def _csv_options(name, block_size=BLOCK_SIZE):
+    schema = SCHEMAS[name]
+    return dict(read_options=pcsv.ReadOptions(block_size=block_size),
+                convert_options=pcsv.ConvertOptions(column_types=schema,
+                                                    include_columns=list(schema),
+                                                    strings_can_be_null=True))
+
+def iter_batches(name, block_size=BLOCK_SIZE):
+    """Yield typed Arrow record batches of one raw table, `block_size` bytes of CSV at a time."""
+    with pcsv.open_csv(find_csv(name), **_csv_options(name, block_size)) as reader:
+        yield from reader
+
+@profiled()
+def read_csv(name):
+    table = pcsv.read_csv(find_csv(name), **_csv_options(name))
+    return table.to_pandas(coerce_temporal_nanoseconds=True)
 
+def money(arr):
+    """float32 money -> float64 rounded back to cents before summing."""
+    return pc.round(arr.cast(pa.float64()), 2)
+
+def _combine(parts, keys, names):
+    """Sum per-batch partial aggregates by `keys`; value columns come back renamed to `names`."""
+    t = pa.concat_tables(parts)
+    cols = [c for c in t.column_names if c not in keys]
+    out = t.group_by(keys).aggregate([(c, 'sum') for c in cols]).to_pandas()
+    out = out.rename(columns={f'{c}_sum': n for c, n in zip(cols, names)})
+    return out.dropna(subset=keys)[[*keys, *names]].reset_index(drop=True)
+
+def _primary(by_order, label, weight):
+    """The `label` carrying the largest `weight` per order (ties broken by label)."""
+    top = by_order.sort_values([weight, label], ascending=[False, True])
+    return top.drop_duplicates('order_id')[['order_id', label]]
+
+def _only(t, order_ids):
+    return t if order_ids is None else t.filter(pc.is_in(t['order_id'], value_set=order_ids))
+
+@profiled()
+def prepare_orders(orders):
     # --- Clean / types ---
     date_cols = ['order_purchase_timestamp','order_approved_at','order_delivered_carrier_date','order_delivered_customer_date','order_estimated_delivery_date']
     for c in date_cols:
         if c in orders.columns:
             orders[c] = pd.to_datetime(orders[c], errors='coerce')
 
-    # --- Furthest stage ---
-    def furthest_stage(row):
-        stages = [
-            ('created', pd.notna(row.get('order_purchase_timestamp'))),
-            ('approved', pd.notna(row.get('order_approved_at'))),
-            ('delivered_carrier', pd.notna(row.get('order_delivered_carrier_date'))),
-            ('delivered_customer', pd.notna(row.get('order_delivered_customer_date'))),
-        ]
-        last = 'created'
-        for name, ok in stages:
-            if ok:
-                last = name
-        return last
-
-    orders['status_stage'] = orders.apply(furthest_stage, axis=1)
-    orders['order_purchase_date'] = orders['order_purchase_timestamp'].dt.date
+    # --- Furthest stage, reached flags, stage-to-stage durations ---
+    orders = orders.join(stage_frame(orders, STAGES))
+    orders['order_purchase_date'] = orders['order_purchase_timestamp'].dt.normalize()
     orders['order_purchase_week'] = orders['order_purchase_timestamp'].dt.to_period('W').dt.start_time
     orders['order_purchase_month'] = orders['order_purchase_timestamp'].dt.to_period('M').dt.to_timestamp()
 
     # SLA (in days) from approved to delivered to customer
     orders['sla_days'] = (orders['order_delivered_customer_date'] - orders['order_approved_at']).dt.total_seconds() / (3600*24)
+    return orders
 
-    # --- Payments summary per order ---
-    pay = payments.groupby('order_id').agg(total_paid=('payment_value','sum')).reset_index()
+@profiled()
+def summarize_payments(batches, order_ids=None):
+    """Per-order paid total and primary payment type, and the payment_type distribution
+    (value-weighted and count-weighted).
 
-    # payment_type distribution (value-weighted and count-weighted)
-    pay_type_value = payments.groupby('payment_type').agg(total=('payment_value','sum'),
-                                                          n=('payment_value','count')).reset_index()
-    pay_type_value.to_parquet(OUT / 'payment_type_summary.parquet', index=False)
-
-    # --- Items summary per order ---
-    items['revenue'] = items['price'] + items['freight_value']
-    it = items.groupby('order_id').agg(items=('order_item_id','count'),
-                                       revenue=('revenue','sum')).reset_index()
+    Aggregates batch by batch in Arrow, so memory is bounded by the number of orders, not payment rows.
+    Also returns the per order x payment type rows the payment facts are built from.
+    """
+    parts = []
+    for b in batches:
+        t = _only(pa.Table.from_batches([b]), order_ids)
+        t = pa.table({'order_id': t['order_id'],
+                      'payment_type': pc.fill_null(t['payment_type'].cast(pa.string()), 'not_defined'),
+                      'payment_value': money(t['payment_value'])})
+        parts.append(t.group_by(['order_id','payment_type']).aggregate([('payment_value','sum'),
+                                                                        ('payment_value','count')]))
+    by_type = _combine(parts, ['order_id','payment_type'], ['total','n'])
+    pay = (by_type.groupby('order_id', as_index=False).agg(total_paid=('total','sum'))
+                  .merge(_primary(by_type, 'payment_type', 'total'), on='order_id'))
+    pay_type_value = by_type.groupby('payment_type', as_index=False)[['total','n']].sum()
+    return pay, pay_type_value, by_type
 
+@profiled()
+def summarize_items(batches, products, order_ids=None):
+    """Per-order item count/revenue and primary category, and category revenue, aggregated batch by
+    batch; also the per order x category rows the item facts are built from."""
+    category = pa.Table.from_pandas(
+        products[['product_id','product_category_name']].astype({'product_category_name': object}),
+        preserve_index=False)
+    parts = []
+    for b in batches:
+        t = _only(pa.Table.from_batches([b]), order_ids)
+        t = pa.table({'order_id': t['order_id'],
+                      'product_id': t['product_id'],
+                      'order_item_id': t['order_item_id'],
+                      'revenue': pc.add(money(t['price']), money(t['freight_value']))})
+        t = t.join(category, 'product_id')
+        t = t.set_column(t.schema.get_field_index('product_category_name'), 'product_category_name',
+                         pc.fill_null(t['product_category_name'], 'unknown'))
+        parts.append(t.group_by(['order_id','product_category_name']).aggregate([('order_item_id','count'),
+                                                                                 ('revenue','sum')]))
+    by_cat = _combine(parts, ['order_id','product_category_name'], ['items','revenue'])
+    it = (by_cat.groupby('order_id', as_index=False)[['items','revenue']].sum()
+                .merge(_primary(by_cat, 'product_category_name', 'revenue'), on='order_id'))
     # Category revenue (delivered only will be filtered later on dashboard side)
-    cat = (items.merge(products[['product_id','product_category_name']], on='product_id', how='left')
-                .assign(product_category_name=lambda d: d['product_category_name'].fillna('unknown'))
-                .groupby('product_category_name', as_index=False)
-                .agg(revenue=('revenue','sum'), items=('order_item_id','count')))
-    cat.to_parquet(OUT / 'category_revenue.parquet', index=False)
-
-    # --- Master orders table ---
-    m = (orders
-         .merge(customers[['customer_id','customer_unique_id','customer_city','customer_state']], on='customer_id', how='left')
-         .merge(pay, on='order_id', how='left')
-         .merge(it, on='order_id', how='left'))
-
-    # --- Cohort month ---
-    first = (m.groupby('customer_unique_id')['order_purchase_month']
-               .min()
-               .rename('cohort_month')
-               .reset_index())
-    m = m.merge(first, on='customer_unique_id', how='left')
-
-    # --- Save processed tables ---
-    m.to_parquet(OUT / 'orders_master.parquet', index=False)
-    print("Wrote:", (OUT / 'orders_master.parquet').resolve())
+    cat = by_cat.groupby('product_category_name', as_index=False)[['revenue','items']].sum()
+    return it, cat, by_cat
+
+@profiled()
+def build_master(orders, customers, pay, it):
+    with span('etl.merge_customers') as sp:
+        m = sp.count(orders.merge(customers[['customer_id','customer_unique_id','customer_city','customer_state']],
+                                  on='customer_id', how='left'))
+    with span('etl.merge_payments') as sp:
+        m = sp.count(m.merge(pay, on='order_id', how='left'))
+    with span('etl.merge_items') as sp:
+        return sp.count(m.merge(it, on='order_id', how='left'))
+
+@profiled()
+def assign_cohorts(m, known=None):
+    """First purchase month per customer; `known` holds cohorts of customers seen in earlier runs."""
+    first = m.groupby('customer_unique_id')['order_purchase_month'].min().rename('cohort_month')
+    if known is not None and not known.empty:
+        # Delta orders are all newer than the watermark, so an existing cohort always wins.
+        first = known.combine_first(first)
+    return m.merge(first.reset_index(), on='customer_unique_id', how='left')
+
+# --- Rollup cube ---
+# Every order lands in exactly one cell (primary payment type / category), so all measures are additive
+# and any filter combination over these dimensions is answered by summing cells.
+CUBE_DIMS = ['order_purchase_week','customer_state','customer_city','payment_type','product_category_name']
+SLA_DIMS = [c for c in CUBE_DIMS if c != 'customer_city']  # no city filter in the app; keeps bins dense
+
+def build_cube(m):
+    d = m[CUBE_DIMS].copy()
+    for name in stage_names(STAGES):
+        d[reached_col(name)] = m[reached_col(name)]
+    d['orders'] = 1
+    d['delivered'] = m['order_delivered_customer_date'].notna()
+    d['delivered_revenue'] = m['revenue'].where(m['status_stage'] == 'delivered_customer', 0).fillna(0)
+    d['revenue'] = m['revenue'].fillna(0)
+    d['revenue_n'] = m['revenue'].notna()
+    d['items'] = m['items'].fillna(0)
+    d['total_paid'] = m['total_paid'].fillna(0)
+    cube = d.groupby(CUBE_DIMS, observed=True, dropna=False).sum().reset_index()
+
+    has_sla = m['sla_days'].notna()
+    sla = m.loc[has_sla, SLA_DIMS].assign(
+        sla_bin=sla_bin(m.loc[has_sla, 'sla_days']))
+    sla = (sla.groupby(SLA_DIMS + ['sla_bin'], observed=True, dropna=False)
+              .size().rename('n').reset_index())
+    return cube, sla
+
+@profiled()
+def write_cube(m, merge=False):
+    cube, sla = build_cube(m)
+    if merge:
+        merge_summary(CUBE, cube, CUBE_DIMS)
+        merge_summary(CUBE_SLA, sla, SLA_DIMS + ['sla_bin'])
+    else:
+        cube.to_parquet(CUBE, index=False)
+        sla.to_parquet(CUBE_SLA, index=False)
+
+# --- Distinct-count sketches ---
+# HyperLogLog sketches (src/hll.py) of the ids the cube can't sum: orders and delivered orders per
+# cube cell, and customers per cohort x purchase month (plus the filter dimensions). Any selection of
+# cells is counted from the union of its sketches, and an incremental run merges into the stored ones.
+COHORT_DIMS = ['cohort_month', 'order_purchase_month', *SLA_DIMS]
+
+def build_sketches(m, p=hll.PRECISION):
+    has_id = m['order_id'].notna().to_numpy()
+    delivered = has_id & (m['status_stage'] == 'delivered_customer').to_numpy()
+    orders = hll.hash64(m['order_id'])
+    weekly = pd.concat([
+        hll.sketch_cells(m.loc[rows, CUBE_DIMS].assign(measure=measure), orders[rows], p)
+        for measure, rows in (('orders', has_id), ('delivered', delivered))
+    ], ignore_index=True).astype({'measure': 'category'})
+
+    active = (m['customer_unique_id'].notna()
+              & (m['order_purchase_month'] >= m['cohort_month'])).to_numpy()
+    cohorts = hll.sketch_cells(m.loc[active, COHORT_DIMS],
+                               hll.hash64(m.loc[active, 'customer_unique_id']), p)
+    return weekly, cohorts
+
+@profiled()
+def write_sketches(m, merge=False):
+    # merged sketches must share a precision: keep the one the stored sketches were built with
+    p = hll.sketch_precision(HLL_WEEKLY) if merge and HLL_WEEKLY.exists() else hll.PRECISION
+    for path, cells in zip((HLL_WEEKLY, HLL_COHORTS), build_sketches(m, p)):
+        if merge and path.exists():
+            cats = cells.select_dtypes('category').columns
+            cells = (hll.merge_sketches(pd.read_parquet(path), cells, p=p)
+                        .astype({c: 'category' for c in cats}))
+        hll.write_sketches(cells, path, p)
+
+# --- SLA quantile digests ---
+# t-digests (src/tdigest.py) of the approved -> delivered days and of delivery minus estimated
+# delivery date per week x state, plus additive late-delivery counts on the same cells, so any
+# week/state selection gets its quantiles and late share by merging cells.
+
+@profiled()
+def write_sla_digests(m, merge=False):
+    digests, late = sla_digests(m, DIGEST_DIMS)
+    if merge and SLA_DIGESTS.exists():
+        cats = digests.select_dtypes('category').columns
+        digests = (tdigest.merge_digests(pd.read_parquet(SLA_DIGESTS), digests)
+                      .astype({c: 'category' for c in cats}))
+        merge_summary(SLA_LATE, late, DIGEST_DIMS)
+    else:
+        late.to_parquet(SLA_LATE, index=False)
+    digests.to_parquet(SLA_DIGESTS, index=False)
+
+# --- Compact master schema ---
+
+@profiled()
+def compact_master(m, update=False):
+    """`m` as stored: ids replaced by surrogate codes (with update=True the side dictionaries are
+    extended, else written anew) and the low-cardinality labels as categoricals."""
+    out = m.copy(deep=False)
+    for col in keys.KEYS:
+        path = keys.dictionary_path(OUT, col)
+        out[col], dictionary = keys.encode(m[col], keys.read_dictionary(path) if update else None)
+        keys.write_dictionary(dictionary, path)
+    return out.astype({c: 'category' for c in MASTER_CATEGORIES})
+
+# --- Order facts ---
+
+@profiled()
+def write_facts(by_cat, by_type, update=False):
+    """Item and payment facts keyed by order code, with their CSR index and per-label order bitsets;
+    with update=True the rows of new orders are added to the stored facts. Run after compact_master(),
+    which assigns the codes."""
+    dictionary = keys.read_dictionary(keys.dictionary_path(OUT, 'order_id'))
+    index = {}
+    for name, path, rows, label in (('items', ORDER_ITEMS, by_cat, 'product_category_name'),
+                                    ('payments', ORDER_PAYMENTS, by_type, 'payment_type')):
+        rows = rows.assign(order_id=dictionary.get_indexer(rows['order_id']).astype('int32'))
+        if update and path.exists():
+            rows = pd.concat([pd.read_parquet(path), rows.astype({label: 'category'})], ignore_index=True)
+        rows, offsets, bitsets = facts.build(rows.astype({label: 'category'}), label, len(dictionary))
+        rows.to_parquet(path, index=False)
+        index[name] = (offsets, bitsets)
+    facts.write_index(ORDER_INDEX, len(dictionary), **index)
+
+# --- Retention cells ---
+
+@profiled()
+def write_retention(m, update=False):
+    """Retention cells for `m`; with update=True only `m` (newer orders) is added to the stored cells."""
+    if update and RETENTION_CELLS.exists():
+        seen = pd.read_parquet(RETENTION_SEEN).set_index('customer_unique_id')['last_month']
+        cells, seen = retention_cells(m, last_month=seen)
+        cells = merge_cells(pd.read_parquet(RETENTION_CELLS), cells)
+    else:
+        cells, seen = retention_cells(m)
+    cells.to_parquet(RETENTION_CELLS, index=False)
+    seen.rename_axis('customer_unique_id').reset_index().to_parquet(RETENTION_SEEN, index=False)
+
+# --- Incremental mode ---
+
+def read_watermark():
+    if not WATERMARK.exists():
+        return None
+    return pd.Timestamp(json.loads(WATERMARK.read_text())['order_purchase_timestamp'])
+
+def write_watermark(ts):
+    WATERMARK.write_text(json.dumps({'order_purchase_timestamp': ts.isoformat()}))
+
+@profiled()
+def known_cohorts(customer_ids):
+    """Existing cohort_month for the given customers, read from the partitioned master only."""
+    dictionary = keys.read_dictionary(keys.dictionary_path(OUT, 'customer_unique_id'))
+    codes = dictionary.get_indexer(pd.unique(customer_ids))
+    flt = ds.field('customer_unique_id').isin(pa.array(codes[codes >= 0], type=pa.int32()))
+    prev = read_partitions(MASTER_DS, columns=['customer_unique_id','cohort_month'], filter=flt)
+    first = prev.groupby('customer_unique_id')['cohort_month'].min()
+    return first.set_axis(pd.Index(keys.decode(first.index, dictionary), name='customer_unique_id'))
+
+def merge_summary(path, delta, key):
+    """Add delta rows into an additive summary table keyed by `key`."""
+    if path.exists():
+        delta = (pd.concat([pd.read_parquet(path), delta], ignore_index=True)
+                   .groupby(key, as_index=False, observed=True, dropna=False).sum())
+    delta.to_parquet(path, index=False)
+
+@profiled()
+def main(incremental=False):
+    # --- Load ---
+    orders = read_csv('olist_orders_dataset')
+    customers = read_csv('olist_customers_dataset')
+    products = read_csv('olist_products_dataset')
+    # payments and items are streamed and aggregated per batch below
+
+    orders = prepare_orders(orders)
+
+    order_ids = None
+    watermark = read_watermark() if incremental and MASTER_DS.exists() else None
+    if watermark is not None:
+        # Only orders purchased after the last run; their items/payments follow them.
+        orders = orders[orders['order_purchase_timestamp'] > watermark]
+        if orders.empty:
+            print("No orders newer than watermark", watermark)
+            return
+        order_ids = pa.array(orders['order_id'], type=pa.string())
+        customers = customers[customers['customer_id'].isin(orders['customer_id'])]
+
+    pay, pay_type_value, by_type = summarize_payments(iter_batches('olist_order_payments_dataset'), order_ids)
+    it, cat, by_cat = summarize_items(iter_batches('olist_order_items_dataset'), products, order_ids)
+    m = build_master(orders, customers, pay, it)
+
+    if not incremental:
+        m = assign_cohorts(m)
+        with span('etl.write_row_grouped', rows=len(m)):
+            write_row_grouped(compact_master(m), MASTER)
+        write_facts(by_cat, by_type)
+        pay_type_value.to_parquet(OUT / 'payment_type_summary.parquet', index=False)
+        cat.to_parquet(OUT / 'category_revenue.parquet', index=False)
+        write_cube(m)
+        write_sketches(m)
+        write_sla_digests(m)
+        write_retention(m)
+        # A full rebuild supersedes any incremental state.
+        if MASTER_DS.exists():
+            shutil.rmtree(MASTER_DS)
+        WATERMARK.unlink(missing_ok=True)
+        print("Wrote:", MASTER.resolve())
+        return
+
+    if watermark is None:
+        # First incremental run: build every partition from scratch.
+        if MASTER_DS.exists():
+            shutil.rmtree(MASTER_DS)
+        m = assign_cohorts(m)
+        pay_type_value.to_parquet(OUT / 'payment_type_summary.parquet', index=False)
+        cat.to_parquet(OUT / 'category_revenue.parquet', index=False)
+        write_cube(m)
+        write_sketches(m)
+        write_sla_digests(m)
+        write_retention(m)
+        m = compact_master(m)
+        write_facts(by_cat, by_type)
+        MASTER.unlink(missing_ok=True)
+    else:
+        m = assign_cohorts(m, known_cohorts(m['customer_unique_id'].dropna()))
+        write_cube(m, merge=True)
+        write_sketches(m, merge=True)
+        write_sla_digests(m, merge=True)
+        write_retention(m, update=True)
+        months = m[PARTITION_COL].dropna().unique()
+        # Rewrite affected partitions as existing rows + delta rows.
+        m = compact_master(m, update=True)
+        write_facts(by_cat, by_type, update=True)
+        # all-NA columns and an empty frame would decide the concatenated dtypes (a pandas
+        # FutureWarning); drop them and restore the delta's columns and dtypes after
+        frames = [f.dropna(axis=1, how='all') for f in (read_partitions(MASTER_DS, months=months), m) if len(f)]
+        cats = m.select_dtypes('category').columns
+        m = (pd.concat(frames, ignore_index=True).reindex(columns=m.columns)
+               .astype({**m.dtypes.to_dict(), **{c: 'category' for c in cats}, **{c: 'Int32' for c in keys.KEYS}}))
+        merge_summary(OUT / 'payment_type_summary.parquet', pay_type_value, 'payment_type')
+        merge_summary(OUT / 'category_revenue.parquet', cat, 'product_category_name')
+
+    with span('etl.write_partitions', rows=len(m)):
+        write_partitions(m, MASTER_DS)
+    new_wm = m['order_purchase_timestamp'].max()
+    write_watermark(new_wm if watermark is None else max(watermark, new_wm))
+    n_parts = m[PARTITION_COL].nunique()
+    print(f"Wrote {len(m):,} rows in {n_parts} partition(s):", MASTER_DS.resolve())
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    ap = argparse.ArgumentParser(description='Build data/processed tables from the Olist CSVs.')
+    ap.add_argument('--incremental', action='store_true',
+                    help='only process orders newer than the watermark into the month-partitioned master')
+    profiling.add_argument(ap, 'etl')
+    args = ap.parse_args()
+    profiling.setup(args.profile, 'etl')
+    main(incremental=args.incremental)
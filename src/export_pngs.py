@@ -1,33 +1,94 @@
-import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
+"""Static images of every dashboard figure, for the README screenshots.
+
+    python3 -m src.export_pngs                       # PNG, scale 2, into assets/img
+    python3 -m src.export_pngs --format png svg --scale 1 --workers 4
+
+All images are rendered by one Kaleido browser (`--workers` tabs render in parallel), so the
+browser start-up is paid once per batch instead of once per image.
+"""
+import argparse
+import asyncio
+import time
 from pathlib import Path
-from src.metrics import load, funnel_counts, funnel_cr, weekly_kpis, top_geo, category_revenue
 
-IMG = Path('assets/img'); IMG.mkdir(parents=True, exist_ok=True)
+import plotly.io as pio
+
+from dashboards.generate_dashboard import FIGURES, compact, dashboard_data
+
+IMG = Path('assets/img')
+
+# figure name -> (file stem used by the README, width, height)
+IMAGES = {
+    'funnel': ('funnel', 1000, 700),
+    'weekly': ('weekly', 1200, 700),
+    'aov': ('aov', 1200, 700),
+    'payment': ('payment', 1000, 700),
+    'category': ('categories', 1000, 800),
+    'sla': ('sla', 1000, 700),
+    'geo': ('geo', 1000, 800),
+    'cohort': ('cohorts', 1200, 800),
+}
+
+
+def jobs(figures, formats, out=IMG):
+    """[(path, figure, width, height)] for every figure and format."""
+    out.mkdir(parents=True, exist_ok=True)
+    return [(out / f'{IMAGES[name][0]}.{fmt}', fig, *IMAGES[name][1:])
+            for name, fig in figures for fmt in formats]
+
+
+async def _render_async(kaleido, todo, scale, workers):
+    kopts = {k: v for k, v in (('plotlyjs', pio.defaults.plotlyjs), ('mathjax', pio.defaults.mathjax)) if v}
+    timings = {}
+    async with kaleido.Kaleido(n=workers, **kopts) as k:
+        async def one(path, fig, width, height):
+            t0 = time.perf_counter()
+            opts = dict(format=path.suffix[1:], width=width, height=height, scale=scale)
+            path.write_bytes(await k.calc_fig(fig.to_dict(), opts=opts))
+            timings[path] = time.perf_counter() - t0
+        await asyncio.gather(*(one(*job) for job in todo))
+    return timings
+
+
+def render(todo, scale=2, workers=2):
+    """Write every job's image and return {path: seconds}.
+
+    With Kaleido >= 1 the jobs share one browser with `workers` tabs. Kaleido 0.2 (plotly 5)
+    already keeps a single renderer process alive between write_image calls, so the jobs just
+    run in turn through it.
+    """
+    import kaleido
+    if hasattr(kaleido, 'Kaleido'):
+        return asyncio.run(_render_async(kaleido, todo, scale, workers))
+    timings = {}
+    for path, fig, width, height in todo:
+        t0 = time.perf_counter()
+        fig.write_image(path, format=path.suffix[1:], width=width, height=height, scale=scale)
+        timings[path] = time.perf_counter() - t0
+    return timings
 
-def funnel_png(df):
-    fdict = funnel_counts(df)
-    stages = ['created','approved','delivered_carrier','delivered_customer']
-    values = [fdict.get(s,0) for s in stages]
-    fig = go.Figure(go.Funnel(y=stages, x=values, textinfo='value+percent previous'))
-    fig.write_image(IMG / 'funnel.png', scale=2, width=1000, height=700)
 
-def weekly_png(dfw):
-    fig = px.line(dfw, x='order_purchase_week', y=['orders','delivered','revenue'], markers=True)
-    fig.write_image(IMG / 'weekly.png', scale=2, width=1200, height=700)
+def main(formats=('png',), scale=2, workers=2, only=None):
+    t0 = time.perf_counter()
+    data = dashboard_data()
+    figures = [(name, compact(build(data[key]))) for name, build, key in FIGURES
+               if only is None or name in only]
+    t1 = time.perf_counter()
+    timings = render(jobs(figures, formats), scale=scale, workers=workers)
+    total = time.perf_counter() - t1
 
-def categories_png(cat):
-    if cat.empty: return
-    fig = px.bar(cat.head(15), x='revenue', y='product_category_name', orientation='h')
-    fig.write_image(IMG / 'categories.png', scale=2, width=1000, height=800)
+    for path, seconds in timings.items():
+        print(f'{str(path):32s} {seconds:6.2f}s {path.stat().st_size / 1024:8.1f} KB')
+    print(f'{len(timings)} images in {total:.2f}s ({total / max(1, len(timings)):.2f}s/image, '
+          f'renderer start-up included); data + figures {t1 - t0:.2f}s')
+    print(f'Charts exported to {IMG}')
 
-def main():
-    df = load()
-    funnel_png(df)
-    weekly_png(weekly_kpis(df))
-    categories_png(category_revenue(30))
-    print('PNG charts exported to assets/img')
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    ap = argparse.ArgumentParser(description='Render the dashboard figures to static images.')
+    ap.add_argument('--format', nargs='+', default=['png'], choices=['png', 'jpeg', 'webp', 'svg', 'pdf'])
+    ap.add_argument('--scale', type=float, default=2)
+    ap.add_argument('--workers', type=int, default=2, help='browser tabs rendering in parallel')
+    ap.add_argument('--only', nargs='+', choices=list(IMAGES), help='only these figures')
+    args = ap.parse_args()
+    main(args.format, args.scale, args.workers, args.only)
@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Order-level fact tables with a CSR index, so any set of orders can be answered by gathering rows.
+#
+# A fact table (order items per order x category, payments per order x payment type) is sorted by
+# the order's surrogate code (src/keys.py). offsets[code] .. offsets[code + 1] are then that order's
+# rows, so the rows of a set of orders are one vectorized gather, never a merge. A bitset per label
+# marks the orders having at least one row with it, so "orders with a health_beauty item" is a
+# bitwise OR over packed bits instead of a scan of the facts.
+
+def offsets(orders, n_orders):
+    """CSR offsets (n_orders + 1) of a fact table sorted by order code."""
+    return np.r_[0, np.cumsum(np.bincount(orders, minlength=n_orders))].astype(np.int64)
+
+
+def rows(offsets, orders):
+    """Row positions of the facts of the given order codes (in that order, an order's rows together)."""
+    orders = np.asarray(orders, dtype=np.int64)
+    starts = offsets[orders]
+    lengths = offsets[orders + 1] - starts
+    # each row is its order's start plus its rank within the order
+    shift = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+    return shift + np.arange(shift.size, dtype=np.int64)
+
+
+def pack(mask):
+    return np.packbits(mask, bitorder='little')
+
+
+def unpack(bits, n_orders):
+    return np.unpackbits(bits, count=n_orders, bitorder='little').view(bool)
+
+
+def bitsets(orders, labels, n_orders):
+    """{label: packed bitset of the orders with at least one row of that label} (labels categorical)."""
+    labels = pd.Categorical(labels)
+    codes = labels.codes
+    out = {}
+    for i, label in enumerate(labels.categories):
+        mask = np.zeros(n_orders, dtype=bool)
+        mask[orders[codes == i]] = True
+        out[label] = pack(mask)
+    return out
+
+
+def build(facts, label, n_orders):
+    """(facts sorted by order code, offsets, bitsets by `label`) for a fact frame with an order_id
+    code column; rows of orders outside 0 .. n_orders - 1 are dropped."""
+    facts = facts[(facts['order_id'] >= 0) & (facts['order_id'] < n_orders)]
+    facts = facts.sort_values('order_id', kind='stable').reset_index(drop=True)
+    orders = facts['order_id'].to_numpy(np.int64)
+    return facts, offsets(orders, n_orders), bitsets(orders, facts[label], n_orders)
+
+
+def write_index(path, n_orders, **tables):
+    """Offsets of every table (one column each, n_orders + 1 rows) and their bitsets in one file."""
+    offs = pa.table({f'{name}_offset': off for name, (off, _) in tables.items()})
+    labels = [(name, str(label), bits.tobytes()) for name, (_, sets) in tables.items() for label, bits in sets.items()]
+    bits = pa.table({'table': [t for t, _, _ in labels], 'label': [l for _, l, _ in labels],
+                     'bits': pa.array([b for _, _, b in labels], type=pa.binary())})
+    pq.write_table(offs.replace_schema_metadata({'n_orders': str(n_orders)}), path)
+    pq.write_table(bits, path.with_name(path.stem + '_bitsets.parquet'))
+
+
+def read_index(path):
+    """(n_orders, {table: offsets}, {table: {label: packed bitset}}) written by write_index()."""
+    offs = pq.read_table(path)
+    n_orders = int(offs.schema.metadata[b'n_orders'])
+    offsets = {name[:-len('_offset')]: offs.column(name).to_numpy() for name in offs.column_names}
+    sets = {name: {} for name in offsets}
+    stored = pq.read_table(path.with_name(path.stem + '_bitsets.parquet')).to_pydict()
+    for table, label, bits in zip(stored['table'], stored['label'], stored['bits']):
+        sets[table][label] = np.frombuffer(bits, dtype=np.uint8)
+    return n_orders, offsets, sets
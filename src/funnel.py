@@ -0,0 +1,92 @@
+import numpy as np
+import pandas as pd
+from src import tdigest
+
+# Ordered funnel definition: (stage name, timestamp column that marks reaching it)
+STAGES = [
+    ('created', 'order_purchase_timestamp'),
+    ('approved', 'order_approved_at'),
+    ('delivered_carrier', 'order_delivered_carrier_date'),
+    ('delivered_customer', 'order_delivered_customer_date'),
+]
+
+SLA_MAX_DAYS = 60  # SLA histograms use 1-day bins; the last one collects everything slower
+DIGEST_DIMS = ['order_purchase_week', 'customer_state']  # cells of the stored SLA digests
+SLA_COLUMNS = ['sla_days', 'order_delivered_customer_date', 'order_estimated_delivery_date']
+
+
+def stage_names(stages=STAGES):
+    return [name for name, _ in stages]
+
+
+def reached_col(name):
+    return f'reached_{name}'
+
+
+def duration_col(prev, cur):
+    return f'{prev}_to_{cur}_days'
+
+
+def _present(df, stages):
+    """Boolean matrix (rows x stages): timestamp of each stage is present."""
+    cols = []
+    for _, col in stages:
+        if col in df.columns:
+            cols.append(df[col].notna().to_numpy())
+        else:
+            cols.append(np.zeros(len(df), dtype=bool))
+    return np.column_stack(cols) if cols else np.zeros((len(df), 0), dtype=bool)
+
+
+def reached_matrix(df, stages=STAGES):
+    """Cumulative reached flags: a stage counts only if every earlier stage was reached too."""
+    return np.logical_and.accumulate(_present(df, stages), axis=1)
+
+
+def _furthest_idx(present):
+    # Index of the last present stage; rows with nothing present fall back to stage 0.
+    last = present.shape[1] - 1 - np.argmax(present[:, ::-1], axis=1)
+    return np.where(present.any(axis=1), last, 0)
+
+
+def stage_frame(df, stages=STAGES):
+    """Furthest stage, per-stage reached flags and stage-to-stage durations in one pass."""
+    present = _present(df, stages)
+    names = stage_names(stages)
+    out = {'status_stage': np.asarray(names, dtype=object)[_furthest_idx(present)]}
+
+    reached = np.logical_and.accumulate(present, axis=1)
+    for i, name in enumerate(names):
+        out[reached_col(name)] = reached[:, i]
+
+    for (prev, prev_col), (cur, cur_col) in zip(stages, stages[1:]):
+        if prev_col in df.columns and cur_col in df.columns:
+            delta = df[cur_col] - df[prev_col]
+            out[duration_col(prev, cur)] = delta.dt.total_seconds().to_numpy() / (3600*24)
+
+    return pd.DataFrame(out, index=df.index)
+
+
+def sla_bin(days):
+    """1-day SLA histogram bin for each (non-missing) SLA in days: floor, clipped to [0, SLA_MAX_DAYS]."""
+    return np.clip(np.floor(np.asarray(days, dtype='float64')), 0, SLA_MAX_DAYS).astype('int16')
+
+
+def sla_digests(m, dims):
+    """(t-digests of sla_days and of delivery minus estimated delivery in days, late-delivery counts)
+    per `dims` cell of the orders in `m`."""
+    delivered, estimated = m['order_delivered_customer_date'], m['order_estimated_delivery_date']
+    delay = (delivered - estimated).dt.total_seconds() / 86400
+    digests = pd.concat([
+        tdigest.digest_cells(m.loc[ok, dims].assign(measure=measure), values[ok])
+        for measure, values in (('sla_days', m['sla_days']), ('delay_days', delay))
+        for ok in [values.notna().to_numpy()]
+    ], ignore_index=True).astype({'measure': 'category'})
+
+    # late = delivered on a later calendar day than the estimate (estimates are dates)
+    has = delay.notna()
+    days_late = (delivered.dt.normalize() - estimated.dt.normalize()).dt.days[has].astype('int64')
+    late = (m.loc[has, dims]
+              .assign(delivered=1, late=(days_late > 0).astype('int64'), days_late=days_late.clip(lower=0))
+              .groupby(dims, observed=True, dropna=False).sum().reset_index())
+    return digests, late
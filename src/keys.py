@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from pathlib import Path
+
+# Integer surrogate keys for the id columns of the master table.
+#
+# The master stores each id as an int32 code; the side dictionary dict_<column>.parquet holds the
+# id strings, one row per code (row i is code i). Dictionaries only grow: an incremental run
+# appends ids it has not seen, so codes stay valid across runs; a full rebuild starts them again.
+# Missing ids stay null (pandas reads a column with nulls as float64 codes, NaN for missing).
+
+KEYS = ['order_id', 'customer_id', 'customer_unique_id']
+CODE_TYPE = 'int32'
+
+
+def dictionary_path(root, column):
+    return Path(root) / f'dict_{column}.parquet'
+
+
+def read_dictionary(path):
+    """Id strings of a dictionary file, positioned by code (empty if the file doesn't exist)."""
+    if not Path(path).exists():
+        return pd.Index([], dtype=object)
+    return pd.Index(pq.read_table(path).column('value').to_numpy(zero_copy_only=False), dtype=object)
+
+
+def write_dictionary(values, path):
+    pq.write_table(pa.table({'value': pa.array(np.asarray(values, dtype=object), type=pa.string())}), path)
+
+
+def encode(values, dictionary=None):
+    """(codes, dictionary) for `values`: codes of ids already in `dictionary` are kept, new ids are
+    appended. Codes are a nullable Int32 Series aligned with `values`."""
+    values = pd.Series(values)
+    dictionary = pd.Index([], dtype=object) if dictionary is None else dictionary
+    missing = values.isna().to_numpy()
+    codes = dictionary.get_indexer(values)
+    new = (codes < 0) & ~missing
+    if new.any():
+        added, uniques = pd.factorize(values[new])
+        codes[new] = added + len(dictionary)
+        dictionary = dictionary.append(pd.Index(uniques, dtype=object))
+    if len(dictionary) > np.iinfo(CODE_TYPE).max:
+        raise OverflowError(f'{len(dictionary):,} ids do not fit {CODE_TYPE} surrogate keys')
+    codes = pd.arrays.IntegerArray(np.where(missing, 0, codes).astype(CODE_TYPE), missing)
+    return pd.Series(codes, index=values.index, name=values.name), dictionary
+
+
+def decode(codes, dictionary):
+    """Id strings for surrogate `codes` (NaN/NA -> None)."""
+    codes = pd.Series(codes)
+    present = codes.notna().to_numpy()
+    labels = np.full(len(codes), None, dtype=object)
+    labels[present] = dictionary.to_numpy(dtype=object)[codes[present].to_numpy(dtype=np.int64)]
+    return pd.Series(labels, index=codes.index, name=codes.name)
+
+
+def is_encoded(s):
+    """True if `s` holds surrogate codes rather than id strings."""
+    return pd.api.types.is_numeric_dtype(s.dtype)
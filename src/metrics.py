@@ -1,78 +1,581 @@
+import os
+import numpy as np
 import pandas as pd
+import pyarrow.parquet as pq
 from pathlib import Path
+from src import facts, hll, keys, tdigest
+from src.funnel import (DIGEST_DIMS, SLA_COLUMNS, SLA_MAX_DAYS, STAGES, reached_col, reached_matrix, sla_bin,
+                        sla_digests, stage_names)
+from src.partitions import read_partitions
+from src.cache import file_version, get_cache
+from src.profiling import profiled, span
+from src.retention import month_index, retention_cells, retention_matrix
 
 INP = Path('data/processed/orders_master.parquet')
+INP_DS = Path('data/processed/orders_master')  # month-partitioned master written by `etl.py --incremental`
 
-def load():
-    return pd.read_parquet(INP)
-
-def funnel_counts(df):
-    s0 = df['order_purchase_timestamp'].notna()
-    s1 = s0 & df['order_approved_at'].notna()
-    s2 = s1 & df['order_delivered_carrier_date'].notna()
-    s3 = s2 & df['order_delivered_customer_date'].notna()
-    return {
-        'created': int(s0.sum()),
-        'approved': int(s1.sum()),
-        'delivered_carrier': int(s2.sum()),
-        'delivered_customer': int(s3.sum()),
-    }
-
-
-def funnel_cr(funnel_dict):
-    stages = ['created','approved','delivered_carrier','delivered_customer']
-    counts = [funnel_dict.get(s,0) for s in stages]
+# Reads and query results are cached process-wide (src/cache.py) under the files' mtime/size, so a
+# rewritten file is picked up on the next call. Cached frames are shared: treat them as read-only.
+
+def _read(path, read):
+    with span('metrics.read_parquet', file=Path(path).name) as sp:
+        return sp.count(read())
+
+def _read_parquet(path):
+    path = Path(path)
+    return get_cache().get_or_compute(('read', str(path), file_version(path)),
+                                      lambda: _read(path, lambda: pd.read_parquet(path)))
+
+@profiled()
+def load(columns=None, filters=None):
+    """Master orders table, optionally only `columns` and the rows matching `filters`.
+
+    `filters` is the pyarrow/pandas DNF list (see pushdown_filters()); it is pushed into the
+    Parquet scan, so partitions and week row groups outside the predicates are never decoded.
+    """
+    columns = list(columns) if columns is not None else None
+    expr = pq.filters_to_expression(filters) if filters else None
+    if INP_DS.is_dir():
+        path, read = INP_DS, lambda: read_partitions(INP_DS, columns=columns, filter=expr)
+    else:
+        path, read = INP, lambda: pd.read_parquet(INP, columns=columns, filters=expr)
+    key = ('read', str(path), file_version(path), tuple(columns or ()), str(expr))
+    return get_cache().get_or_compute(key, lambda: _read(path, read))
+
+def dictionary(column):
+    """Id strings of a surrogate key column of the master, positioned by code (see src/keys.py)."""
+    path = keys.dictionary_path(INP.parent, column)
+    return get_cache().get_or_compute(('dictionary', str(path), file_version(path)),
+                                      lambda: keys.read_dictionary(path))
+
+def decode_keys(df, columns=keys.KEYS):
+    """`df` with its surrogate id `columns` decoded back to the id strings, for output that shows ids."""
+    cols = [c for c in columns if c in df.columns and keys.is_encoded(df[c])]
+    return df.assign(**{c: keys.decode(df[c], dictionary(c)) for c in cols}) if cols else df
+
+def pushdown_filters(date_range=None, states=None, categories=None, payment_types=None, stages=None):
+    """Sidebar-style filters as Parquet predicates for load(filters=...)."""
+    filters = []
+    if date_range:
+        d0, d1 = pd.to_datetime(date_range[0]), pd.to_datetime(date_range[1])
+        filters += [('order_purchase_week', '>=', d0), ('order_purchase_week', '<=', d1),
+                    # implied month bounds prune whole partitions of the incremental dataset
+                    ('order_purchase_month', '>=', d0.to_period('M').to_timestamp()),
+                    ('order_purchase_month', '<=', (d1 + pd.Timedelta(days=6)).to_period('M').to_timestamp())]
+    for col, sel in (('customer_state', states),
+                     ('product_category_name', categories),
+                     ('payment_type', payment_types),
+                     ('status_stage', stages)):
+        if sel:
+            filters.append((col, 'in', list(sel)))
+    return filters or None
+
+# Columns each frame-based metric reads, for load(columns=...)
+COLUMNS = {
+    'funnel_counts': [col for _, col in STAGES],
+    'weekly_kpis': ['order_purchase_week','order_id','order_delivered_customer_date','revenue'],
+    'top_geo': ['status_stage','customer_state','customer_city','revenue','order_id'],
+    'geo_delivered': ['status_stage','customer_state','customer_city','revenue','order_id'],
+    'cohort_retention': ['order_purchase_month','cohort_month','customer_unique_id'],
+    'sla_distribution': ['sla_days'],
+    'sla_histogram': ['sla_days'],
+}
+
+def columns_for(*metrics):
+    return list(dict.fromkeys(col for m in metrics for col in COLUMNS[m]))
+
+def cache_stats():
+    return get_cache().stats()
+
+# --- Single-pass metric engine ---
+# compute() evaluates several frame metrics together: masks and groupings two metrics need (the
+# delivered rows, the geo table) are built once, and every aggregation is a built-in vectorized
+# reduction, never a Python callable per group. The functions below it are thin wrappers.
+# With distinct='hll' the distinct order/customer counts are HyperLogLog estimates (src/hll.py).
+
+def _order_codes(df, shared, **_):
+    # order_id as integer codes (missing ids -> NaN), so distinct counts don't hash strings per group;
+    # the master already stores surrogate codes, older string masters are factorized here
+    if keys.is_encoded(df['order_id']):
+        return df['order_id']
+    codes = pd.factorize(df['order_id'])[0]
+    return pd.Series(codes, index=df.index).where(codes >= 0)
+
+def _order_hashes(df, shared, **_):
+    return hll.hash64(df['order_id'])
+
+def _approx_orders(df, shared, rows, by, precision=hll.PRECISION, **_):
+    rows = rows & df['order_id'].notna().to_numpy()
+    return hll.count_distinct(df.loc[rows, by], shared('_order_hashes')[rows], p=precision)
+
+def _delivered_rows(df, shared, **_):
+    return (df['status_stage'] == 'delivered_customer').to_numpy()
+
+def _funnel_counts(df, shared, stages=STAGES, **_):
+    counts = reached_matrix(df, stages).sum(axis=0)
+    return {name: int(n) for name, n in zip(stage_names(stages), counts)}
+
+def _weekly_kpis(df, shared, distinct='exact', **params):
+    hll_mode = distinct == 'hll'
+    parts = pd.DataFrame({
+        'delivered': df['order_delivered_customer_date'].notna(),
+        'revenue': df['revenue'],
+    })
+    aggs = dict(delivered=('delivered','sum'), revenue=('revenue','sum'), revenue_n=('revenue','count'))
+    if not hll_mode:
+        parts['order_id'] = shared('_order_codes')
+        aggs = dict(orders=('order_id','nunique'), **aggs)
+    weekly = parts.groupby(df['order_purchase_week']).agg(**aggs).reset_index()
+    if hll_mode:
+        approx = _approx_orders(df, shared, np.ones(len(df), dtype=bool), ['order_purchase_week'], **params)
+        weekly.insert(1, 'orders', approx.reindex(weekly['order_purchase_week']).round().to_numpy('int64'))
+    weekly['aov'] = weekly['revenue'] / weekly.pop('revenue_n').clip(lower=1)
+    return weekly
+
+def _rank_geo(geo):
+    """Cities by revenue (rounded to cents, so summation order can't reorder them), ties by state and
+    city name; the DuckDB backend orders the same way."""
+    geo = geo.assign(revenue=geo['revenue'].round(2))
+    return geo.sort_values(['revenue','customer_state','customer_city'], ascending=[False, True, True],
+                           key=lambda s: s.astype(str) if isinstance(s.dtype, pd.CategoricalDtype) else s)
+
+def _geo_delivered(df, shared, distinct='exact', **params):
+    rows = shared('_delivered_rows')
+    by = ['customer_state','customer_city']
+    if distinct == 'hll':
+        geo = df[rows].groupby(by, observed=True).agg(revenue=('revenue','sum'))
+        approx = _approx_orders(df, shared, rows, by, **params)
+        geo['orders'] = approx.reindex(geo.index).fillna(0).round().to_numpy('int64')
+        return _rank_geo(geo.reset_index())
+    delivered = df[rows].assign(order_id=shared('_order_codes')[rows])
+    return _rank_geo(delivered.groupby(by, observed=True)
+                              .agg(revenue=('revenue','sum'),
+                                   orders=('order_id','nunique'))
+                              .reset_index())
+
+def _top_geo(df, shared, n=10, **_):
+    return shared('geo_delivered').head(n)
+
+def _cohort_retention(df, shared, measure='customers', distinct='exact', precision=hll.PRECISION, **_):
+    if distinct == 'hll' and measure == 'customers':
+        active = (df['customer_unique_id'].notna() & (df['order_purchase_month'] >= df['cohort_month'])).to_numpy()
+        return _sketch_retention(hll.count_distinct(df.loc[active, ['cohort_month','order_purchase_month']],
+                                                    hll.hash64(df.loc[active, 'customer_unique_id']),
+                                                    p=precision))
+    cells, _ = retention_cells(df, track=False)
+    return retention_matrix(cells, measure)
+
+def _sla_distribution(df, shared, **_):
+    return df['sla_days'].dropna()
+
+def _sla_histogram(df, shared, **_):
+    # same 1-day bins as the SLA cube, so the output size doesn't depend on the order count
+    counts = np.bincount(sla_bin(df['sla_days'].dropna()), minlength=SLA_MAX_DAYS + 1)
+    return pd.Series(counts, index=pd.RangeIndex(SLA_MAX_DAYS + 1, name='sla_bin'), name='n')
+
+ENGINE = {
+    '_order_codes': _order_codes,
+    '_order_hashes': _order_hashes,
+    '_delivered_rows': _delivered_rows,
+    'funnel_counts': _funnel_counts,
+    'weekly_kpis': _weekly_kpis,
+    'geo_delivered': _geo_delivered,
+    'top_geo': _top_geo,
+    'cohort_retention': _cohort_retention,
+    'sla_distribution': _sla_distribution,
+    'sla_histogram': _sla_histogram,
+}
+
+def compute(df, metrics, **params):
+    """{metric: result} for every public name in `metrics` (see ENGINE), from one frame.
+
+    Load the frame with load(columns_for(*metrics)). `params` go to the metrics that take them:
+    stages (funnel_counts), n (top_geo), measure (cohort_retention), and distinct='hll' with an
+    optional precision (weekly_kpis, geo_delivered/top_geo, cohort_retention) for approximate
+    distinct counts.
+    """
+    results = {}
+
+    def shared(metric):
+        if metric not in results:
+            with span(f'metrics.{metric.lstrip("_")}') as sp:
+                results[metric] = sp.count(ENGINE[metric](df, shared, **params))
+        return results[metric]
+
+    return {m: shared(m) for m in metrics}
+
+# --- Backends ---
+# evaluate() runs metrics for a set of sidebar filters on either backend: 'pandas' loads the
+# needed columns and uses compute(); 'duckdb' runs SQL over the Parquet (src/duckdb_backend.py)
+# without loading the table. Both return the same frames. OLIST_BACKEND sets the default.
+
+BACKENDS = ('pandas', 'duckdb')
+DEFAULT_BACKEND = os.environ.get('OLIST_BACKEND', 'pandas')
+
+@profiled()
+def evaluate(metrics, filters=None, backend=None, **params):
+    """{metric: result} for the orders matching `filters` (see pushdown_filters()).
+
+    Category and payment type filters keep the orders with at least one such item / payment when
+    the order facts exist (as query() does), else they match the order's primary labels.
+    """
+    backend = backend or DEFAULT_BACKEND
+    if backend == 'duckdb':
+        from src import duckdb_backend
+        return duckdb_backend.compute(metrics, filters, **params)
+    if backend != 'pandas':
+        raise ValueError(f'unknown backend {backend!r}, expected one of {BACKENDS}')
+    if by_facts(filters or {}):
+        return fact_compute(metrics, filters, **params)
+    return compute(load(columns_for(*metrics), pushdown_filters(**(filters or {}))), metrics, **params)
+
+def funnel_counts(df, stages=STAGES):
+    return compute(df, ['funnel_counts'], stages=stages)['funnel_counts']
+
+
+def funnel_cr(funnel_dict, stages=STAGES):
+    names = stage_names(stages)
+    counts = [funnel_dict.get(s,0) for s in names]
     cr_step = {}
-    for i in range(1, len(stages)):
+    for i in range(1, len(names)):
         prev, cur = counts[i-1], counts[i]
-        cr_step[f"{stages[i-1]}→{stages[i]}"] = (cur/prev) if prev else 0.0
+        cr_step[f"{names[i-1]}→{names[i]}"] = (cur/prev) if prev else 0.0
     overall = (counts[-1]/counts[0]) if counts[0] else 0.0
     return cr_step, overall
 
 def weekly_kpis(df):
-    weekly = (df.groupby('order_purchase_week')
-                .agg(orders=('order_id','nunique'),
-                     delivered=('order_delivered_customer_date', lambda s: s.notna().sum()),
-                     revenue=('revenue','sum'),
-                     aov=('revenue', lambda s: s.sum()/max(1, s.count())))
-                .reset_index())
-    return weekly
+    return compute(df, ['weekly_kpis'])['weekly_kpis']
 
 def top_geo(df, n=10):
-    delivered = df[df['status_stage']=='delivered_customer']
-    geo = (delivered.groupby(['customer_state','customer_city'])
-                  .agg(revenue=('revenue','sum'),
-                       orders=('order_id','nunique'))
-                  .reset_index()
-                  .sort_values('revenue', ascending=False)
-                  .head(n))
-    return geo
-
-def cohort_retention(df):
-    d = df.dropna(subset=['order_purchase_month','cohort_month']).copy()
-    d['period_index'] = ((d['order_purchase_month'].dt.to_period('M').view('i8') -
-                          d['cohort_month'].dt.to_period('M').view('i8'))).astype(int)
-    pivot = (d.groupby(['cohort_month','period_index'])['customer_unique_id']
-               .nunique()
-               .reset_index()
-               .pivot(index='cohort_month', columns='period_index', values='customer_unique_id'))
-    cohort_sizes = pivot[0]
-    retention = pivot.divide(cohort_sizes, axis=0).fillna(0.0)
-    return retention
+    return compute(df, ['top_geo'], n=n)['top_geo']
+
+def cohort_retention(df, measure='customers'):
+    """Retention by first-purchase cohort: distinct 'customers' (default), 'orders' or 'revenue'."""
+    return compute(df, ['cohort_retention'], measure=measure)['cohort_retention']
 
 def payment_breakdown():
     p = Path('data/processed/payment_type_summary.parquet')
     if p.exists():
-        return pd.read_parquet(p)
+        return _read_parquet(p)
     return pd.DataFrame(columns=['payment_type','total','n'])
 
 def category_revenue(top_n=15):
     p = Path('data/processed/category_revenue.parquet')
     if not p.exists():
         return pd.DataFrame(columns=['product_category_name','revenue','items'])
-    df = pd.read_parquet(p).sort_values('revenue', ascending=False).head(top_n)
+    df = _read_parquet(p).sort_values('revenue', ascending=False).head(top_n)
     return df
 
 def sla_distribution(df):
-    d = df['sla_days'].dropna()
-    return d
\ No newline at end of file
+    return compute(df, ['sla_distribution'])['sla_distribution']
+
+RETENTION_CELLS = Path('data/processed/retention_cells.parquet')
+
+def load_retention(measure='customers'):
+    """Retention matrix for the whole dataset from the cells the ETL maintains."""
+    return retention_matrix(_read_parquet(RETENTION_CELLS), measure)
+
+# --- Rollup cube (built by etl.build_cube) ---
+# Cells hold additive measures per week x state x city x primary payment type x primary category
+# (the SLA histogram drops city), so every query below costs O(cube cells), not O(orders).
+
+CUBE = Path('data/processed/rollup_cube.parquet')
+CUBE_SLA = Path('data/processed/rollup_sla.parquet')
+
+def load_cube():
+    return _read_parquet(CUBE), _read_parquet(CUBE_SLA)
+
+def apply_filters(frame, date_range=None, states=None, categories=None, payment_types=None):
+    """Rows matching the sidebar filters.
+
+    Works on the cube, the SLA cube and the master table alike, since they share the dimension columns.
+    """
+    mask = np.ones(len(frame), dtype=bool)
+    if date_range:
+        d0, d1 = pd.to_datetime(date_range[0]), pd.to_datetime(date_range[1])
+        mask &= ((frame['order_purchase_week'] >= d0) & (frame['order_purchase_week'] <= d1)).to_numpy()
+    for col, sel in (('customer_state', states),
+                     ('product_category_name', categories),
+                     ('payment_type', payment_types)):
+        if sel:
+            mask &= frame[col].isin(sel).to_numpy()
+    return frame[mask]
+
+def cube_funnel_counts(cube, stages=STAGES):
+    return {name: int(cube[reached_col(name)].sum()) for name in stage_names(stages)}
+
+def cube_weekly_kpis(cube):
+    weekly = (cube.groupby('order_purchase_week', as_index=False)
+                  [['orders','delivered','revenue','revenue_n']].sum())
+    weekly['aov'] = weekly['revenue'] / weekly['revenue_n'].clip(lower=1)
+    return weekly.drop(columns='revenue_n')
+
+def cube_top_geo(cube, n=10):
+    geo = (cube[cube['delivered'] > 0]
+               .groupby(['customer_state','customer_city'], observed=True)
+               .agg(revenue=('delivered_revenue','sum'), orders=('delivered','sum'))
+               .reset_index())
+    return _rank_geo(geo).head(n)
+
+def cube_payment_breakdown(cube):
+    """Paid value and order count by primary payment type."""
+    return (cube.groupby('payment_type', as_index=False)
+                .agg(total=('total_paid','sum'), n=('orders','sum')))
+
+def cube_category_revenue(cube, top_n=15):
+    """Order revenue and items by primary category."""
+    return (cube.groupby('product_category_name', as_index=False)
+                .agg(revenue=('revenue','sum'), items=('items','sum'))
+                .sort_values('revenue', ascending=False)
+                .head(top_n))
+
+def cube_sla_histogram(sla):
+    """Delivered orders per 1-day SLA bin (last bin = SLA_MAX_DAYS and slower)."""
+    return (sla.groupby('sla_bin')['n'].sum()
+               .reindex(pd.RangeIndex(SLA_MAX_DAYS + 1, name='sla_bin'), fill_value=0))
+
+
+# --- Distinct-count sketches (built by etl.build_sketches) ---
+# HyperLogLog sketches of orders / delivered orders per cube cell and of customers per cohort x
+# purchase month cell; the distinct count of any selection is estimated from the union of its cells.
+
+HLL_WEEKLY = Path('data/processed/hll_weekly.parquet')
+HLL_COHORTS = Path('data/processed/hll_cohorts.parquet')
+
+def load_sketches():
+    """(order sketches, cohort customer sketches, precision)."""
+    return _read_parquet(HLL_WEEKLY), _read_parquet(HLL_COHORTS), hll.sketch_precision(HLL_WEEKLY)
+
+def sketch_orders(sketches, by, measure='orders', p=hll.PRECISION):
+    """Approximate distinct orders per `by` group; measure is 'orders' or 'delivered'."""
+    cells = sketches[(sketches['measure'] == measure).to_numpy()]
+    return hll.union_distinct(cells, by, p).round().astype('int64')
+
+def _sketch_retention(customers):
+    """Retention matrix from distinct customers per (cohort_month, order_purchase_month)."""
+    cells = customers.rename('customers').reset_index()
+    cells['period_index'] = month_index(cells['order_purchase_month']) - month_index(cells['cohort_month'])
+    return retention_matrix(cells[['cohort_month','period_index','customers']], 'customers')
+
+def sketch_cohort_retention(sketches, p=hll.PRECISION):
+    return _sketch_retention(hll.union_distinct(sketches, ['cohort_month','order_purchase_month'], p))
+
+def _with_sketch_orders(metric, result, filters):
+    sketches, _, p = load_sketches()
+    by, measure = {'weekly_kpis': (['order_purchase_week'], 'orders'),
+                   'top_geo': (['customer_state','customer_city'], 'delivered')}[metric]
+    counts = sketch_orders(apply_filters(sketches, **filters), by, measure, p)
+    keys = pd.MultiIndex.from_frame(result[by]) if len(by) > 1 else pd.Index(result[by[0]])
+    return result.assign(orders=counts.reindex(keys).fillna(0).to_numpy('int64'))
+
+
+# --- SLA quantile digests (built by etl.write_sla_digests) ---
+# t-digests of sla_days and delay_days (delivered minus estimated delivery, in days) per week x
+# state plus late-delivery counts per cell; every query merges the selected cells, so its cost
+# depends on the number of cells, not orders. Only week and state filters apply to the stored
+# ones; query() digests the selected orders themselves under a category or payment type filter.
+
+SLA_DIGESTS = Path('data/processed/sla_digests.parquet')
+SLA_LATE = Path('data/processed/sla_late.parquet')
+QUANTILES = (0.5, 0.9, 0.99)
+
+def load_sla_digests():
+    return _read_parquet(SLA_DIGESTS), _read_parquet(SLA_LATE)
+
+def digest_quantiles(digests, measure='sla_days', qs=QUANTILES, by=None):
+    """p50/p90/p99 (and n) of `measure` over the selected cells, per `by` group if given."""
+    by = list(by) if by else None
+    return tdigest.quantiles(digests[(digests['measure'] == measure).to_numpy()], qs, by)
+
+def digest_sla_histogram(digests):
+    """Approximate delivered orders per 1-day SLA bin, same bins as sla_histogram."""
+    cells = digests[(digests['measure'] == 'sla_days').to_numpy()]
+    counts = tdigest.histogram(cells, np.arange(SLA_MAX_DAYS + 2, dtype='float64'))
+    return pd.Series(counts.round().astype('int64'), index=pd.RangeIndex(SLA_MAX_DAYS + 1, name='sla_bin'), name='n')
+
+def late_stats(late, by=None):
+    """Delivered orders, late ones (after the estimated date), late share and mean days late."""
+    cols = ['delivered', 'late', 'days_late']
+    out = (late.groupby(list(by), observed=True)[cols].sum() if by
+           else late[cols].sum().to_frame().T)
+    out['late_share'] = out['late'] / out['delivered'].clip(lower=1)
+    out['avg_days_late'] = out['days_late'] / out['late'].clip(lower=1)
+    return out
+
+# --- Order facts (built by etl.write_facts) ---
+# Item and payment rows per order x category / payment type, sorted by order code with CSR offsets
+# and per-label order bitsets (src/facts.py). A filtered order set is a boolean mask over the codes;
+# its facts are one gather, so category revenue and the payment mix count every item and payment
+# of the selected orders (the cube only knows each order's primary category and payment type).
+
+ORDER_ITEMS = Path('data/processed/order_items.parquet')
+ORDER_PAYMENTS = Path('data/processed/order_payments.parquet')
+ORDER_INDEX = Path('data/processed/order_index.parquet')
+FACT_LABELS = {'items': 'product_category_name', 'payments': 'payment_type'}
+
+def load_facts():
+    """{'items', 'payments': fact frames, 'offsets', 'bitsets': per table, 'n_orders'}."""
+    def read():
+        n_orders, offsets, bitsets = facts.read_index(ORDER_INDEX)
+        return dict(items=pd.read_parquet(ORDER_ITEMS), payments=pd.read_parquet(ORDER_PAYMENTS),
+                    offsets=offsets, bitsets=bitsets, n_orders=n_orders)
+    version = (file_version(ORDER_INDEX), file_version(ORDER_ITEMS), file_version(ORDER_PAYMENTS))
+    return get_cache().get_or_compute(('facts', version), read)
+
+def _having(table, labels):
+    """Mask of the orders with at least one `table` row of any of `labels`."""
+    f = load_facts()
+    sets = [f['bitsets'][table][l] for l in labels if l in f['bitsets'][table]]
+    if not sets:
+        return np.zeros(f['n_orders'], dtype=bool)
+    return facts.unpack(np.bitwise_or.reduce(sets), f['n_orders'])
+
+def order_mask(date_range=None, states=None, categories=None, payment_types=None, stages=None):
+    """Boolean mask over order codes: orders matching the master filters that have an item in one of
+    `categories` and a payment of one of `payment_types`."""
+    flt = pushdown_filters(date_range=date_range, states=states, stages=stages)
+    n_orders = load_facts()['n_orders']
+    if flt:
+        mask = np.zeros(n_orders, dtype=bool)
+        mask[load(['order_id'], flt)['order_id'].to_numpy(np.int64)] = True
+    else:
+        mask = np.ones(n_orders, dtype=bool)
+    for table, sel in (('items', categories), ('payments', payment_types)):
+        if sel:
+            mask &= _having(table, sel)
+    return mask
+
+def fact_totals(table, mask, values, labels=None):
+    """Sums of the `values` columns per label over the `table` facts of the orders in `mask` (only
+    `labels` if given), as one gather and a bincount per column."""
+    f = load_facts()
+    facts_ = f[table]
+    label = facts_[FACT_LABELS[table]].array
+    rows = facts.rows(f['offsets'][table], np.flatnonzero(mask))
+    codes = label.codes[rows]
+    n = len(label.categories)
+    out = pd.DataFrame({FACT_LABELS[table]: label.categories.astype(object)})
+    for col in values:
+        out[col] = np.bincount(codes, weights=facts_[col].to_numpy()[rows], minlength=n).astype(facts_[col].dtype)
+    keep = np.bincount(codes, minlength=n) > 0
+    if labels:
+        keep &= out[FACT_LABELS[table]].isin(labels).to_numpy()
+    return out[keep].reset_index(drop=True)
+
+def fact_category_revenue(mask, categories=None, top_n=15):
+    """Revenue and items by category over every item of the orders in `mask`."""
+    return (fact_totals('items', mask, ['revenue','items'], categories)
+                .sort_values('revenue', ascending=False)
+                .head(top_n))
+
+def fact_payment_breakdown(mask, payment_types=None):
+    """Paid value and number of payments by payment type over the orders in `mask`."""
+    return fact_totals('payments', mask, ['total','n'], payment_types)
+
+def fact_frame(columns, filters=None):
+    """Master rows (`columns` and order_id) of the orders in order_mask(**filters)."""
+    filters = filters or {}
+    master = pushdown_filters(**{k: filters.get(k) for k in ('date_range', 'states', 'stages')})
+    df = load(list(dict.fromkeys([*columns, 'order_id'])), master)
+    mask = np.ones(len(df), dtype=bool)
+    for table, sel in (('items', filters.get('categories')), ('payments', filters.get('payment_types'))):
+        if sel:
+            mask &= _having(table, sel)[df['order_id'].to_numpy(np.int64)]
+    return df[mask]
+
+def fact_compute(metrics, filters=None, **params):
+    """compute() over the orders in order_mask(**filters), so a category or payment type filter
+    selects the orders having such an item or payment."""
+    return compute(fact_frame(columns_for(*metrics), filters), metrics, **params)
+
+def by_facts(filters):
+    """True if `filters` select orders by category or payment type and the facts exist to do so."""
+    return bool(filters.get('categories') or filters.get('payment_types')) and ORDER_INDEX.exists()
+
+
+# --- Memoized queries for the app ---
+
+CUBE_QUERIES = {
+    'funnel_counts': cube_funnel_counts,
+    'weekly_kpis': cube_weekly_kpis,
+    'top_geo': cube_top_geo,
+    'payment_breakdown': cube_payment_breakdown,
+    'category_revenue': cube_category_revenue,
+}
+
+# Served from the order facts when they exist: every item / payment of the matching orders, with the
+# category and payment type filters meaning "has such an item / payment"
+FACT_QUERIES = {
+    'payment_breakdown': fact_payment_breakdown,
+    'category_revenue': fact_category_revenue,
+}
+FACT_FILTERS = {'payment_breakdown': 'payment_types', 'category_revenue': 'categories'}
+# computed from the master rows of the orders in order_mask() under a category / payment type filter
+FACT_METRICS = ['funnel_counts', 'weekly_kpis', 'top_geo', 'sla_histogram', 'cohort_retention']
+
+def filter_key(date_range=None, states=None, categories=None, payment_types=None):
+    """Canonical, hashable form of the sidebar filters (order and empty selections don't matter)."""
+    dates = tuple(pd.Timestamp(d).isoformat() for d in date_range) if date_range else None
+    return (dates,
+            tuple(sorted(states or ())),
+            tuple(sorted(categories or ())),
+            tuple(sorted(payment_types or ())))
+
+def _version():
+    return (file_version(INP_DS), file_version(INP), file_version(CUBE), file_version(CUBE_SLA),
+            file_version(HLL_WEEKLY), file_version(HLL_COHORTS), file_version(SLA_DIGESTS),
+            file_version(SLA_LATE), file_version(ORDER_INDEX))
+
+def query(metric, filters=None, distinct='exact', **params):
+    """`metric` for the given filters, memoized on (dataset version, metric, filters, params).
+
+    metric is one of CUBE_QUERIES (payment_breakdown and category_revenue from the order facts once
+    the ETL has built them), 'sla_histogram', 'cohort_retention', or from the SLA digests
+    'sla_quantiles' (params: measure, qs, by) and 'late_stats' (by). With distinct='hll' the
+    distinct orders of weekly_kpis/top_geo and the cohort customers are HyperLogLog estimates from
+    the stored sketches, so cohort_retention doesn't read the order table.
+
+    Once the order facts exist, a category or payment type filter means "has such an item /
+    payment" for every metric: the order-level ones are then computed from the master rows of the
+    orders in order_mask() (HyperLogLog estimates from those rows' ids), as the cube and the stored
+    sketches and digests only know each order's primary category and payment type.
+    """
+    filters = filters or {}
+    fkey = filter_key(**filters)
+    key = ('query', metric, fkey, distinct, tuple(sorted(params.items())), _version())
+
+    def run():
+        if metric in FACT_QUERIES and ORDER_INDEX.exists():
+            mask = get_cache().get_or_compute(('order_mask', fkey, _version()), lambda: order_mask(**filters))
+            return FACT_QUERIES[metric](mask, filters.get(FACT_FILTERS[metric]), **params)
+        if by_facts(filters):
+            # one read of the selected orders serves every order-level chart of this filter set
+            df = get_cache().get_or_compute(('fact_frame', fkey, _version()), lambda: fact_frame(
+                columns_for(*FACT_METRICS) + SLA_COLUMNS + DIGEST_DIMS, filters))
+            if metric in ('sla_quantiles', 'late_stats'):
+                digests, late = get_cache().get_or_compute(('fact_sla', fkey, _version()),
+                                                           lambda: sla_digests(df, DIGEST_DIMS))
+                return late_stats(late, **params) if metric == 'late_stats' else digest_quantiles(digests, **params)
+            return compute(df, [metric], distinct=distinct, **params)[metric]
+        if metric == 'cohort_retention' and distinct == 'hll':
+            _, cohorts, p = load_sketches()
+            return sketch_cohort_retention(apply_filters(cohorts, **filters), p)
+        if metric == 'cohort_retention':
+            return evaluate(['cohort_retention'], filters, **params)['cohort_retention']
+        if metric == 'sla_histogram':
+            return cube_sla_histogram(apply_filters(load_cube()[1], **filters))
+        if metric in ('sla_quantiles', 'late_stats'):
+            week_state = {k: filters.get(k) for k in ('date_range', 'states')}
+            digests, late = (apply_filters(t, **week_state) for t in load_sla_digests())
+            if metric == 'late_stats':
+                return late_stats(late, **params)
+            return digest_quantiles(digests, **params)
+        cube_f = get_cache().get_or_compute(('cube', fkey, _version()),
+                                            lambda: apply_filters(load_cube()[0], **filters))
+        result = CUBE_QUERIES[metric](cube_f, **params)
+        if distinct == 'hll' and metric in ('weekly_kpis', 'top_geo'):
+            result = _with_sketch_orders(metric, result, filters)
+        return result
+
+    with span(f'metrics.query.{metric}') as sp:
+        return sp.count(get_cache().get_or_compute(key, run))
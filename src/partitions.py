@@ -0,0 +1,63 @@
+import shutil
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from pathlib import Path
+
+# Hive layout used by the incremental ETL: orders_master/order_purchase_month=2017-01-01/part-0.parquet
+PARTITION_COL = 'order_purchase_month'
+PARTITIONING = ds.partitioning(pa.schema([(PARTITION_COL, pa.date32())]), flavor='hive')
+# Master files are sorted by purchase week with one row group per week, so date predicates
+# skip whole row groups using their min/max statistics.
+ROW_GROUP_COL = 'order_purchase_week'
+
+
+def _to_table(df, drop=()):
+    table = pa.Table.from_pandas(df.drop(columns=list(drop)), preserve_index=False)
+    # Same dictionary index width in every partition, whatever pandas picked for the codes.
+    schema = pa.schema([
+        f.with_type(pa.dictionary(pa.int32(), f.type.value_type)) if pa.types.is_dictionary(f.type) else f
+        for f in table.schema
+    ])
+    return table.cast(schema)
+
+
+def partition_dir(path, month):
+    key = '__HIVE_DEFAULT_PARTITION__' if pd.isna(month) else pd.Timestamp(month).strftime('%Y-%m-%d')
+    return Path(path) / f'{PARTITION_COL}={key}'
+
+
+def write_partitions(df, path):
+    """Write `df` into the dataset, replacing only the month partitions it contains."""
+    for month, part in df.groupby(PARTITION_COL, dropna=False, sort=True):
+        target = partition_dir(path, month)
+        if target.exists():
+            shutil.rmtree(target)
+        target.mkdir(parents=True)
+        write_row_grouped(part, target / 'part-0.parquet', drop=[PARTITION_COL])
+
+
+def write_row_grouped(df, path, drop=()):
+    """Write `df` sorted by purchase week, one row group per week."""
+    df = df.sort_values([ROW_GROUP_COL, 'order_purchase_timestamp'], kind='stable')
+    table = _to_table(df, drop)
+    codes = pd.factorize(df[ROW_GROUP_COL])[0]
+    bounds = [0, *(np.flatnonzero(codes[1:] != codes[:-1]) + 1), len(df)]
+    with pq.ParquetWriter(path, table.schema) as writer:
+        for start, stop in zip(bounds[:-1], bounds[1:]):
+            writer.write_table(table.slice(start, stop - start))
+
+
+def read_partitions(path, months=None, columns=None, filter=None):
+    """Read the dataset (optionally only some months) back with a datetime64 month column."""
+    dataset = ds.dataset(path, format='parquet', partitioning=PARTITIONING)
+    if months is not None:
+        wanted = pa.array(pd.to_datetime(list(months)).date, type=pa.date32())
+        month_filter = ds.field(PARTITION_COL).isin(wanted)
+        filter = month_filter if filter is None else (filter & month_filter)
+    df = dataset.to_table(columns=columns, filter=filter).to_pandas()
+    if PARTITION_COL in df.columns:
+        df[PARTITION_COL] = pd.to_datetime(df[PARTITION_COL]).astype('datetime64[ns]')
+    return df
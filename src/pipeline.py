@@ -0,0 +1,249 @@
+"""One entry point for the whole build: ETL, then the two HTML reports and the exports.
+
+    python3 -m src.pipeline                  # run every stage that is out of date
+    python3 -m src.pipeline dashboard        # just this stage (and the stages it needs)
+    python3 -m src.pipeline --dry-run        # show what would run
+    python3 -m src.pipeline --force -j 2
+
+Each stage declares the files it reads and writes; a stage that reads another stage's output
+runs after it, the others run side by side as subprocesses. A stage is skipped when its
+fingerprint -- the content hash of its inputs, of the code it runs and of its command -- equals
+the one recorded after its last successful run and its outputs are still the files that run
+wrote. File hashes are cached by (mtime, size), so a no-op run only stats files. A stage whose
+outputs come out byte-identical leaves its dependents up to date.
+"""
+import argparse
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+STATE = Path('data/processed/pipeline_state.json')
+
+# --- Stages ---
+# Data paths are relative to the working directory (like every script here), code paths to ROOT.
+
+RAW = ['data/raw/*.csv']
+MASTER = 'data/processed/orders_master.parquet'
+MASTER_DS = 'data/processed/orders_master/**/*.parquet'   # written by `etl.py --incremental`
+PAYMENTS = 'data/processed/payment_type_summary.parquet'
+CATEGORIES = 'data/processed/category_revenue.parquet'
+SLA_DIGESTS = ['data/processed/sla_digests.parquet', 'data/processed/sla_late.parquet']
+CUBES = ['data/processed/rollup_cube.parquet', 'data/processed/rollup_sla.parquet']
+PROCESSED = [MASTER, PAYMENTS, CATEGORIES, *CUBES, 'data/processed/retention_cells.parquet',
+             'data/processed/retention_customers.parquet', 'data/processed/hll_weekly.parquet',
+             'data/processed/hll_cohorts.parquet', *SLA_DIGESTS,
+             'data/processed/order_items.parquet', 'data/processed/order_payments.parquet',
+             'data/processed/order_index.parquet', 'data/processed/order_index_bitsets.parquet',
+             *(f'data/processed/dict_{key}.parquet' for key in ('order_id', 'customer_id', 'customer_unique_id'))]
+
+CORE = ['src/funnel.py', 'src/retention.py', 'src/partitions.py', 'src/hll.py', 'src/tdigest.py',
+        'src/profiling.py', 'src/keys.py', 'src/facts.py']
+METRICS = [*CORE, 'src/metrics.py', 'src/cache.py']
+IMAGES = ['funnel', 'weekly', 'aov', 'payment', 'categories', 'sla', 'geo', 'cohorts']   # export_pngs.IMAGES
+
+# name -> (command, code files, input patterns, output files)
+PIPELINE = {
+    'etl': (['src/etl.py'], ['src/etl.py', *CORE], RAW, PROCESSED),
+    'dashboard': (['dashboards/generate_dashboard.py'], ['dashboards/generate_dashboard.py', 'src/bundle.py', *METRICS],
+                  [MASTER, MASTER_DS, PAYMENTS, CATEGORIES, *SLA_DIGESTS, *CUBES],
+                  ['docs/index.html', 'docs/explore.html', 'docs/explore.bin']),
+    'abtest': (['dashboards/generate_abtest_mock.py'],
+               ['dashboards/generate_abtest_mock.py', 'src/abtest.py', *METRICS],
+               [MASTER, MASTER_DS], ['docs/abtest.html']),
+    'csvs': (['-m', 'src.export_csvs'], ['src/export_csvs.py', *METRICS], [MASTER, MASTER_DS],
+             ['assets/csv/orders_master.csv', 'assets/csv/weekly_kpis.csv', 'assets/csv/geo_delivered.csv']),
+    'pngs': (['-m', 'src.export_pngs'], ['src/export_pngs.py', 'dashboards/generate_dashboard.py', 'src/bundle.py',
+                                         *METRICS],
+             [MASTER, MASTER_DS, PAYMENTS, CATEGORIES], [f'assets/img/{stem}.png' for stem in IMAGES]),
+}
+
+
+def dependencies(pipeline=PIPELINE):
+    """{stage: stages whose outputs it reads}."""
+    produced = {out: name for name, (_, _, _, outputs) in pipeline.items() for out in outputs}
+    return {name: sorted({produced[i] for i in inputs if i in produced} - {name})
+            for name, (_, _, inputs, _) in pipeline.items()}
+
+
+def order(targets, deps):
+    """`targets` plus everything they depend on, upstream stages first."""
+    seen, out = set(), []
+
+    def visit(name):
+        if name not in seen:
+            seen.add(name)
+            for dep in deps[name]:
+                visit(dep)
+            out.append(name)
+    for name in targets:
+        visit(name)
+    return out
+
+
+# --- Fingerprints ---
+
+class Hasher:
+    """sha256 of files, cached by (mtime_ns, size) so unchanged files are never re-read."""
+
+    def __init__(self, cache=None):
+        self.cache = cache or {}
+
+    def file(self, path):
+        st = path.stat()
+        key = str(path.resolve())
+        hit = self.cache.get(key)
+        if hit and hit[0] == st.st_mtime_ns and hit[1] == st.st_size:
+            return hit[2]
+        h = hashlib.sha256()
+        with open(path, 'rb') as f:
+            while chunk := f.read(1 << 20):
+                h.update(chunk)
+        self.cache[key] = [st.st_mtime_ns, st.st_size, h.hexdigest()]
+        return h.hexdigest()
+
+    def files(self, patterns, base):
+        """{relative path: digest} for every existing file matching `patterns` under `base`."""
+        found = {}
+        for pattern in patterns:
+            for path in sorted(base.glob(pattern)):
+                if path.is_file():
+                    found[str(path.relative_to(base))] = self.file(path)
+        return found
+
+
+def fingerprint(hasher, command, code, inputs):
+    h = hashlib.sha256(json.dumps(command).encode())
+    for group in (hasher.files(code, ROOT), hasher.files(inputs, Path.cwd())):
+        h.update(json.dumps(group, sort_keys=True).encode())
+    return h.hexdigest()
+
+
+def read_state(path=STATE):
+    if path.exists():
+        return json.loads(path.read_text())
+    return {'stages': {}, 'files': {}}
+
+
+def write_state(state, path=STATE):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + '.tmp')
+    tmp.write_text(json.dumps(state, indent=1, sort_keys=True))
+    tmp.replace(path)
+
+
+def up_to_date(hasher, record, key, outputs):
+    if not record or record['key'] != key:
+        return False
+    cwd = Path.cwd()
+    return all((cwd / out).is_file() and hasher.file(cwd / out) == record['outputs'].get(out)
+               for out in outputs)
+
+
+# --- Runner ---
+
+def run_stage(command):
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [str(ROOT), os.environ.get('PYTHONPATH')])))
+    if command[0] != '-m':
+        command = [str(ROOT / command[0]), *command[1:]]
+    t0 = time.perf_counter()
+    proc = subprocess.run([sys.executable, *command], capture_output=True, text=True, env=env)
+    return proc.returncode, proc.stdout + proc.stderr, time.perf_counter() - t0
+
+
+def run(targets=None, force=False, jobs=None, dry_run=False, verbose=False, pipeline=PIPELINE):
+    """Bring `targets` (default: every stage) up to date; returns {stage: (status, seconds)}."""
+    deps = dependencies(pipeline)
+    todo = order(targets or list(pipeline), deps)
+    state = read_state()
+    hasher = Hasher(state['files'])
+    results, keys = {}, {}
+
+    def ready(name):
+        return all(dep in results for dep in deps[name] if dep in todo)
+
+    def check(name):
+        """'skip' / 'blocked' / fingerprint to run with."""
+        upstream = [results[dep][0] for dep in deps[name] if dep in results]
+        if any(status in ('failed', 'blocked') for status in upstream):
+            return 'blocked'
+        if 'would run' in upstream:
+            return 'would run'
+        command, code, inputs, outputs = pipeline[name]
+        key = fingerprint(hasher, command, code, inputs)
+        if not force and up_to_date(hasher, state['stages'].get(name), key, outputs):
+            return 'skip'
+        return key
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=jobs or len(todo)) as pool:
+        running = {}
+        while len(results) < len(todo):
+            # start every stage whose upstream stages are done
+            for name in todo:
+                if name in results or name in running.values() or not ready(name):
+                    continue
+                t = time.perf_counter()
+                key = check(name)
+                if key in ('skip', 'blocked', 'would run') or dry_run:
+                    status = key if key in ('skip', 'blocked') else 'would run'
+                    results[name] = (status, time.perf_counter() - t)
+                    continue
+                print(f'[{name}] running', flush=True)
+                running[pool.submit(run_stage, pipeline[name][0])] = name
+                state['stages'].pop(name, None)
+                keys[name] = key
+            if not running:
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                code, log, seconds = future.result()
+                if verbose or code:
+                    print(f'[{name}] ' + log.rstrip().replace('\n', f'\n[{name}] '), flush=True)
+                if code:
+                    results[name] = ('failed', seconds)
+                    continue
+                outputs = pipeline[name][3]
+                missing = [out for out in outputs if not Path(out).is_file()]
+                if missing:
+                    print(f'[{name}] did not write: {", ".join(missing)}', flush=True)
+                    results[name] = ('failed', seconds)
+                    continue
+                state['stages'][name] = {
+                    'key': keys.pop(name),
+                    'outputs': {out: hasher.file(Path(out)) for out in outputs},
+                    'seconds': round(seconds, 3),
+                }
+                results[name] = ('ran', seconds)
+                write_state(state)
+    if not dry_run:
+        write_state(state)
+
+    print(f'\n{"stage":10s} {"status":10s} {"seconds":>8s}')
+    for name in todo:
+        status, seconds = results[name]
+        print(f'{name:10s} {status:10s} {seconds:8.2f}')
+    print(f'total {time.perf_counter() - t0:.2f}s')
+    return results
+
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser(description='Build every out-of-date stage of the pipeline.')
+    ap.add_argument('stages', nargs='*', metavar='stage',
+                    help=f'stages to build with their dependencies (default: all of {", ".join(PIPELINE)})')
+    ap.add_argument('--force', action='store_true', help='run the stages even if they are up to date')
+    ap.add_argument('-j', '--jobs', type=int, help='stages run at once (default: all that are ready)')
+    ap.add_argument('--dry-run', action='store_true', help='only report which stages would run')
+    ap.add_argument('-v', '--verbose', action='store_true', help="print every stage's output")
+    args = ap.parse_args()
+    unknown = sorted(set(args.stages) - set(PIPELINE))
+    if unknown:
+        ap.error(f'unknown stage(s): {", ".join(unknown)}')
+    results = run(args.stages, args.force, args.jobs, args.dry_run, args.verbose)
+    sys.exit(any(status in ('failed', 'blocked') for status, _ in results.values()))
@@ -0,0 +1,223 @@
+import atexit
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from functools import wraps
+from pathlib import Path
+
+# Opt-in tracing of named stages: wall time, CPU time, peak traced memory and row counts.
+#
+#     @profiled()                           # records 'etl.read_csv' on every call
+#     def read_csv(name): ...
+#
+#     with span('etl.merge') as sp:         # a block; sp.count(frame) records its rows
+#         m = sp.count(orders.merge(...))
+#
+# Nothing is recorded until setup()/enable() turns it on (--profile on the scripts, or
+# OLIST_PROFILE=1 / OLIST_PROFILE=<dir>); until then a decorated call costs one global check and
+# span() returns a shared no-op. The trace is written as Chrome trace-event JSON (chrome://tracing,
+# ui.perfetto.dev) plus a plain-text summary per stage. Peak memory comes from tracemalloc: Python
+# and NumPy/pandas allocations (not Arrow's own buffers), measured on one thread at a time, and
+# tracing them slows allocation-heavy code down, so compare wall times of profiled runs only.
+
+ENV = 'OLIST_PROFILE'
+
+_out = None          # output prefix while profiling, None when off
+_memory = False
+_t0 = 0
+_events = []
+_local = threading.local()
+_lock = threading.Lock()
+_mem_owner = None    # thread whose spans currently measure memory
+
+
+def enabled():
+    return _out is not None
+
+
+def _rows(obj):
+    """Row count of a frame/array/table result (the first element of a tuple), else None."""
+    if isinstance(obj, tuple) and obj:
+        obj = obj[0]
+    shape = getattr(obj, 'shape', None)
+    return int(shape[0]) if isinstance(shape, tuple) and shape else None
+
+
+class Span:
+    """One timed stage; used through span() and @profiled."""
+
+    __slots__ = ('name', 'args', 'rows', '_wall', '_cpu', '_mem', '_start', '_peak')
+
+    def __init__(self, name, args):
+        self.name, self.args, self.rows = name, args, None
+
+    def count(self, obj):
+        """Record the rows of `obj` (see _rows) and return it."""
+        self.rows = _rows(obj)
+        return obj
+
+    def __enter__(self):
+        global _mem_owner
+        stack = _local.__dict__.setdefault('stack', [])
+        self._mem = False
+        if _memory:
+            with _lock:
+                if _mem_owner is None and not stack:
+                    _mem_owner = threading.get_ident()
+                self._mem = _mem_owner == threading.get_ident()
+        if self._mem:
+            current, peak = tracemalloc.get_traced_memory()
+            if stack and stack[-1]._mem:
+                stack[-1]._peak = max(stack[-1]._peak, peak)   # the parent keeps its peak so far
+            tracemalloc.reset_peak()
+            self._start = self._peak = current
+        stack.append(self)
+        self._cpu = time.process_time()
+        self._wall = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        global _mem_owner
+        wall = time.perf_counter_ns() - self._wall
+        cpu = time.process_time() - self._cpu
+        stack = _local.stack
+        stack.pop()
+        args = dict(self.args, cpu_ms=round(cpu * 1e3, 3))
+        if self._mem:
+            self._peak = max(self._peak, tracemalloc.get_traced_memory()[1])
+            args['peak_mb'] = round((self._peak - self._start) / 2**20, 3)
+            if stack and stack[-1]._mem:
+                stack[-1]._peak = max(stack[-1]._peak, self._peak)
+            elif not stack:
+                _mem_owner = None
+        if self.rows is not None:
+            args['rows'] = self.rows
+        if exc[0] is not None:
+            args['error'] = exc[0].__name__
+        _events.append({'name': self.name, 'cat': self.name.split('.')[0], 'ph': 'X',
+                        'ts': (self._wall - _t0) / 1e3, 'dur': wall / 1e3,
+                        'pid': os.getpid(), 'tid': threading.get_ident(), 'args': args})
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def count(self, obj):
+        return obj
+
+
+_NULL = _NullSpan()
+
+
+def span(name, **args):
+    """Context manager recording the block as stage `name` (extra `args` go into the trace)."""
+    if _out is None:
+        return _NULL
+    return Span(name, args)
+
+
+def profiled(name=None):
+    """Decorator recording every call as stage `name` (default '<module file>.<function>'), with the
+    rows of the returned frame."""
+    def decorate(fn):
+        label = name or f'{Path(fn.__code__.co_filename).stem}.{fn.__qualname__}'
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if _out is None:
+                return fn(*args, **kwargs)
+            with Span(label, {}) as sp:
+                return sp.count(fn(*args, **kwargs))
+        return wrapper
+    return decorate
+
+
+def enable(out, memory=True):
+    """Start recording; the trace goes to `out`.json / `out`.txt at exit (or on write())."""
+    global _out, _memory, _t0
+    if _out is None:
+        _t0 = time.perf_counter_ns()
+        atexit.register(_write_at_exit)
+    _out, _memory = str(out), memory
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def disable():
+    global _out
+    _out = None
+    if _memory and tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+def reset():
+    """Drop the recorded events (e.g. at the start of a Streamlit rerun)."""
+    _events.clear()
+
+
+def add_argument(ap, name):
+    """Add the --profile [PREFIX] option (default profile/`name`) to an argparse parser."""
+    ap.add_argument('--profile', nargs='?', const=f'profile/{name}', metavar='PREFIX',
+                    help=f'record a trace of every stage to PREFIX.json / PREFIX.txt (default profile/{name}); '
+                         f'also on with {ENV}=1 or {ENV}=<dir>')
+
+
+def setup(prefix=None, name='run'):
+    """Enable profiling to `prefix` (from --profile), else as OLIST_PROFILE says: '1' writes to
+    profile/`name`, any other value is a directory for `name`.* ."""
+    env = os.environ.get(ENV, '')
+    if prefix is None and env and env.lower() not in ('0', 'false', 'no', 'off'):
+        prefix = Path('profile' if env.lower() in ('1', 'true', 'yes', 'on') else env) / name
+    if prefix is not None:
+        enable(prefix)
+    return enabled()
+
+
+def summary(events=None):
+    """Plain-text table per stage: calls, total wall/CPU seconds, max peak MB and total rows."""
+    stages = {}
+    for e in _events if events is None else events:
+        s = stages.setdefault(e['name'], dict(calls=0, wall=0.0, cpu=0.0, peak=None, rows=None))
+        a = e['args']
+        s['calls'] += 1
+        s['wall'] += e['dur'] / 1e6
+        s['cpu'] += a['cpu_ms'] / 1e3
+        if 'peak_mb' in a:
+            s['peak'] = max(s['peak'] or 0.0, a['peak_mb'])
+        if 'rows' in a:
+            s['rows'] = (s['rows'] or 0) + a['rows']
+    lines = [f"{'stage':40s} {'calls':>6s} {'wall s':>9s} {'cpu s':>9s} {'peak MB':>9s} {'rows':>12s}"]
+    for name, s in sorted(stages.items(), key=lambda kv: -kv[1]['wall']):
+        peak = f"{s['peak']:9.1f}" if s['peak'] is not None else f"{'-':>9s}"
+        rows = f"{s['rows']:12,d}" if s['rows'] is not None else f"{'-':>12s}"
+        lines.append(f"{name:40s} {s['calls']:6d} {s['wall']:9.3f} {s['cpu']:9.3f} {peak} {rows}")
+    return '\n'.join(lines)
+
+
+def write(prefix=None):
+    """Write the events so far to `prefix`.json (Chrome trace) and `prefix`.txt; returns both paths."""
+    prefix = Path(prefix or _out)
+    prefix.parent.mkdir(parents=True, exist_ok=True)
+    events = list(_events)
+    meta = {'name': 'process_name', 'ph': 'M', 'pid': os.getpid(),
+            'args': {'name': ' '.join([Path(sys.argv[0]).name, *sys.argv[1:]]) or 'python'}}
+    trace, text = prefix.with_name(prefix.name + '.json'), prefix.with_name(prefix.name + '.txt')
+    trace.write_text(json.dumps({'traceEvents': [meta, *events], 'displayTimeUnit': 'ms'}))
+    text.write_text(summary(events) + '\n')
+    return trace, text
+
+
+def _write_at_exit():
+    if _out is not None and _events:
+        trace, text = write()
+        print(f'Profile: {trace} (chrome://tracing), {text}', file=sys.stderr)
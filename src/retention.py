@@ -0,0 +1,107 @@
+import numpy as np
+import pandas as pd
+
+# Retention is kept as long-form cells (cohort_month, period_index) with additive measures:
+#   customers - distinct customers active in that period
+#   orders    - orders placed in that period
+#   revenue   - revenue of those orders
+# plus, for incremental updates, the last month each customer was already counted in.
+
+MEASURES = ['customers', 'orders', 'revenue']
+CELL_COLUMNS = ['cohort_month', 'period_index', *MEASURES]
+
+
+def month_index(s):
+    """Months since 1970-01 as int64 (NaT -> -1)."""
+    arr = np.asarray(s, dtype='datetime64[ns]').astype('datetime64[M]')
+    out = arr.astype('int64')
+    out[np.isnat(arr)] = -1
+    return out
+
+
+def _customer_codes(s):
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        return s.cat.codes.to_numpy().astype('int64'), s.cat.categories
+    codes, uniques = pd.factorize(s)
+    return codes.astype('int64'), pd.Index(uniques)
+
+
+def retention_cells(df, last_month=None, track=True):
+    """Cells for the orders in `df` (needs order_purchase_month, cohort_month, customer_unique_id).
+
+    Customers are dictionary-encoded once and distinct (cohort, period, customer) triples are
+    counted by sorting int64 keys, with no string hashing per group. `last_month` maps
+    customer_unique_id -> month index already counted by earlier batches. Customers are then
+    not counted twice in a month that straddles two batches; the batch must not contain orders
+    older than that month. Returns (cells, updated last_month); pass track=False when the
+    customer state is not needed (one-off matrices) to skip building it.
+    """
+    month = month_index(df['order_purchase_month'])
+    cohort = month_index(df['cohort_month'])
+    keep = (month >= 0) & (cohort >= 0) & (month >= cohort)
+    month, cohort = month[keep], cohort[keep]
+    codes, customers = _customer_codes(df['customer_unique_id'][keep])
+    revenue = (df['revenue'][keep].fillna(0).to_numpy(dtype='float64')
+               if 'revenue' in df.columns else np.zeros(len(month)))
+    if not len(month):
+        return pd.DataFrame(columns=CELL_COLUMNS), last_month
+
+    period = month - cohort
+    c0, n_periods = cohort.min(), int(period.max()) + 1
+    n_cells = (int(cohort.max() - c0) + 1) * n_periods
+    cell = (cohort - c0) * n_periods + period
+
+    # Distinct (cell, customer) pairs; unknown customers (code -1) are never counted
+    n_cust = max(len(customers), 1)
+    known = codes >= 0
+    pairs = np.sort(cell[known] * n_cust + codes[known])
+    pairs = pairs[np.r_[True, pairs[1:] != pairs[:-1]]]
+    pair_cell, pair_code = pairs // n_cust, pairs % n_cust
+
+    prior = None
+    if last_month is not None:
+        prior = last_month.reindex(customers).fillna(-1).to_numpy(dtype='int64')
+        pair_month = c0 + pair_cell // n_periods + pair_cell % n_periods
+        fresh = prior[pair_code] != pair_month
+        pair_cell, pair_code = pair_cell[fresh], pair_code[fresh]
+
+    counts = {
+        'customers': np.bincount(pair_cell, minlength=n_cells),
+        'orders': np.bincount(cell, minlength=n_cells),
+        'revenue': np.bincount(cell, weights=revenue, minlength=n_cells),
+    }
+    present = np.flatnonzero(counts['orders'])
+    cells = pd.DataFrame({
+        'cohort_month': (c0 + present // n_periods).astype('datetime64[M]').astype('datetime64[ns]'),
+        'period_index': (present % n_periods).astype('int64'),
+        **{m: counts[m][present] for m in MEASURES},
+    })
+
+    if not track:
+        return cells, None
+
+    # Last month counted per customer in this batch, merged with what earlier batches saw
+    latest = np.full(len(customers), -1, dtype='int64')
+    np.maximum.at(latest, codes[known], month[known])
+    if prior is not None:
+        latest = np.maximum(latest, prior)
+    seen = pd.Series(latest, index=customers, name='last_month')[latest >= 0]
+    if last_month is not None:
+        seen = seen.combine_first(last_month).astype('int64')
+    return cells, seen
+
+
+def merge_cells(*cells):
+    frames = [c for c in cells if c is not None and len(c)]
+    if not frames:
+        return pd.DataFrame(columns=CELL_COLUMNS)
+    return (pd.concat(frames, ignore_index=True)
+              .groupby(['cohort_month', 'period_index'], as_index=False)[MEASURES].sum())
+
+
+def retention_matrix(cells, measure='customers'):
+    """Cohort x months-since-first-order matrix, as a share of each cohort's period 0."""
+    pivot = cells.pivot(index='cohort_month', columns='period_index', values=measure).astype('float64')
+    if 0 not in pivot.columns:
+        return pivot.fillna(0.0) * 0.0
+    return pivot.divide(pivot[0], axis=0).fillna(0.0)
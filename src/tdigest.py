@@ -0,0 +1,107 @@
+import numpy as np
+import pandas as pd
+
+# Mergeable quantile sketches (merging t-digest with the k1 scale function), vectorized with NumPy.
+#
+# A set of digests is a long-form frame: the cell's key columns plus one row per centroid,
+# (mean, weight). Centroids near the median may hold many values, those in the tails only a few,
+# so tail quantiles stay accurate. Merging digests is concatenating their centroids and
+# compressing again, so cells can be combined for any selection without the raw values.
+
+DELTA = 200   # compression: at most ~DELTA/2 centroids per digest; p99 within ~0.1% of rank
+
+
+def _compress(groups, mean, weight, delta=DELTA):
+    """Centroids (group, mean, weight) -> compressed centroids, sorted by group then mean.
+
+    Every centroid is assigned to a unit interval of k(q) = delta / (2 pi) * asin(2q - 1) at its
+    quantile midpoint, and centroids in the same group and interval are merged.
+    """
+    if not len(groups):
+        return groups, mean, weight
+    order = np.lexsort((mean, groups))
+    groups, mean, weight = groups[order], mean[order], weight[order]
+    total = np.bincount(groups, weights=weight)
+    before = np.cumsum(weight) - weight - (np.cumsum(total) - total)[groups]
+    q = (before + weight / 2) / total[groups]
+    k = np.floor(delta / (2 * np.pi) * np.arcsin(np.clip(2 * q - 1, -1, 1))).astype(np.int64)
+    start = np.flatnonzero(np.r_[True, (groups[1:] != groups[:-1]) | (k[1:] != k[:-1])])
+    w = np.add.reduceat(weight, start)
+    return groups[start], np.add.reduceat(mean * weight, start) / w, w
+
+
+def _codes(keys):
+    return keys.groupby(list(keys.columns), observed=True, dropna=False, sort=False).ngroup().to_numpy()
+
+
+def _cells(keys, codes, groups, mean, weight):
+    _, first = np.unique(codes, return_index=True)
+    cells = keys.iloc[first[groups]].reset_index(drop=True)
+    cells['mean'] = mean
+    cells['weight'] = weight
+    return cells
+
+
+def digest_cells(keys, values, delta=DELTA):
+    """One digest of `values` per distinct row of `keys`, as long-form (keys..., mean, weight) rows."""
+    keys = keys.reset_index(drop=True)
+    values = np.asarray(values, dtype='float64')
+    codes = _codes(keys)
+    return _cells(keys, codes, *_compress(codes, values, np.ones(len(values)), delta))
+
+
+def merge_digests(*cells, delta=DELTA):
+    """Digests of equal cells merged (concatenated centroids, compressed again)."""
+    cells = [c for c in cells if c is not None]
+    # empty cells (a delta without delivered orders) would decide the concatenated dtypes
+    frame = pd.concat([c for c in cells if len(c)] or cells[:1], ignore_index=True)
+    keys = frame.drop(columns=['mean', 'weight'])
+    codes = _codes(keys)
+    return _cells(keys, codes, *_compress(codes, frame['mean'].to_numpy('float64'),
+                                          frame['weight'].to_numpy('float64'), delta))
+
+
+def _merged(cells, by, delta):
+    """[(group label, means, weights)] of the union of `cells` per `by` group (one group if by is None)."""
+    if by:
+        grouper = cells.groupby(by, observed=True, sort=True)
+        codes, labels = grouper.ngroup().to_numpy(), list(grouper.size().index)
+        keep = codes >= 0
+    else:
+        codes, labels = np.zeros(len(cells), dtype=np.int64), [None]
+        keep = np.ones(len(cells), dtype=bool)
+    groups, mean, weight = _compress(codes[keep].astype(np.int64), cells['mean'].to_numpy('float64')[keep],
+                                     cells['weight'].to_numpy('float64')[keep], delta)
+    bounds = np.searchsorted(groups, np.arange(1, len(labels)))
+    return list(zip(labels, np.split(mean, bounds), np.split(weight, bounds)))
+
+
+def _centers(weight):
+    """Quantile of each centroid's midpoint."""
+    return (np.cumsum(weight) - weight / 2) / weight.sum()
+
+
+def quantiles(cells, qs=(0.5, 0.9, 0.99), by=None, delta=DELTA):
+    """Quantiles `qs` of the merged digests per `by` group (all cells if None), plus the count `n`."""
+    qs = np.asarray(qs, dtype='float64')
+    rows, index = [], []
+    for label, mean, weight in _merged(cells, by, delta):
+        est = np.interp(qs, _centers(weight), mean) if len(mean) else np.full(len(qs), np.nan)
+        rows.append([*est, weight.sum()])
+        index.append(label)
+    columns = [f'p{q * 100:g}' for q in qs] + ['n']
+    out = pd.DataFrame(rows, columns=columns)
+    if by:
+        out.index = pd.MultiIndex.from_tuples(index, names=by) if len(by) > 1 else pd.Index(index, name=by[0])
+    return out
+
+
+def histogram(cells, edges, delta=DELTA):
+    """Approximate counts between consecutive `edges` for the union of `cells` (values below the
+    first edge count in the first bin, values above the last edge in the last)."""
+    (_, mean, weight), = _merged(cells, None, delta)
+    if not len(mean):
+        return np.zeros(len(edges) - 1)
+    cdf = np.interp(edges, mean, _centers(weight), left=0.0, right=1.0)
+    cdf[0], cdf[-1] = 0.0, 1.0
+    return np.diff(cdf) * weight.sum()